@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""
+import oss2 的启动开销测试。
+
+在独立的子进程中分别测量：
+
+- lazy： `import oss2` ，客户端加密相关的依赖（Crypto、aliyunsdkcore、aliyunsdkkms）延迟到使用时加载
+- eager：先加载这些依赖再 `import oss2` ，相当于原先在import时就全部加载的情况
+
+输出每种方式的平均耗时、import期间分配内存的峰值，以及是否加载了客户端加密的依赖。
+
+用法 ::
+
+    python benchmarks/bench_import.py [次数]
+"""
+
+from __future__ import print_function
+
+import json
+import subprocess
+import sys
+
+
+_EAGER_IMPORTS = '''
+from Crypto.Cipher import AES, PKCS1_OAEP
+from Crypto.PublicKey import RSA
+from Crypto import Random
+from Crypto.Util import Counter
+from aliyunsdkcore import client
+from aliyunsdkkms.request.v20160120 import GenerateDataKeyRequest, DecryptRequest, EncryptRequest
+'''
+
+# 内存统计会明显拖慢import，因此计时和统计内存分开在不同的进程中进行
+_SCRIPT = '''
+import json
+import sys
+import time
+
+tracemalloc = None
+if {trace}:
+    try:
+        import tracemalloc
+        tracemalloc.start()
+    except ImportError:
+        pass
+
+start = time.time()
+{imports}
+import oss2
+elapsed = time.time() - start
+
+peak = tracemalloc.get_traced_memory()[1] if tracemalloc else None
+crypto_loaded = any(m.startswith(('Crypto', 'aliyunsdk')) for m in sys.modules)
+
+print(json.dumps({{'elapsed': elapsed, 'peak': peak, 'crypto_loaded': crypto_loaded}}))
+'''
+
+
+def measure(imports, trace):
+    output = subprocess.check_output([sys.executable, '-c', _SCRIPT.format(imports=imports, trace=trace)])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def run(name, imports, times):
+    results = [measure(imports, False) for i in range(times)]
+    elapsed = sum(r['elapsed'] for r in results) / len(results)
+
+    peak = measure(imports, True)['peak']
+
+    print('{0:<6} {1:>8.1f} ms    peak memory: {2:<12} crypto deps loaded: {3}'.format(
+        name, elapsed * 1000,
+        '{0:.1f} MB'.format(peak / 1024.0 / 1024.0) if peak is not None else 'n/a',
+        results[0]['crypto_loaded']))
+
+
+def main():
+    times = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    print('python {0}, {1} runs each'.format(sys.version.split()[0], times))
+    run('lazy', '', times)
+    run('eager', _EAGER_IMPORTS, times)
+
+
+if __name__ == '__main__':
+    main()
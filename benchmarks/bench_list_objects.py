@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+解析列举结果的性能测试。
+
+构造一个包含1000个文件的 `ListBucketResult` 页面，分别用流式解析（oss2.xml_utils.parse_list_objects）和
+原先的方式（ElementTree.fromstring构建DOM树后逐个find，时间戳用正则和datetime解析）解析，
+以及按列存储（oss2.xml_utils.parse_list_objects_page）解析，
+输出每秒解析的条目数以及单页解析的内存峰值。
+
+用法 ::
+
+    python benchmarks/bench_list_objects.py [页数]
+"""
+
+from __future__ import print_function
+
+import calendar
+import datetime
+import io
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import oss2
+from oss2 import xml_utils
+from oss2.models import ListObjectsResult, ListObjectsPageResult, SimplifiedObjectInfo
+
+
+_KEYS_PER_PAGE = 1000
+
+
+class _FakeResponse(object):
+    def __init__(self):
+        self.status = 200
+        self.headers = {}
+        self.request_id = ''
+
+
+def make_page(n=_KEYS_PER_PAGE):
+    contents = []
+    for i in range(n):
+        contents.append('''<Contents>
+    <Key>dir%2Fsub%2Fobject-{0:08d}.dat</Key>
+    <LastModified>2018-07-10T11:11:{1:02d}.000Z</LastModified>
+    <ETag>"5EB63BBBE01EEED093CB22BB8F5ACDC3"</ETag>
+    <Type>Normal</Type>
+    <Size>{2}</Size>
+    <StorageClass>Standard</StorageClass>
+    <Owner>
+      <ID>1047205513514293</ID>
+      <DisplayName>1047205513514293</DisplayName>
+    </Owner>
+  </Contents>'''.format(i, i % 60, i * 1024))
+
+    return oss2.to_bytes('''<?xml version="1.0" encoding="UTF-8"?>
+<ListBucketResult>
+  <Name>bench</Name>
+  <Prefix></Prefix>
+  <Marker></Marker>
+  <MaxKeys>{0}</MaxKeys>
+  <Delimiter></Delimiter>
+  <EncodingType>url</EncodingType>
+  <IsTruncated>true</IsTruncated>
+  <NextMarker>dir%2Fsub%2Fobject-{1:08d}.dat</NextMarker>
+  {2}
+</ListBucketResult>'''.format(n, n - 1, '\n  '.join(contents)))
+
+
+def _find_tag(parent, path):
+    child = parent.find(path)
+    return oss2.to_string(child.text) if child.text is not None else ''
+
+
+def _regex_iso8601_to_unixtime(time_string):
+    m = oss2.utils._ISO8601_RE.match(time_string)
+    tm = datetime.datetime(int(m.group('year')), int(m.group('month')), int(m.group('day')),
+                           int(m.group('hour')), int(m.group('minute')), int(m.group('second'))).timetuple()
+    return calendar.timegm(tm)
+
+
+def parse_with_dom(result, body):
+    """解析方式对照：整体构建DOM树，再逐个查找子节点。"""
+    root = ElementTree.fromstring(body)
+    url_encoded = _find_tag(root, 'EncodingType') == 'url'
+    result.is_truncated = _find_tag(root, 'IsTruncated') == 'true'
+    if result.is_truncated:
+        result.next_marker = oss2.urlunquote(_find_tag(root, 'NextMarker'))
+
+    for node in root.findall('Contents'):
+        key = _find_tag(node, 'Key')
+        result.object_list.append(SimplifiedObjectInfo(
+            oss2.urlunquote(key) if url_encoded else key,
+            _regex_iso8601_to_unixtime(_find_tag(node, 'LastModified')),
+            _find_tag(node, 'ETag').strip('"'),
+            _find_tag(node, 'Type'),
+            int(_find_tag(node, 'Size')),
+            _find_tag(node, 'StorageClass')))
+
+    return result
+
+
+def parse_with_stream(result, body):
+    return xml_utils.parse_list_objects(result, io.BytesIO(body))
+
+
+def parse_to_page(result, body):
+    return xml_utils.parse_list_objects_page(result, io.BytesIO(body))
+
+
+def run(name, parse_func, page, pages, klass=ListObjectsResult):
+    start = time.time()
+    for i in range(pages):
+        parse_func(klass(_FakeResponse()), page)
+    elapsed = time.time() - start
+
+    peak = None
+    if tracemalloc:
+        tracemalloc.start()
+        parse_func(klass(_FakeResponse()), page)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print('{0:<8} {1:>12.0f} entries/sec    peak memory per page: {2}'.format(
+        name, pages * _KEYS_PER_PAGE / elapsed,
+        '{0:.1f} KB'.format(peak / 1024.0) if peak is not None else 'n/a'))
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    page = make_page()
+
+    print('page size: {0} bytes, {1} keys, {2} pages'.format(len(page), _KEYS_PER_PAGE, pages))
+    run('dom', parse_with_dom, page, pages)
+    run('stream', parse_with_stream, page, pages)
+    run('columnar', parse_to_page, page, pages, ListObjectsPageResult)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,15 +5,20 @@ from . import models, exceptions
 from .api import Service, Bucket, CryptoBucket
 from .auth import Auth, AuthV2, AnonymousAuth, StsAuth, AUTH_VERSION_1, AUTH_VERSION_2, make_auth
 from .http import Session, CaseInsensitiveDict
+from .cache import MetadataCache
 
 
 from .iterators import (BucketIterator, ObjectIterator,
                         MultipartUploadIterator, ObjectUploadIterator,
-                        PartIterator, LiveChannelIterator)
+                        PartIterator, LiveChannelIterator, ParallelObjectIterator)
 
 
 from .resumable import resumable_upload, resumable_download, ResumableStore, ResumableDownloadStore, determine_part_size
 from .resumable import make_upload_store, make_download_store
+from .resumable import resumable_copy, ResumableCopyStore, make_copy_store
+from .scheduler import TransferScheduler
+
+from . import transfer, sync
 
 
 from .compat import to_bytes, to_string, to_unicode, urlparse, urlquote, urlunquote
@@ -27,7 +32,7 @@ from .models import BUCKET_ACL_PRIVATE, BUCKET_ACL_PUBLIC_READ, BUCKET_ACL_PUBLI
 from .models import OBJECT_ACL_DEFAULT, OBJECT_ACL_PRIVATE, OBJECT_ACL_PUBLIC_READ, OBJECT_ACL_PUBLIC_READ_WRITE
 from .models import BUCKET_STORAGE_CLASS_STANDARD, BUCKET_STORAGE_CLASS_IA, BUCKET_STORAGE_CLASS_ARCHIVE
 
-from .crypto import LocalRsaProvider, AliKMSProvider
+from .crypto import LocalRsaProvider, AliKMSProvider, DataKeyCache
 import logging
 
 logger = logging.getLogger('oss2')
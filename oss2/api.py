@@ -171,15 +171,19 @@ from . import utils
 from . import exceptions
 from . import defaults
 from . import models
+from . import bulk
+from . import cache
+from . import streams
 
 from .models import *
-from .compat import urlquote, urlparse, to_unicode, to_string
-from .crypto import BaseCryptoProvider
+from .compat import urlquote, urlparse, to_unicode, to_string, to_bytes
+from .crypto import BaseCryptoProvider, MultipartCryptoContext, _AES_BLOCK_SIZE
 from .headers import *
 
 import time
 import shutil
 import base64
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -240,6 +244,12 @@ class _Base(object):
         parse_func(result, resp.read())
         return result
 
+    def _parse_result_stream(self, resp, parse_func, klass):
+        """和 `_parse_result` 类似，但把HTTP响应直接交给 `parse_func` 边读取边解析，适用于列举这类包体较大的响应。"""
+        result = klass(resp)
+        parse_func(result, resp)
+        return result
+
 
 class Service(_Base):
     """用于Service操作的类，如罗列用户所有的Bucket。
@@ -318,6 +328,9 @@ class Bucket(_Base):
 
     :param str app_name: 应用名。该参数不为空，则在User Agent中加入其值。
         注意到，最终这个字符串是要作为HTTP Header的值传输的，所以必须要遵循HTTP标准。
+
+    :param metadata_cache: 文件元信息缓存。非None时， `head_object` 和 `get_object_meta` 的结果会被缓存
+    :type metadata_cache: oss2.MetadataCache
     """
 
     ACL = 'acl'
@@ -341,13 +354,15 @@ class Bucket(_Base):
                  session=None,
                  connect_timeout=None,
                  app_name='',
-                 enable_crc=True):
+                 enable_crc=True,
+                 metadata_cache=None):
         logger.info("Init oss bucket, endpoint: {0}, isCname: {1}, connect_timeout: {2}, app_name: {3}, enabled_crc: "
                     "{4}".format(endpoint, is_cname, connect_timeout, app_name, enable_crc))
         super(Bucket, self).__init__(auth, endpoint, is_cname, session, connect_timeout,
                                      app_name, enable_crc)
 
         self.bucket_name = bucket_name.strip()
+        self.metadata_cache = metadata_cache
 
     def sign_url(self, method, key, expires, headers=None, params=None):
         """生成签名URL。
@@ -407,6 +422,19 @@ class Bucket(_Base):
 
         :return: :class:`ListObjectsResult <oss2.models.ListObjectsResult>`
         """
+        return self.__list_objects(prefix, delimiter, marker, max_keys,
+                                   xml_utils.parse_list_objects, ListObjectsResult)
+
+    def list_objects_page(self, prefix='', delimiter='', marker='', max_keys=100):
+        """和 :func:`list_objects` 相同，但结果按列存储在 :class:`ObjectPage <oss2.models.ObjectPage>` 中，
+        不为每个文件单独创建对象，适合遍历文件数目巨大的Bucket。
+
+        :return: :class:`ListObjectsPageResult <oss2.models.ListObjectsPageResult>`
+        """
+        return self.__list_objects(prefix, delimiter, marker, max_keys,
+                                   xml_utils.parse_list_objects_page, ListObjectsPageResult)
+
+    def __list_objects(self, prefix, delimiter, marker, max_keys, parse_func, klass):
         logger.info("Start to List objects, bucket: {0}, prefix: {1}, delimiter: {2}, marker: {3}, max-keys: {4}".format(
             self.bucket_name, to_string(prefix), delimiter, to_string(marker), max_keys))
         resp = self.__do_object('GET', '',
@@ -416,7 +444,7 @@ class Bucket(_Base):
                                         'max-keys': str(max_keys),
                                         'encoding-type': 'url'})
         logger.info("List objects done, req_id: {0}, status_code: {1}".format(resp.request_id, resp.status))
-        return self._parse_result(resp, xml_utils.parse_list_objects, ListObjectsResult)
+        return self._parse_result_stream(resp, parse_func, klass)
 
     def put_object(self, key, data,
                    headers=None,
@@ -459,6 +487,102 @@ class Bucket(_Base):
 
         return result
 
+    def get_object_parallel(self, key, part_size=None, num_threads=None, headers=None):
+        """把整个文件并发下载到内存中，返回bytearray。
+
+        先用HEAD获取文件长度并一次性分配缓冲区，然后由 `num_threads` 个线程并发发送Range GET，各自把数据直接读入缓冲区中
+        互不重叠的区域。所有分片都带上HEAD得到的ETag（If-Match），文件在下载过程中被覆盖会导致下载失败；开启CRC校验时，
+        各分片的CRC64合并后与文件的CRC64比较。
+
+        用法 ::
+
+            >>> data = bucket.get_object_parallel('dataset/shard-00001.bin', part_size=8 * 1024 * 1024, num_threads=16)
+            >>> len(data)
+
+        :param str key: 文件名
+        :param int part_size: 分片大小，缺省为 `oss2.defaults.multiget_part_size`
+        :param int num_threads: 并发下载的线程数，缺省为 `oss2.defaults.multiget_num_threads`
+        :param headers: HEAD以及各个GET请求的HTTP头部
+
+        :return: bytearray
+
+        :raises: 如果文件不存在，则抛出 :class:`NotFound <oss2.exceptions.NotFound>` ；
+            如果文件在下载过程中被覆盖，则抛出 :class:`PreconditionFailed <oss2.exceptions.PreconditionFailed>`
+        """
+        logger.info("Start to get object parallel, bucket: {0}, key: {1}, part_size: {2}, num_threads: {3}".format(
+            self.bucket_name, to_string(key), part_size, num_threads))
+        return streams._get_object_parallel(self, key, part_size=part_size, num_threads=num_threads, headers=headers)
+
+    def open_read(self, key, block_size=None, cache_blocks=None, read_ahead=2):
+        """返回一个可以seek的只读文件对象，按需用Range GET读取文件 `key` 的各个部分。
+
+        适合zipfile、tarfile或者Parquet等需要随机访问的场景，只读取需要的部分，参见 :class:`ObjectReader <oss2.streams.ObjectReader>` 。
+
+        用法 ::
+
+            >>> with bucket.open_read('archive.zip', block_size=256 * 1024) as f:
+            ...     data = zipfile.ZipFile(f).read('README')
+
+        :param str key: 文件名
+        :param int block_size: 每次读取的块大小，缺省为 `oss2.defaults.read_block_size`
+        :param int cache_blocks: 内存中缓存的块数，缺省为 `oss2.defaults.read_cache_blocks`
+        :param int read_ahead: 顺序读取时预读的块数，为0则不预读
+
+        :return: :class:`ObjectReader <oss2.streams.ObjectReader>`
+
+        :raises: 如果文件不存在，则抛出 :class:`NotFound <oss2.exceptions.NotFound>`
+        """
+        return streams.ObjectReader(self, key, block_size=block_size, cache_blocks=cache_blocks, read_ahead=read_ahead)
+
+    def read_ranges(self, key, ranges, max_gap=None, max_request_size=None, workers=None, headers=None):
+        """读取文件的多个范围，返回与 `ranges` 一一对应的数据。
+
+        范围按起始位置排序后，间隔不超过 `max_gap` 的相邻（或重叠）范围合并成一个Range GET，合并后的请求长度不超过
+        `max_request_size` ；合并后的请求由 `workers` 个线程并发执行。返回的每段数据都是指向所属请求结果的memoryview，不额外复制。
+
+        用法 ::
+
+            >>> footer, chunk1, chunk2 = bucket.read_ranges('table.parquet', [(size - 8, size - 1), (4, 1023), (2048, 4095)])
+            >>> bytes(footer)
+
+        :param str key: 文件名
+        :param ranges: 范围列表，每个范围是（起始，结束），与 `get_object` 的 `byte_range` 一样，起始和结束都包含在内
+        :param int max_gap: 可以合并的最大间隔，缺省为 `oss2.defaults.read_ranges_max_gap`
+        :param int max_request_size: 合并后单个请求的最大长度，缺省为 `oss2.defaults.read_ranges_max_request_size`
+        :param int workers: 并发的线程数，缺省为 `oss2.defaults.multiget_num_threads`
+        :param headers: 每个GET请求的HTTP头部。没有指定If-Match时，先用 :func:`head_object` 获取ETag，
+            所有请求都带上If-Match，保证读到的是同一个版本
+
+        :return: memoryview的列表
+
+        :raises: 范围超出文件长度时抛出 :class:`ClientError <oss2.exceptions.ClientError>` ；
+            OSS没有按请求的范围返回数据时抛出 :class:`InconsistentError <oss2.exceptions.InconsistentError>`
+        """
+        return streams._read_ranges(self, key, ranges, max_gap=max_gap, max_request_size=max_request_size,
+                                    workers=workers, headers=headers)
+
+    def open_write(self, key, part_size=None, max_in_flight=None, headers=None):
+        """返回一个只写的文件对象，写入其中的数据以分片上传的方式并发上传到文件 `key` 。
+
+        适合管道、socket或者边计算边上传等无法预知长度、也无法seek的数据源，参见 :class:`ObjectWriter <oss2.streams.ObjectWriter>` 。
+
+        用法 ::
+
+            >>> with bucket.open_write('dump.sql', max_in_flight=4) as f:
+            ...     for chunk in dump_process.stdout:
+            ...         f.write(chunk)
+            >>> f.result.etag
+
+        :param str key: 文件名
+        :param int part_size: 分片大小，缺省为 `oss2.defaults.part_size`
+        :param int max_in_flight: 同时上传的分片数，占用的内存不超过 `part_size` × `max_in_flight` ，
+            缺省为 `oss2.defaults.multipart_num_threads`
+        :param headers: 传给 `put_object` 或 `init_multipart_upload` 的HTTP头部
+
+        :return: :class:`ObjectWriter <oss2.streams.ObjectWriter>`
+        """
+        return streams.ObjectWriter(self, key, part_size=part_size, max_in_flight=max_in_flight, headers=headers)
+
     def put_object_from_file(self, key, filename,
                              headers=None,
                              progress_callback=None):
@@ -603,22 +727,27 @@ class Bucket(_Base):
 
         :raises: 如果文件不存在，则抛出 :class:`NoSuchKey <oss2.exceptions.NoSuchKey>` ；还可能抛出其他异常
         """
+        params = {} if params is None else params
+        if process:
+            params.update({Bucket.PROCESS: process})
+
+        resp = self._get_object_resp(key, byte_range, headers, params)
+
+        return GetObjectResult(resp, progress_callback, self.enable_crc)
+
+    def _get_object_resp(self, key, byte_range, headers, params):
         headers = http.CaseInsensitiveDict(headers)
 
         range_string = _make_range_string(byte_range)
         if range_string:
             headers['range'] = range_string
 
-        params = {} if params is None else params
-        if process:
-            params.update({Bucket.PROCESS: process})
-
         logger.info("Start to get object, bucket: {0}， key: {1}, range: {2}, headers: {3}, params: {4}".format(
             self.bucket_name, to_string(key), range_string, headers, params))
         resp = self.__do_object('GET', key, headers=headers, params=params)
         logger.info("Get object done, req_id: {0}, status_code: {1}".format(resp.request_id, resp.status))
 
-        return GetObjectResult(resp, progress_callback, self.enable_crc)
+        return resp
 
 
     def select_object(self, key, sql,
@@ -801,6 +930,13 @@ class Bucket(_Base):
         """
         logger.info("Start to head object, bucket: {0}, key: {1}, headers: {2}".format(
             self.bucket_name, to_string(key), headers))
+
+        if self.metadata_cache is not None and not headers:
+            return self.__cached_object_meta(key, cache._KIND_HEAD, self.__head_object)
+
+        return self.__head_object(key, headers)
+
+    def __head_object(self, key, headers):
         resp = self.__do_object('HEAD', key, headers=headers)
         logger.info("Head object done, req_id: {0}, status_code: {1}".format(resp.request_id, resp.status))
         return HeadObjectResult(resp)
@@ -852,10 +988,46 @@ class Bucket(_Base):
         :raises: 如果文件不存在，则抛出 :class:`NoSuchKey <oss2.exceptions.NoSuchKey>` ；还可能抛出其他异常
         """
         logger.info("Start to get object metadata, bucket: {0}, key: {1}".format(self.bucket_name, to_string(key)))
-        resp = self.__do_object('GET', key, params={'objectMeta': ''})
+
+        if self.metadata_cache is not None:
+            return self.__cached_object_meta(key, cache._KIND_META, self.__get_object_meta)
+
+        return self.__get_object_meta(key, None)
+
+    def __get_object_meta(self, key, headers):
+        resp = self.__do_object('GET', key, params={'objectMeta': ''}, headers=headers)
         logger.info("Get object metadata done, req_id: {0}, status_code: {1}".format(resp.request_id, resp.status))
         return GetObjectMetaResult(resp)
 
+    def __cached_object_meta(self, key, kind, request_func):
+        key = to_string(key)
+
+        # 请求期间文件如果被写操作清除了缓存，请求的结果可能已经过时，不能再放进缓存
+        generation = self.metadata_cache.generation(self.bucket_name, key)
+
+        result, fresh = self.metadata_cache.get(self.bucket_name, key, kind)
+        if fresh:
+            logger.debug("Object metadata cache hit, bucket: {0}, key: {1}".format(self.bucket_name, key))
+            return result
+
+        if result is None:
+            result = request_func(key, None)
+            self.metadata_cache.put(self.bucket_name, key, kind, result, generation=generation)
+            return result
+
+        # 缓存已过期，向OSS确认文件是否被修改过
+        try:
+            new_result = request_func(key, {IF_NONE_MATCH: result.etag})
+        except exceptions.NotModified:
+            self.metadata_cache.put(self.bucket_name, key, kind, result, revalidated=True, generation=generation)
+            return result
+        except exceptions.NotFound:
+            self.metadata_cache.invalidate(self.bucket_name, key)
+            raise
+
+        self.metadata_cache.put(self.bucket_name, key, kind, new_result, generation=generation)
+        return new_result
+
     def object_exists(self, key):
         """如果文件存在就返回True，否则返回False。如果Bucket不存在，或是发生其他错误，则抛出异常。"""
 
@@ -877,6 +1049,35 @@ class Bucket(_Base):
 
         return True
 
+    def batch_head(self, keys, workers=None, ordered=False, light=False, headers=None, max_in_flight=None):
+        """并发获取多个文件的元信息，依次返回（文件名，结果）。
+
+        结果是 :class:`HeadObjectResult <oss2.models.HeadObjectResult>` ；文件不存在时是
+        :class:`NotFound <oss2.exceptions.NotFound>` 异常对象，其他错误也以异常对象的形式返回，不会中断遍历。
+
+        用法 ::
+
+            >>> for key, result in bucket.batch_head(keys, workers=16):
+            ...     if isinstance(result, oss2.exceptions.NotFound):
+            ...         print('missing', key)
+            ...     elif isinstance(result, oss2.exceptions.OssError):
+            ...         print('error', key, result)
+            ...     else:
+            ...         print(key, result.content_length, result.etag)
+
+        :param keys: 文件名列表，也可以是一个迭代器，如 :class:`ObjectIterator <oss2.ObjectIterator>` 返回的文件名
+        :param int workers: 并发的线程数，缺省为 `oss2.defaults.batch_num_threads`
+        :param bool ordered: 为True时按 `keys` 的顺序返回，否则按完成的先后返回
+        :param bool light: 为True时用 :func:`get_object_meta` 代替 :func:`head_object` ，只获取大小、ETag和最后修改时间，
+            结果是 :class:`GetObjectMetaResult <oss2.models.GetObjectMetaResult>`
+        :param headers: `head_object` 的HTTP头部
+        :param int max_in_flight: 同时处理中的文件数上限，缺省为 `workers` 的两倍
+
+        :return: 生成器，每次返回（文件名，结果）
+        """
+        return bulk._batch_head(self, keys, workers=workers, ordered=ordered, light=light, headers=headers,
+                               max_in_flight=max_in_flight)
+
     def copy_object(self, source_bucket_name, source_key, target_key, headers=None):
         """拷贝一个文件到当前Bucket。
 
@@ -899,6 +1100,71 @@ class Bucket(_Base):
 
         return PutObjectResult(resp)
 
+    def copy_prefix(self, src_bucket, src_prefix, dst_prefix, workers=None, move=False, store=None,
+                    multipart_threshold=None, part_size=None, progress_callback=None):
+        """把源Bucket中所有以 `src_prefix` 开头的文件拷贝到当前Bucket，文件名中的 `src_prefix` 替换为 `dst_prefix` 。
+
+        数据只在OSS服务器端拷贝，不经过客户端。源文件边列举边由 `workers` 个线程并发拷贝：小于 `multipart_threshold` 的文件
+        用 :func:`copy_object` 拷贝，否则用 :func:`resumable_copy <oss2.resumable_copy>` 的方式并发拷贝各分片。拷贝时会校验源文件的ETag，
+        拷贝过程中被修改的源文件会导致拷贝失败。
+
+        每拷贝完一页（1000个）源文件就在 `store` 中记录断点，失败后用相同的参数重新调用即可从断点继续。
+
+        用法 ::
+
+            >>> bucket.copy_prefix('src-bucket', 'photos/2017/', 'archive/photos/2017/', workers=16)
+            10000
+
+        :param src_bucket: 源Bucket，可以是 :class:`Bucket` 对象，也可以是Bucket名（与当前Bucket使用相同的认证信息和Endpoint）
+        :param str src_prefix: 源文件名前缀
+        :param str dst_prefix: 目标文件名前缀。源Bucket和当前Bucket相同时，不能以 `src_prefix` 开头
+        :param int workers: 并发拷贝的线程数，缺省为 `oss2.defaults.batch_num_threads`
+        :param bool move: 为True时，每拷贝完一页源文件就用 :func:`batch_delete_objects` 删除它们
+        :param store: 保存断点信息的对象，缺省为 :class:`ResumableCopyStore <oss2.ResumableCopyStore>`
+        :param int multipart_threshold: 文件长度大于或等于该值时采用分片拷贝，缺省为 `oss2.defaults.multipart_copy_threshold`
+        :param int part_size: 分片拷贝时期望的分片大小，缺省为 `oss2.defaults.part_size`
+        :param progress_callback: 每拷贝完一页调用一次，参数为（已拷贝的文件数，None）
+
+        :return: 本次调用拷贝的文件数
+        """
+        from .resumable import _PrefixCopier, _make_src_bucket
+
+        src_bucket = _make_src_bucket(self, src_bucket)
+
+        logger.info("Start to copy prefix, source bucket: {0}, source prefix: {1}, bucket: {2}, prefix: {3}, move: {4}".format(
+            src_bucket.bucket_name, to_string(src_prefix), self.bucket_name, to_string(dst_prefix), move))
+        return _PrefixCopier(self, src_bucket, src_prefix, dst_prefix, workers=workers, move=move, store=store,
+                             multipart_threshold=multipart_threshold, part_size=part_size,
+                             progress_callback=progress_callback).copy()
+
+    def compose_objects(self, target_key, source_keys, workers=None, headers=None):
+        """把当前Bucket中的多个文件按 `source_keys` 的顺序拼接成一个文件 `target_key` 。
+
+        实现上采用分片上传：不小于最小分片大小（100KB）的源文件用 :func:`upload_part_copy` 在服务器端拷贝，由 `workers` 个线程并发进行；
+        较小的源文件（以及为凑满分片而借用的相邻源文件开头的数据）在客户端拼接后用 :func:`upload_part` 上传。
+        读取和拷贝源文件时都会校验其ETag；开启CRC校验时，用各个源文件的CRC64合并出目标文件的CRC64进行比较，不需要回读数据。
+        出错时会取消分片上传。源文件都是空文件时，直接用 :func:`put_object` 写入空的目标文件。
+
+        用法 ::
+
+            >>> keys = ['output/part-{0:05d}'.format(i) for i in range(1000)]
+            >>> bucket.compose_objects('output/all', keys, workers=16)
+
+        :param str target_key: 目标文件名
+        :param source_keys: 源文件名列表，可以重复
+        :param int workers: 并发的线程数，缺省为 `oss2.defaults.batch_num_threads`
+        :param headers: 传给 :func:`init_multipart_upload` 的HTTP头部
+
+        :return: :class:`PutObjectResult <oss2.models.PutObjectResult>`
+
+        :raises: `source_keys` 为空时抛出 :class:`ClientError <oss2.exceptions.ClientError>`
+        """
+        source_keys = list(source_keys)
+
+        logger.info("Start to compose objects, bucket: {0}, target key: {1}, source count: {2}".format(
+            self.bucket_name, to_string(target_key), len(source_keys)))
+        return bulk._ObjectComposer(self, target_key, source_keys, workers=workers, headers=headers).compose()
+
     def update_object_meta(self, key, headers):
         """更改Object的元数据信息，包括Content-Type这类标准的HTTP头部，以及以x-oss-meta-开头的自定义元数据。
 
@@ -978,26 +1244,57 @@ class Bucket(_Base):
         logger.info("Get object acl done, req_id: {0}, status_code: {1}".format(resp.request_id, resp.status))
         return self._parse_result(resp, xml_utils.parse_get_object_acl, GetObjectAclResult)
 
-    def batch_delete_objects(self, key_list):
+    def batch_delete_objects(self, key_list, quiet=False):
         """批量删除文件。待删除文件列表不能为空。
 
         :param key_list: 文件名列表，不能为空。
         :type key_list: list of str
 
+        :param bool quiet: 为True时OSS不返回已删除的文件名，结果中的 `deleted_keys` 为空
+
         :return: :class:`BatchDeleteObjectsResult <oss2.models.BatchDeleteObjectsResult>`
         """
         if not key_list:
             raise ClientError('key_list should not be empty')
 
         logger.info("Start to delete objects, bucket: {0}, keys: {1}".format(self.bucket_name, key_list))
-        data = xml_utils.to_batch_delete_objects_request(key_list, False)
+        data = xml_utils.to_batch_delete_objects_request(key_list, quiet)
         resp = self.__do_object('POST', '',
                                 data=data,
                                 params={'delete': '', 'encoding-type': 'url'},
                                 headers={'Content-MD5': utils.content_md5(data)})
         logger.info("Delete objects done, req_id: {0}, status_code: {1}".format(resp.request_id, resp.status))
+
+        if self.metadata_cache is not None:
+            for key in key_list:
+                self.metadata_cache.invalidate(self.bucket_name, to_string(key))
+
         return self._parse_result(resp, xml_utils.parse_batch_delete_objects, BatchDeleteObjectsResult)
 
+    def delete_prefix(self, prefix, workers=None, max_retries=None, progress_callback=None):
+        """删除所有以 `prefix` 开头的文件。
+
+        列举和删除同时进行：列举得到的文件名每1000个为一批，由 `workers` 个线程以quiet模式并发调用 :func:`batch_delete_objects` 。
+        某一批删除时遇到服务器端5xx错误或者网络错误，会整批重试；OSS返回的删除失败的文件会单独重试。
+        重试 `max_retries` 次后依然删除失败的文件会被跳过，不计入返回值。
+
+        用法 ::
+
+            >>> bucket.delete_prefix('logs/2017/', workers=8)
+            123456
+
+        :param str prefix: 文件名前缀。注意为空串时会删除Bucket中的所有文件
+        :param int workers: 并发删除的线程数，缺省为 `oss2.defaults.batch_num_threads`
+        :param int max_retries: 每一批（以及每次列举）最多尝试的次数，缺省为 `oss2.defaults.request_retries`
+        :param progress_callback: 每删除一批（包括重试删除失败的文件）调用一次，参数为（已删除的文件数，None）
+
+        :return: 删除的文件数
+        """
+        logger.info("Start to delete prefix, bucket: {0}, prefix: {1}, workers: {2}".format(
+            self.bucket_name, to_string(prefix), workers))
+        return bulk._PrefixDeleter(self, prefix, workers=workers, max_retries=max_retries,
+                                   progress_callback=progress_callback).delete()
+
     def init_multipart_upload(self, key, headers=None):
         """初始化分片上传。
 
@@ -1130,7 +1427,7 @@ class Bucket(_Base):
                                         'max-uploads': str(max_uploads),
                                         'encoding-type': 'url'})
         logger.info("List multipart uploads done, req_id: {0}, status_code: {1}".format(resp.request_id, resp.status))
-        return self._parse_result(resp, xml_utils.parse_list_multipart_uploads, ListMultipartUploadsResult)
+        return self._parse_result_stream(resp, xml_utils.parse_list_multipart_uploads, ListMultipartUploadsResult)
 
     def upload_part_copy(self, source_bucket_name, source_key, byte_range,
                          target_key, target_upload_id, target_part_number,
@@ -1182,7 +1479,7 @@ class Bucket(_Base):
                                         'part-number-marker': marker,
                                         'max-parts': str(max_parts)})
         logger.info("List parts done, req_id: {0}, status_code: {1}".format(resp.request_id, resp.status))
-        return self._parse_result(resp, xml_utils.parse_list_parts, ListPartsResult)
+        return self._parse_result_stream(resp, xml_utils.parse_list_parts, ListPartsResult)
 
     def put_symlink(self, target_key, symlink_key, headers=None):
         """创建Symlink。
@@ -1576,7 +1873,14 @@ class Bucket(_Base):
         return resp
 
     def __do_object(self, method, key, **kwargs):
-        return self._do(method, self.bucket_name, key, **kwargs)
+        if self.metadata_cache is None or method not in _OBJECT_WRITE_METHODS:
+            return self._do(method, self.bucket_name, key, **kwargs)
+
+        # 写操作完成（或失败）之后才清除缓存，避免并发的head_object把旧的结果重新放回缓存
+        try:
+            return self._do(method, self.bucket_name, key, **kwargs)
+        finally:
+            self.metadata_cache.invalidate(self.bucket_name, to_string(key))
 
     def __do_bucket(self, method, **kwargs):
         return self._do(method, self.bucket_name, '', **kwargs)
@@ -1636,6 +1940,10 @@ class CryptoBucket():
         self.bucket = Bucket(auth, endpoint, bucket_name, is_cname, session, connect_timeout,
                              app_name, enable_crc=False)
 
+        # upload_id -> 长度小于part_size的分片号，完成上传时检查它们都是最后一个分片
+        self.__short_parts = {}
+        self.__short_parts_lock = threading.Lock()
+
     def put_object(self, key, data,
                    headers=None,
                    progress_callback=None):
@@ -1661,10 +1969,9 @@ class CryptoBucket():
         if progress_callback:
             data = utils.make_progress_adapter(data, progress_callback)
 
-        random_key = self.crypto_provider.get_key()
-        start = self.crypto_provider.get_start()
-        data = self.crypto_provider.make_encrypt_adapter(data, random_key, start)
-        headers = self.crypto_provider.build_header(headers)
+        context = self.crypto_provider.make_crypto_context(headers)
+        data = self.crypto_provider.make_encrypt_adapter(data, context.plain_key, context.plain_start)
+        headers = context.headers
 
         if self.enable_crc:
             data = utils.make_crc_adapter(data)
@@ -1695,7 +2002,8 @@ class CryptoBucket():
     def get_object(self, key,
                    headers=None,
                    progress_callback=None,
-                   params=None):
+                   params=None,
+                   byte_range=None):
         """下载一个文件。
 
         用法 ::
@@ -1704,9 +2012,13 @@ class CryptoBucket():
             >>> print(result.read())
             'hello world'
 
+            >>> result = bucket.get_object('readme.txt', byte_range=(6, 10))
+            >>> print(result.read())
+            'world'
+
         :param key: 文件名
 
-        :param headers: HTTP头部
+        :param headers: HTTP头部，不能包含Range，范围下载请使用 `byte_range`
         :type headers: 可以是dict，建议是oss2.CaseInsensitiveDict
 
         :param progress_callback: 用户指定的进度回调函数。参考 :ref:`progress_callback`
@@ -1714,6 +2026,9 @@ class CryptoBucket():
         :param params: http 请求的查询字符串参数
         :type params: dict
 
+        :param byte_range: 指定下载范围，与 :func:`Bucket.get_object <oss2.Bucket.get_object>` 相同。
+            实际请求的起始位置会向前对齐到16字节，解密后再去掉多余的部分。
+
         :return: file-like object
 
         :raises: 如果文件不存在，则抛出 :class:`NoSuchKey <oss2.exceptions.NoSuchKey>` ；还可能抛出其他异常
@@ -1721,11 +2036,42 @@ class CryptoBucket():
         headers = http.CaseInsensitiveDict(headers)
 
         if 'range' in headers:
-            raise ClientError('Crypto bucket do not support range get')
+            raise ClientError('Crypto bucket do not support range header, please use byte_range instead')
+
+        discard = 0
+        if byte_range is not None:
+            start, last = byte_range
+
+            # 获取最后N个字节时需要知道文件长度，才能对齐起始位置
+            if start is None and last is not None:
+                size = self.head_object(key).content_length
+                start, last = max(size - last, 0), None
+
+            if start is not None:
+                discard = start % _AES_BLOCK_SIZE
+                byte_range = (start - discard, last)
 
-        encrypted_result = self.bucket.get_object(key, headers=headers, params=params, progress_callback=None)
+        resp = self.bucket._get_object_resp(key, byte_range, headers, params)
 
-        return GetObjectResult(encrypted_result.resp, progress_callback, self.enable_crc, crypto_provider=self.crypto_provider)
+        return GetObjectResult(resp, progress_callback, self.enable_crc,
+                               crypto_provider=self.crypto_provider, discard=discard)
+
+    def head_object(self, key, headers=None):
+        """获取文件元信息。参见 :func:`Bucket.head_object <oss2.Bucket.head_object>` 。
+
+        采用AES-CTR加密，文件长度与明文长度相同；`server_crc` 是密文的CRC64。
+        """
+        return self.bucket.head_object(key, headers=headers)
+
+    def get_object_parallel(self, key, part_size=None, num_threads=None, headers=None):
+        """把整个加密文件并发下载到内存中并解密，返回bytearray。参见 :func:`Bucket.get_object_parallel <oss2.Bucket.get_object_parallel>` 。
+
+        各个分片从16字节对齐的位置开始独立解密，分片大小会向上取整为16的倍数。
+        """
+        part_size = defaults.get(part_size, defaults.multiget_part_size)
+        part_size = (part_size + _AES_BLOCK_SIZE - 1) // _AES_BLOCK_SIZE * _AES_BLOCK_SIZE
+
+        return streams._get_object_parallel(self, key, part_size=part_size, num_threads=num_threads, headers=headers)
 
     def get_object_to_file(self, key, filename,
                            headers=None,
@@ -1757,6 +2103,122 @@ class CryptoBucket():
 
             return result
 
+    def init_multipart_upload(self, key, headers=None, part_size=None):
+        """初始化加密的分片上传。
+
+        生成一个数据密钥，加密后和其他加密信息一起作为文件的元信息保存在分片上传上，完成上传后即成为文件的元信息。
+        返回值中的 `crypto_context` 是各个分片共用的 :class:`MultipartCryptoContext <oss2.crypto.MultipartCryptoContext>` ，
+        需要传给 :func:`upload_part` 。
+
+        用法 ::
+
+            >>> result = bucket.init_multipart_upload('big.bin', part_size=10 * 1024 * 1024)
+            >>> part = bucket.upload_part('big.bin', result.upload_id, 1, data, crypto_context=result.crypto_context)
+
+        :param str key: 待上传的文件名
+        :param headers: HTTP头部
+        :param int part_size: 分片大小，除最后一个分片外所有分片都必须是这个大小，且必须是16的倍数。
+            缺省为 `oss2.defaults.part_size`
+
+        :return: :class:`InitMultipartUploadResult <oss2.models.InitMultipartUploadResult>`
+        """
+        part_size = defaults.get(part_size, defaults.part_size)
+
+        context = self.crypto_provider.make_crypto_context(headers)
+        crypto_context = MultipartCryptoContext(self.crypto_provider, context.plain_key, context.plain_start,
+                                                context.envelope, part_size)
+
+        result = self.bucket.init_multipart_upload(key, headers=context.headers)
+        result.crypto_context = crypto_context
+
+        return result
+
+    def upload_part(self, key, upload_id, part_number, data, progress_callback=None, headers=None, crypto_context=None):
+        """加密并上传一个分片。第 `part_number` 个分片从文件偏移 (part_number - 1) × part_size 处开始加密。
+
+        除 `crypto_context` 之外，参数的顺序和 :func:`Bucket.upload_part <oss2.Bucket.upload_part>` 相同。
+
+        :param str key: 待上传文件名，这个文件名要和 :func:`init_multipart_upload` 的文件名一致。
+        :param str upload_id: 分片上传ID
+        :param int part_number: 分片号，最小值是1.
+        :param data: 待上传数据。长度不能超过 `crypto_context.part_size` ，除最后一个分片外必须等于它
+        :param progress_callback: 用户指定进度回调函数。可以用来实现进度条等功能。参考 :ref:`progress_callback` 。
+        :param headers: 用户指定的HTTP头部
+        :param crypto_context: :func:`init_multipart_upload` 返回的加密上下文，必须指定
+
+        :return: :class:`PutObjectResult <oss2.models.PutObjectResult>`
+
+        :raises: 分片长度超过 `part_size` 时抛出 :class:`ClientError <oss2.exceptions.ClientError>` 。
+            长度不足 `part_size` 的分片不是最后一个分片时，在 :func:`complete_multipart_upload` 中抛出该异常
+        """
+        if crypto_context is None:
+            raise ClientError('crypto_context is required to upload part to crypto bucket')
+
+        part_size = crypto_context.part_size
+
+        size = utils._get_data_size(to_bytes(data))
+        if size is not None and size > part_size:
+            raise ClientError('Part {0} is {1} bytes, larger than part_size {2}'.format(part_number, size, part_size))
+
+        if progress_callback:
+            data = utils.make_progress_adapter(data, progress_callback)
+
+        data = plain = crypto_context.make_encrypt_adapter(data, (part_number - 1) * part_size)
+
+        if self.enable_crc:
+            data = utils.make_crc_adapter(data)
+
+        result = self.bucket.upload_part(key, upload_id, part_number, data, headers=headers)
+
+        # 事先不知道长度的数据，上传后再检查
+        if size is None:
+            size = plain.offset
+            if size > part_size:
+                raise ClientError('Part {0} is {1} bytes, larger than part_size {2}'.format(part_number, size, part_size))
+
+        if size < part_size:
+            with self.__short_parts_lock:
+                self.__short_parts.setdefault(upload_id, set()).add(part_number)
+
+        if self.enable_crc and result.crc is not None:
+            utils.check_crc('upload part', data.crc, result.crc, result.request_id)
+
+        return result
+
+    def complete_multipart_upload(self, key, upload_id, parts, headers=None):
+        """完成分片上传，创建文件。参见 :func:`Bucket.complete_multipart_upload <oss2.Bucket.complete_multipart_upload>` 。
+
+        :raises: 通过该对象上传的分片中，长度不足 `part_size` 的分片不是最后一个分片时，
+            抛出 :class:`ClientError <oss2.exceptions.ClientError>` ，此时不会完成上传
+        """
+        with self.__short_parts_lock:
+            short_parts = self.__short_parts.get(upload_id, ())
+
+        last_part_number = max(part.part_number for part in parts) if parts else 0
+        for part in parts:
+            if part.part_number in short_parts and part.part_number != last_part_number:
+                raise ClientError('Part {0} is shorter than part_size but not the last part'.format(part.part_number))
+
+        result = self.bucket.complete_multipart_upload(key, upload_id, parts, headers=headers)
+
+        with self.__short_parts_lock:
+            self.__short_parts.pop(upload_id, None)
+
+        return result
+
+    def abort_multipart_upload(self, key, upload_id):
+        """取消分片上传。参见 :func:`Bucket.abort_multipart_upload <oss2.Bucket.abort_multipart_upload>` 。"""
+        result = self.bucket.abort_multipart_upload(key, upload_id)
+
+        with self.__short_parts_lock:
+            self.__short_parts.pop(upload_id, None)
+
+        return result
+
+    def list_parts(self, key, upload_id, marker='', max_parts=1000):
+        """列举已经上传的分片。参见 :func:`Bucket.list_parts <oss2.Bucket.list_parts>` 。"""
+        return self.bucket.list_parts(key, upload_id, marker=marker, max_parts=max_parts)
+
 
 def _normalize_endpoint(endpoint):
     if not endpoint.startswith('http://') and not endpoint.startswith('https://'):
@@ -1765,6 +2227,9 @@ def _normalize_endpoint(endpoint):
         return endpoint
 
 
+_OBJECT_WRITE_METHODS = frozenset(['PUT', 'POST', 'DELETE'])
+
+
 _ENDPOINT_TYPE_ALIYUN = 0
 _ENDPOINT_TYPE_CNAME = 1
 _ENDPOINT_TYPE_IP = 2
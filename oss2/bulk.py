@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+
+"""
+oss2.bulk
+~~~~~~~~~
+
+对大量文件的并发操作，供 :class:`Bucket <oss2.Bucket>` 的批量接口使用。
+"""
+
+import functools
+import logging
+import sys
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from . import defaults
+from .exceptions import OssError, ClientError, ServerError, RequestError
+from .headers import IF_MATCH, OSS_COPY_OBJECT_SOURCE_IF_MATCH
+from .iterators import ObjectIterator
+from .models import PartInfo
+from .task_queue import TaskQueue
+from .utils import _invoke_progress_callback, calc_obj_crc_from_parts, check_crc
+
+logger = logging.getLogger(__name__)
+
+
+_MAX_BATCH_DELETE = 1000
+
+
+def _call_with_retry(max_retries, func, *args, **kwargs):
+    """调用 `func` ，遇到服务器端5xx错误或网络错误时重试，最多调用 `max_retries` 次。"""
+    for i in range(max_retries):
+        try:
+            return func(*args, **kwargs)
+        except (ServerError, RequestError) as e:
+            if isinstance(e, ServerError) and e.status // 100 != 5:
+                raise
+
+            if i == max_retries - 1:
+                raise
+
+            logger.warning("Retry {0} after error: {1}".format(func.__name__, e))
+
+
+class _PrefixDeleter(object):
+    def __init__(self, bucket, prefix, workers=None, max_retries=None, progress_callback=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.workers = defaults.get(workers, defaults.batch_num_threads)
+        self.progress_callback = progress_callback
+
+        max_retries = defaults.get(max_retries, defaults.request_retries)
+        self.max_retries = max_retries if max_retries > 0 else 1
+
+        self.__lock = threading.Lock()
+        self.__deleted = 0
+        self.__failed = 0
+        self.__start = 0
+
+    def delete(self):
+        self.__start = time.time()
+
+        q = TaskQueue(self.__producer, [self.__consumer] * self.workers, maxsize=self.workers * 2)
+        q.run()
+
+        elapsed = time.time() - self.__start
+        logger.info("Delete prefix done, bucket: {0}, prefix: {1}, deleted: {2}, failed: {3}, elapsed: {4:.1f}s, "
+                    "{5:.0f} keys/s".format(self.bucket.bucket_name, self.prefix, self.__deleted, self.__failed,
+                                            elapsed, self.__deleted / elapsed if elapsed > 0 else 0))
+
+        return self.__deleted
+
+    def __producer(self, q):
+        iterator = ObjectIterator(self.bucket, prefix=self.prefix, max_keys=_MAX_BATCH_DELETE,
+                                  max_retries=self.max_retries, prefetch=1)
+        try:
+            for page in iterator.iter_pages():
+                if page.keys:
+                    q.put(page.keys)
+        finally:
+            iterator.close()
+
+    def __consumer(self, q):
+        while q.ok():
+            keys = q.get()
+            if keys is None:
+                break
+
+            for i in range(self.max_retries):
+                result = _call_with_retry(self.max_retries, self.bucket.batch_delete_objects, keys, quiet=True)
+
+                # quiet模式下只返回删除失败的文件，只重试这些文件
+                failed = set(error[0] for error in result.errors)
+                self.__add_deleted(len(keys) - len(failed))
+
+                if not failed:
+                    break
+
+                logger.warning("Failed to delete {0} keys, first error: {1}".format(len(failed), result.errors[0]))
+                keys = [key for key in keys if key in failed]
+            else:
+                with self.__lock:
+                    self.__failed += len(keys)
+
+    def __add_deleted(self, count):
+        with self.__lock:
+            self.__deleted += count
+            deleted = self.__deleted
+
+            elapsed = time.time() - self.__start
+            logger.debug("Delete prefix progress, bucket: {0}, prefix: {1}, deleted: {2}, {3:.0f} keys/s".format(
+                self.bucket.bucket_name, self.prefix, deleted, deleted / elapsed if elapsed > 0 else 0))
+
+            _invoke_progress_callback(self.progress_callback, deleted, None)
+
+
+def _iter_concurrently(func, items, workers, ordered=False, max_in_flight=None):
+    """用 `workers` 个线程对 `items` 中的每个元素调用 `func` ，依次返回（元素，结果）。
+
+    `func` 抛出的 :class:`OssError <oss2.exceptions.OssError>` 作为该元素的结果返回，其他异常会直接抛出。
+    同时进行中（已经开始处理但还未返回）的元素不超过 `max_in_flight` 个，因此 `items` 可以是很长的迭代器。
+
+    调用者提前结束迭代（抛出异常、break或者close()）时，还没有开始的元素不再处理，并且要等正在处理的元素完成后才返回，
+    这样返回之后不会再有 `func` 在后台执行。
+
+    :param ordered: 为True时按 `items` 的顺序返回，否则按完成的先后返回
+    """
+    max_in_flight = max(defaults.get(max_in_flight, workers * 2), 1)
+
+    work_queue = queue.Queue()
+    done_queue = queue.Queue()
+    stopped = threading.Event()
+
+    def worker():
+        while True:
+            task = work_queue.get()
+            if task is None or stopped.is_set():
+                return
+
+            index, item = task
+            try:
+                done_queue.put((index, item, func(item), None))
+            except OssError as e:
+                done_queue.put((index, item, e, None))
+            except:
+                done_queue.put((index, item, None, sys.exc_info()))
+
+    threads = []
+    for i in range(workers):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    items = iter(items)
+    exhausted = False
+    submitted = 0
+    in_flight = 0
+    next_index = 0
+    finished = {}
+
+    try:
+        while True:
+            while not exhausted and in_flight < max_in_flight:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+
+                work_queue.put((submitted, item))
+                submitted += 1
+                in_flight += 1
+
+            if in_flight == 0:
+                return
+
+            index, item, result, exc_info = done_queue.get()
+            if exc_info is not None:
+                raise exc_info[1]
+
+            if not ordered:
+                in_flight -= 1
+                yield item, result
+                continue
+
+            # 按顺序返回时，先完成的结果要等前面的都返回后才能返回，它们也计入in_flight
+            finished[index] = (item, result)
+            while next_index in finished:
+                in_flight -= 1
+                next_index += 1
+                yield finished.pop(next_index - 1)
+    finally:
+        stopped.set()
+
+        # 丢弃还没有开始的元素
+        while True:
+            try:
+                work_queue.get_nowait()
+            except queue.Empty:
+                break
+
+        for t in threads:
+            work_queue.put(None)
+
+        for t in threads:
+            if t is not threading.current_thread():
+                t.join()
+
+
+def _head(bucket, light, headers, max_retries, key):
+    if light:
+        return _call_with_retry(max_retries, bucket.get_object_meta, key)
+    else:
+        return _call_with_retry(max_retries, bucket.head_object, key, headers=headers)
+
+
+def _batch_head(bucket, keys, workers=None, ordered=False, light=False, headers=None, max_retries=None,
+               max_in_flight=None):
+    workers = defaults.get(workers, defaults.batch_num_threads)
+    max_retries = defaults.get(max_retries, defaults.request_retries)
+
+    return _iter_concurrently(functools.partial(_head, bucket, light, headers, max(max_retries, 1)),
+                              keys, workers, ordered=ordered, max_in_flight=max_in_flight)
+
+
+_MIN_PART_SIZE = 100 * 1024
+_MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+_MAX_PART_COUNT = 10000
+
+
+class _ObjectComposer(object):
+    """把 `source_keys` 依次拼接成 `target_key` ，参见 :func:`Bucket.compose_objects <oss2.Bucket.compose_objects>` 。
+
+    每个分片由若干个源文件片段（文件名，起始，结束）组成：只有一个片段且不小于最小分片大小时用 `upload_part_copy` 在服务器端拷贝，
+    否则下载各个片段，拼接后用 `upload_part` 上传。
+    """
+    def __init__(self, bucket, target_key, source_keys, workers=None, headers=None, max_retries=None):
+        self.bucket = bucket
+        self.target_key = target_key
+        self.source_keys = list(source_keys)
+        self.workers = defaults.get(workers, defaults.batch_num_threads)
+        self.headers = headers
+
+        max_retries = defaults.get(max_retries, defaults.request_retries)
+        self.max_retries = max_retries if max_retries > 0 else 1
+
+        self.__sources = {}
+
+    def compose(self):
+        if not self.source_keys:
+            raise ClientError('no source objects to compose')
+
+        self.__head_sources()
+
+        parts = self.__plan_parts()
+        if not parts:
+            # 源文件都是空文件，分片上传至少需要一个分片，直接写入空文件
+            return self.bucket.put_object(self.target_key, b'', headers=self.headers)
+
+        if len(parts) > _MAX_PART_COUNT:
+            raise ClientError('too many parts to compose: {0}'.format(len(parts)))
+
+        upload_id = self.bucket.init_multipart_upload(self.target_key, headers=self.headers).upload_id
+
+        try:
+            part_infos = []
+            for part, result in _iter_concurrently(functools.partial(self.__process_part, upload_id),
+                                                   enumerate(parts, 1), self.workers):
+                if isinstance(result, OssError):
+                    raise result
+                part_infos.append(result)
+
+            part_infos.sort(key=lambda p: p.part_number)
+            result = self.bucket.complete_multipart_upload(self.target_key, upload_id, part_infos)
+        except:
+            self.bucket.abort_multipart_upload(self.target_key, upload_id)
+            raise
+
+        if self.bucket.enable_crc:
+            # 不回读数据，由各个源文件的CRC64合并出目标文件的CRC64
+            sources = [PartInfo(0, None, size=size, part_crc=crc) for size, etag, crc in
+                       (self.__sources[key] for key in self.source_keys) if size > 0]
+            check_crc('compose objects', calc_obj_crc_from_parts(sources), result.crc, result.request_id)
+
+        return result
+
+    def __head_sources(self):
+        for key, result in _batch_head(self.bucket, set(self.source_keys), workers=self.workers,
+                                       max_retries=self.max_retries):
+            if isinstance(result, OssError):
+                raise result
+            self.__sources[key] = (result.content_length, result.etag, result.server_crc)
+
+    def __plan_parts(self):
+        parts = []
+        pending = []
+        pending_size = 0
+
+        for key in self.source_keys:
+            size = self.__sources[key][0]
+            if size == 0:
+                continue
+
+            start = 0
+
+            # 先用源文件开头的数据把未满最小分片大小的片段补齐
+            if pending_size > 0:
+                n = min(_MIN_PART_SIZE - pending_size, size)
+                pending.append((key, 0, n))
+                pending_size += n
+                start = n
+
+                if pending_size >= _MIN_PART_SIZE:
+                    parts.append(pending)
+                    pending, pending_size = [], 0
+
+            remaining = size - start
+            if remaining == 0:
+                continue
+
+            if remaining < _MIN_PART_SIZE:
+                pending.append((key, start, size))
+                pending_size += remaining
+                continue
+
+            count = (remaining + _MAX_PART_SIZE - 1) // _MAX_PART_SIZE
+            for i in range(count):
+                parts.append([(key, start + remaining * i // count, start + remaining * (i + 1) // count)])
+
+        if pending:
+            parts.append(pending)
+
+        return parts
+
+    def __process_part(self, upload_id, numbered_part):
+        part_number, segments = numbered_part
+
+        if len(segments) == 1 and segments[0][2] - segments[0][1] >= _MIN_PART_SIZE:
+            key, start, end = segments[0]
+            result = _call_with_retry(self.max_retries, self.bucket.upload_part_copy,
+                                      self.bucket.bucket_name, key, (start, end - 1),
+                                      self.target_key, upload_id, part_number,
+                                      headers={OSS_COPY_OBJECT_SOURCE_IF_MATCH: self.__sources[key][1]})
+        else:
+            data = b''.join(_call_with_retry(self.max_retries, self.__read_segment, segment) for segment in segments)
+            result = _call_with_retry(self.max_retries, self.bucket.upload_part,
+                                      self.target_key, upload_id, part_number, data)
+
+        return PartInfo(part_number, result.etag, size=sum(end - start for key, start, end in segments),
+                        part_crc=result.crc)
+
+    def __read_segment(self, segment):
+        key, start, end = segment
+        return self.bucket.get_object(key, byte_range=(start, end - 1),
+                                      headers={IF_MATCH: self.__sources[key][1]}).read()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+oss2.cache
+~~~~~~~~~~
+
+文件元信息的本地缓存。
+
+用法 ::
+
+    >>> cache = oss2.MetadataCache(max_entries=10000, ttl=30)
+    >>> bucket = oss2.Bucket(auth, endpoint, 'my-bucket', metadata_cache=cache)
+    >>> bucket.head_object('hot.jpg')      # 访问OSS
+    >>> bucket.head_object('hot.jpg')      # 命中缓存
+    >>> cache.hits, cache.misses
+    (1, 1)
+"""
+
+import collections
+import threading
+import time
+
+
+class MetadataCache(object):
+    """缓存 :func:`head_object <oss2.Bucket.head_object>` 和 :func:`get_object_meta <oss2.Bucket.get_object_meta>` 的结果。
+
+    缓存按最近最少使用（LRU）的原则淘汰，最多保存 `max_entries` 条。缓存超过 `ttl` 秒后，下一次访问会带上
+    `If-None-Match` 头部向OSS确认：文件未修改（304）时继续使用缓存的结果，否则用新的结果替换。
+
+    同一个Bucket对象上的上传、追加、拷贝、删除、完成分片上传等写操作会自动清除对应文件的缓存；
+    其他客户端对文件的修改在 `ttl` 秒之内不可见。
+
+    一个缓存可以被多个Bucket对象、多个线程共用。
+
+    :param int max_entries: 最多缓存的条目数
+    :param float ttl: 缓存结果不经确认即可使用的秒数
+    """
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        #: 直接使用缓存结果的次数
+        self.hits = 0
+
+        #: 缓存中没有结果的次数
+        self.misses = 0
+
+        #: 缓存过期后经OSS确认未修改（304）的次数
+        self.revalidations = 0
+
+        #: 因超出 `max_entries` 而被淘汰的条目数
+        self.evictions = 0
+
+        self.__lock = threading.Lock()
+        self.__entries = collections.OrderedDict()
+
+        # 每个文件最近一次被清除时的代数，同样最多保存 `max_entries` 条；
+        # 没有记录的文件取被淘汰记录中最大的代数
+        self.__clock = 0
+        self.__generations = collections.OrderedDict()
+        self.__min_generation = 0
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+    def get(self, bucket_name, key, kind):
+        """返回（缓存的结果，是否仍在有效期内）；没有缓存时返回（None，False），并计为一次未命中。"""
+        cache_key = (bucket_name, key, kind)
+
+        with self.__lock:
+            entry = self.__entries.pop(cache_key, None)
+            if entry is None:
+                self.misses += 1
+                return None, False
+
+            self.__entries[cache_key] = entry
+
+            result, expires_at = entry
+            if time.time() < expires_at:
+                self.hits += 1
+                return result, True
+
+            return result, False
+
+    def generation(self, bucket_name, key):
+        """返回文件当前的代数。 :func:`invalidate` 会使代数增大，在发请求之前取得，传给 :func:`put` 。"""
+        with self.__lock:
+            return self.__generations.get((bucket_name, key), self.__min_generation)
+
+    def put(self, bucket_name, key, kind, result, revalidated=False, generation=None):
+        """缓存一个结果。如果指定了 `generation` ，而文件在此之后被清除过，说明结果可能已经过时，不再缓存。"""
+        cache_key = (bucket_name, key, kind)
+
+        with self.__lock:
+            if revalidated:
+                self.revalidations += 1
+
+            if generation is not None and \
+                    generation != self.__generations.get((bucket_name, key), self.__min_generation):
+                return
+
+            self.__entries.pop(cache_key, None)
+            self.__entries[cache_key] = (result, time.time() + self.ttl)
+
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, bucket_name, key):
+        """清除一个文件的所有缓存结果。"""
+        with self.__lock:
+            for kind in _KINDS:
+                self.__entries.pop((bucket_name, key, kind), None)
+
+            self.__clock += 1
+            self.__generations.pop((bucket_name, key), None)
+            self.__generations[(bucket_name, key)] = self.__clock
+
+            while len(self.__generations) > self.max_entries:
+                self.__min_generation = self.__generations.popitem(last=False)[1]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+            self.__clock += 1
+            self.__generations.clear()
+            self.__min_generation = self.__clock
+
+
+_KIND_HEAD = 'head'
+_KIND_META = 'meta'
+
+_KINDS = (_KIND_HEAD, _KIND_META)
@@ -6,25 +6,32 @@ oss2.encryption
 
 该模块包含了客户端加解密相关的函数和类。
 """
+import collections
+import io
 import json
+import sys
+import threading
+import time
 from functools import partial
 
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
 from oss2.utils import b64decode_from_string, b64encode_as_string
+from . import defaults
 from . import utils
 from .compat import to_string, to_bytes, to_unicode
 from .exceptions import OssError, ClientError, OpenApiFormatError, OpenApiServerError
 
-from Crypto.Cipher import PKCS1_OAEP
-from Crypto.PublicKey import RSA
 from requests.structures import CaseInsensitiveDict
 
-from aliyunsdkcore import client
-from aliyunsdkcore.acs_exception.exceptions import ServerException, ClientException
-from aliyunsdkcore.http import protocol_type, format_type, method_type
-from aliyunsdkkms.request.v20160120 import ListKeysRequest, GenerateDataKeyRequest, DecryptRequest, EncryptRequest
-
 import os
 
+# Crypto（pycryptodome）以及aliyunsdkcore、aliyunsdkkms加载较慢，而大部分程序并不使用客户端加密，
+# 因此只在创建LocalRsaProvider、AliKMSProvider或者实际加解密时才加载
+
 
 class BaseCryptoProvider(object):
     """CryptoProvider 基类，提供基础的数据加密解密adapter
@@ -35,12 +42,456 @@ class BaseCryptoProvider(object):
         self.plain_start = None
         self.cipher = cipher
 
+        self.__context_lock = threading.Lock()
+
+    def make_crypto_context(self, headers=None):
+        """为一次上传生成数据密钥和计数器初始值，返回 :class:`CryptoContext` 。
+
+        每次上传使用各自的上下文，不通过provider的属性传递数据密钥等，因此多个线程可以用同一个provider同时上传。
+        缺省实现在锁的保护下依次调用 `get_key` 、 `get_start` 和 `build_header` 。
+
+        :param headers: 用户指定的HTTP头部，返回的上下文中的 `headers` 是加入了加密元信息后的头部
+        """
+        with self.__context_lock:
+            plain_key = self.get_key()
+            plain_start = self.get_start()
+            headers = self.build_header(headers)
+
+        return CryptoContext(plain_key, plain_start, headers)
+
     def make_encrypt_adapter(self, stream, key, start):
+        stream = to_bytes(stream)
+        if self.__can_parallelize(stream):
+            return _ParallelCipherAdapter(stream, lambda offset: self.cipher(key, _window_start(start, offset)).encrypt)
+
         return utils.make_cipher_adapter(stream, partial(self.cipher.encrypt, self.cipher(key, start)))
 
-    def make_decrypt_adapter(self, stream, key, start):
+    def make_decrypt_adapter(self, stream, key, start, size=None):
+        """返回解密 `stream` 的适配器。 `size` 为数据长度（如HTTP响应的Content-Length），已知时用来决定是否需要并发解密。"""
+        stream = to_bytes(stream)
+        if self.__can_parallelize(stream, size):
+            return _ParallelCipherAdapter(stream, lambda offset: self.cipher(key, _window_start(start, offset)).decrypt,
+                                          size=size)
+
         return utils.make_cipher_adapter(stream, partial(self.cipher.decrypt, self.cipher(key, start)))
 
+    def __can_parallelize(self, stream, size=None):
+        # 只有AES-CTR可以按偏移直接算出计数器；长度已知且不超过一个窗口时没有必要
+        if not issubclass(self.cipher, utils.AESCipher) or defaults.crypto_num_threads <= 1:
+            return False
+
+        if not isinstance(stream, bytes) and not hasattr(stream, 'read'):
+            return False
+
+        if size is None and utils._has_data_size_attr(stream):
+            size = utils._get_data_size(stream)
+
+        return size is None or size > defaults.crypto_window_size
+
+
+_CRYPTO_META_KEYS = ('x-oss-meta-oss-crypto-key', 'x-oss-meta-oss-crypto-start',
+                     'x-oss-meta-oss-cek-alg', 'x-oss-meta-oss-wrap-alg')
+
+# AES的块大小，CTR模式下每个块对应计数器加1
+_AES_BLOCK_SIZE = 16
+
+
+def _window_start(start, offset):
+    return int(start) + offset // _AES_BLOCK_SIZE
+
+
+class _ParallelCipherAdapter(object):
+    """用多个线程对 `data` 进行AES-CTR加解密的适配器。
+
+    `data` 被切成长度为 `window_size` 的窗口，每个窗口按其偏移算出计数器初始值，在进程内共享的线程池中独立地加解密，
+    读取时按原来的顺序返回。只在最前面的窗口还没有处理完时才继续读取后面的窗口，最多预先处理 `num_threads` * 2 个窗口；
+    只有一个窗口时直接在当前线程中处理。
+
+    :param data: bytes或file-like object
+    :param make_cipher: 参数为窗口的偏移，返回对该窗口进行加解密的函数
+    :param size: `data` 的长度，如不指定则尽量从 `data` 获取
+    """
+    def __init__(self, data, make_cipher, num_threads=None, window_size=None, size=None):
+        self.num_threads = defaults.get(num_threads, defaults.crypto_num_threads)
+        self.window_size = defaults.get(window_size, defaults.crypto_window_size)
+
+        if self.window_size <= 0 or self.window_size % _AES_BLOCK_SIZE:
+            raise ClientError('window_size should be a positive multiple of {0}'.format(_AES_BLOCK_SIZE))
+
+        self.size = size
+        if self.size is None and utils._has_data_size_attr(data):
+            self.size = utils._get_data_size(data)
+        if self.size is not None:
+            self.len = self.size
+
+        self.data = data
+        self.make_cipher = make_cipher
+
+        self.__fileobj = io.BytesIO(data) if isinstance(data, bytes) else data
+        self.__read = 0
+        self.__results = self.__iter_results()
+        self.__buffer = b''
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        content = self.read(utils._CHUNK_SIZE)
+        if not content:
+            raise StopIteration
+
+        return content
+
+    def read(self, amt=None):
+        chunks = [self.__buffer]
+        got = len(self.__buffer)
+
+        while amt is None or got < amt:
+            content = next(self.__results, None)
+            if content is None:
+                break
+
+            chunks.append(content)
+            got += len(content)
+
+        content = b''.join(chunks)
+        if amt is None or got <= amt:
+            self.__buffer = b''
+            return content
+
+        self.__buffer = content[amt:]
+        return content[:amt]
+
+    @property
+    def crc(self):
+        return getattr(self.data, 'crc', None)
+
+    def __read_window(self):
+        n = self.window_size
+        if self.size is not None:
+            n = min(n, self.size - self.__read)
+
+        chunks = []
+        got = 0
+        while got < n:
+            content = self.__fileobj.read(n - got)
+            if not content:
+                break
+
+            chunks.append(content)
+            got += len(content)
+
+        offset = self.__read
+        self.__read += got
+
+        return offset, b''.join(chunks)
+
+    def __iter_results(self):
+        max_in_flight = max(self.num_threads, 1) * 2
+        pending = collections.deque()
+        eof = False
+
+        while True:
+            while not eof and len(pending) < max_in_flight and not (pending and pending[0].done()):
+                window = self.__read_window()
+                if len(window[1]) < self.window_size or self.__read == self.size:
+                    eof = True
+
+                if not window[1]:
+                    break
+
+                # 前面没有待处理的窗口，而这又是最后一个窗口，就不必交给线程池
+                if not pending and eof:
+                    yield self.__process(window)
+                    break
+
+                pending.append(_cipher_pool.submit(self.__process, window))
+
+            if not pending:
+                return
+
+            yield pending.popleft().get()
+
+    def __process(self, window):
+        offset, content = window
+        return self.make_cipher(offset)(content)
+
+
+class _CipherTask(object):
+    def __init__(self, func, arg):
+        self.func = func
+        self.arg = arg
+        self.result = None
+        self.exc_info = None
+        self.__event = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.func(self.arg)
+        except:
+            self.exc_info = sys.exc_info()
+
+        self.arg = None
+        self.__event.set()
+
+    def done(self):
+        return self.__event.is_set()
+
+    def get(self):
+        self.__event.wait()
+        if self.exc_info:
+            raise self.exc_info[1]
+
+        return self.result
+
+
+class _CipherPool(object):
+    """进程内共享的加解密线程池，线程在需要时才创建，个数不超过 `oss2.defaults.crypto_num_threads` 。"""
+    def __init__(self):
+        self.__queue = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__threads = 0
+
+    def submit(self, func, arg):
+        task = _CipherTask(func, arg)
+
+        with self.__lock:
+            if self.__threads < defaults.crypto_num_threads:
+                t = threading.Thread(target=self.__worker)
+                t.daemon = True
+                t.start()
+                self.__threads += 1
+
+        self.__queue.put(task)
+        return task
+
+    def __worker(self):
+        while True:
+            self.__queue.get().run()
+
+
+_cipher_pool = _CipherPool()
+
+
+class CryptoContext(object):
+    """一次上传使用的数据密钥、计数器初始值和HTTP头部，由 :func:`BaseCryptoProvider.make_crypto_context` 生成。
+
+    :param plain_key: 明文数据密钥
+    :param int plain_start: 计数器初始值
+    :param headers: 加入了加密元信息（x-oss-meta-oss-crypto-*等）的HTTP头部
+    """
+    def __init__(self, plain_key, plain_start, headers):
+        self.plain_key = plain_key
+        self.plain_start = plain_start
+        self.headers = headers
+
+    @property
+    def envelope(self):
+        """加密元信息，可以用 :func:`MultipartCryptoContext.from_envelope` 恢复出数据密钥。"""
+        return dict((name, self.headers[name]) for name in _CRYPTO_META_KEYS)
+
+
+class MultipartCryptoContext(object):
+    """分片上传时各个分片共用的加密上下文，由 :func:`CryptoBucket.init_multipart_upload <oss2.CryptoBucket.init_multipart_upload>` 生成。
+
+    整个文件用同一个数据密钥加密。AES-CTR的计数器可以按偏移直接定位：从偏移 `offset` 开始的分片，计数器初始值为
+    `start + offset / 16` ，因此各个分片可以独立、并发地加密， `part_size` 必须是16的倍数。
+
+    :param crypto_provider: 客户端加密类
+    :param plain_key: 明文数据密钥
+    :param plain_start: 计数器初始值
+    :param dict envelope: 加密后的数据密钥等元信息，即上传时设置的x-oss-meta-oss-crypto-*等头部。
+        可以持久保存，之后用 :func:`from_envelope` 恢复上下文
+    :param int part_size: 分片大小
+    """
+    def __init__(self, crypto_provider, plain_key, plain_start, envelope, part_size):
+        if part_size % _AES_BLOCK_SIZE:
+            raise ClientError('part_size should be a multiple of {0} for crypto bucket'.format(_AES_BLOCK_SIZE))
+
+        self.crypto_provider = crypto_provider
+        self.plain_key = plain_key
+        self.plain_start = int(plain_start)
+        self.envelope = envelope
+        self.part_size = part_size
+
+    @staticmethod
+    def from_envelope(crypto_provider, envelope, part_size):
+        """用保存下来的 `envelope` 解密出数据密钥，恢复加密上下文。"""
+        plain_key = crypto_provider.decrypt_oss_meta_data(envelope, 'x-oss-meta-oss-crypto-key')
+        plain_start = crypto_provider.decrypt_oss_meta_data(envelope, 'x-oss-meta-oss-crypto-start')
+        if not plain_key or not plain_start:
+            raise ClientError('failed to decrypt the data key of multipart upload')
+
+        return MultipartCryptoContext(crypto_provider, plain_key, plain_start, envelope, part_size)
+
+    def make_encrypt_adapter(self, data, offset):
+        """返回从文件偏移 `offset` 处开始加密 `data` 的适配器， `offset` 必须是16的倍数。"""
+        if offset % _AES_BLOCK_SIZE:
+            raise ClientError('offset should be a multiple of {0}'.format(_AES_BLOCK_SIZE))
+
+        return self.crypto_provider.make_encrypt_adapter(data, self.plain_key,
+                                                         self.plain_start + offset // _AES_BLOCK_SIZE)
+
+
+# 复用数据密钥时，每个文件占用的计数器区间大小（以块计）。单个文件的块数远小于该值，因此同一个数据密钥下各个文件的
+# 计数器区间不会重叠，不会产生相同的密钥流
+_COUNTER_SLOT_BLOCKS = 1 << 64
+
+
+class DataKeyCache(object):
+    """数据密钥缓存，用来减少 :class:`AliKMSProvider` 访问KMS、 :class:`LocalRsaProvider` 做RSA运算的次数。
+
+    上传时，同一个数据密钥最多用于 `max_uses` 个文件，生成后超过 `ttl` 秒也不再使用。复用同一个数据密钥的各个文件，
+    计数器初始值依次错开 2^64 ，保证密钥流不会重复。
+
+    缓存只能省去生成、加密数据密钥（KMS的GenerateDataKey或者RSA加密）的开销：每个文件的计数器初始值各不相同，
+    上传时依然要各自加密（KMS的Encrypt），下载时也依然要各自解密计数器初始值（KMS的Decrypt）。
+
+    下载时，以加密后的数据密钥（即 x-oss-meta-oss-crypto-key 等头部的值，如KMS的CiphertextBlob）为键缓存解密结果，
+    最多缓存 `max_entries` 项，每项最多保留 `ttl` 秒。
+
+    缓存中的明文密钥在淘汰时会被清零。
+
+    用法 ::
+
+        >>> cache = oss2.DataKeyCache(max_uses=100, ttl=300)
+        >>> provider = oss2.AliKMSProvider(access_key_id, access_key_secret, region, cmkey, key_cache=cache)
+        >>> bucket = oss2.CryptoBucket(auth, endpoint, bucket_name, crypto_provider=provider)
+
+    :param int max_uses: 每个数据密钥最多用于多少个文件
+    :param ttl: 数据密钥及解密结果的有效时间，单位为秒
+    :param int max_entries: 最多缓存多少个解密结果
+
+    统计信息：
+
+    - `generated` 生成数据密钥的次数
+    - `reused` 复用已有数据密钥的次数
+    - `hits` 解密命中缓存的次数
+    - `misses` 解密未命中缓存的次数
+    - `evicted` 被淘汰并清零的明文密钥个数
+    """
+    def __init__(self, max_uses=1000, ttl=300, max_entries=1000):
+        if max_uses < 1 or max_uses >= _COUNTER_SLOT_BLOCKS:
+            raise ClientError('max_uses should be in [1, 2^64)')
+
+        self.max_uses = max_uses
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.generated = 0
+        self.reused = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        self.__lock = threading.Lock()
+
+        self.__plain_key = None
+        self.__encrypted_key = None
+        self.__created = 0
+        self.__uses = 0
+
+        # 加密的数据 -> (明文, 缓存时间)，按最近使用的顺序排列
+        self.__decrypted = {}
+        self.__order = []
+
+    def acquire(self, generate, get_start):
+        """获取上传用的数据密钥和计数器初始值。
+
+        数据密钥和计数器区间在同一次加锁中分配，因此同时上传的文件不会用同一个数据密钥得到重叠的计数器区间。
+
+        :param generate: 生成数据密钥的函数，返回(明文密钥, 加密后的密钥)
+        :param get_start: 生成计数器初始值的函数，返回值要小于 2^64
+
+        :return: (明文密钥, 加密后的密钥, 计数器初始值)
+        """
+        with self.__lock:
+            now = time.time()
+            if self.__plain_key is None or self.__uses >= self.max_uses or now - self.__created >= self.ttl:
+                plain_key, encrypted_key = generate()
+
+                self.__zeroize(self.__plain_key)
+                self.__plain_key = bytearray(plain_key)
+                self.__encrypted_key = encrypted_key
+                self.__created = now
+                self.__uses = 0
+                self.generated += 1
+
+                # 同一个进程中读取刚上传的文件时不需要再解密数据密钥
+                self.__put(encrypted_key, plain_key, now)
+            else:
+                self.reused += 1
+
+            start = get_start() + self.__uses * _COUNTER_SLOT_BLOCKS
+            self.__uses += 1
+
+            return bytes(self.__plain_key), self.__encrypted_key, start
+
+    def decrypt(self, data, decrypt):
+        """返回 `data` 解密后的结果，未命中时调用 `decrypt(data)` 并缓存结果。解密失败（返回None）不缓存。"""
+        with self.__lock:
+            now = time.time()
+            entry = self.__decrypted.get(data)
+            if entry is not None and now - entry[1] < self.ttl:
+                self.hits += 1
+                self.__order.remove(data)
+                self.__order.append(data)
+                return self.__copy(entry[0])
+
+            self.misses += 1
+
+        plain = decrypt(data)
+        if plain is None:
+            return None
+
+        with self.__lock:
+            self.__put(data, plain, time.time())
+
+        return plain
+
+    def clear(self):
+        """清空缓存，并清零所有明文密钥。"""
+        with self.__lock:
+            self.__zeroize(self.__plain_key)
+            self.__plain_key = None
+            self.__encrypted_key = None
+
+            for data in self.__order:
+                self.__zeroize(self.__decrypted[data][0])
+            self.__decrypted.clear()
+            del self.__order[:]
+
+    def __put(self, data, plain, now):
+        if data in self.__decrypted:
+            self.__order.remove(data)
+            self.__zeroize(self.__decrypted[data][0])
+
+        if isinstance(plain, bytes):
+            plain = bytearray(plain)
+
+        self.__decrypted[data] = (plain, now)
+        self.__order.append(data)
+
+        while len(self.__order) > self.max_entries or now - self.__decrypted[self.__order[0]][1] >= self.ttl:
+            oldest = self.__order.pop(0)
+            self.__zeroize(self.__decrypted.pop(oldest)[0])
+            if not self.__order:
+                break
+
+    def __zeroize(self, plain):
+        if isinstance(plain, bytearray):
+            plain[:] = b'\0' * len(plain)
+            self.evicted += 1
+
+    @staticmethod
+    def __copy(plain):
+        if isinstance(plain, bytearray):
+            return bytes(plain)
+        return plain
+
 
 _LOCAL_RSA_TMP_DIR = '.oss-local-rsa'
 
@@ -52,19 +503,30 @@ class LocalRsaProvider(BaseCryptoProvider):
         :param str key: 本地RSA公钥私钥名称前缀
         :param str passphrase: 本地RSA公钥私钥密码
         :param class cipher: 数据加密，默认aes256，用户可自行实现对称加密算法，需符合AESCipher注释规则
+        :param key_cache: 数据密钥缓存，参见 :class:`DataKeyCache` 。缺省不缓存，仅支持默认的aes256
     """
 
     PUB_KEY_FILE = '.public_key.pem'
     PRIV_KEY_FILE = '.private_key.pem'
 
-    def __init__(self, dir=None, key='', passphrase=None, cipher=utils.AESCipher):
+    def __init__(self, dir=None, key='', passphrase=None, cipher=utils.AESCipher, key_cache=None):
+        if key_cache is not None and not issubclass(cipher, utils.AESCipher):
+            raise ClientError('key_cache only support AES256 cipher')
+
         super(LocalRsaProvider, self).__init__(cipher=cipher)
         self.dir = dir or os.path.join(os.path.expanduser('~'), _LOCAL_RSA_TMP_DIR)
+        self.key_cache = key_cache
+
+        self.__encrypted_key = None
+        self.__cached_start = None
 
         utils.makedir_p(self.dir)
 
         priv_key_full_path = os.path.join(self.dir, key + self.PRIV_KEY_FILE)
         pub_key_full_path = os.path.join(self.dir, key + self.PUB_KEY_FILE)
+        from Crypto.Cipher import PKCS1_OAEP
+        from Crypto.PublicKey import RSA
+
         try:
             if os.path.exists(priv_key_full_path) and os.path.exists(pub_key_full_path):
                 with open(priv_key_full_path, 'rb') as f:
@@ -89,6 +551,40 @@ class LocalRsaProvider(BaseCryptoProvider):
             raise ClientError(str(e))
 
     def build_header(self, headers=None):
+        headers = self.__build_header(headers, self.plain_key, self.__encrypted_key, self.plain_start)
+
+        self.plain_key = None
+        self.plain_start = None
+        self.__encrypted_key = None
+
+        return headers
+
+    def get_key(self):
+        if self.key_cache is None:
+            self.plain_key = self.cipher.get_key()
+        else:
+            self.plain_key, self.__encrypted_key, self.__cached_start = self.key_cache.acquire(self.__generate_data_key,
+                                                                                               self.cipher.get_start)
+        return self.plain_key
+
+    def get_start(self):
+        if self.__cached_start is not None:
+            self.plain_start, self.__cached_start = self.__cached_start, None
+        else:
+            self.plain_start = self.cipher.get_start()
+        return self.plain_start
+
+    def make_crypto_context(self, headers=None):
+        if self.key_cache is None:
+            plain_key, encrypted_key, plain_start = self.cipher.get_key(), None, self.cipher.get_start()
+        else:
+            plain_key, encrypted_key, plain_start = self.key_cache.acquire(self.__generate_data_key,
+                                                                           self.cipher.get_start)
+
+        headers = self.__build_header(headers, plain_key, encrypted_key, plain_start)
+        return CryptoContext(plain_key, plain_start, headers)
+
+    def __build_header(self, headers, plain_key, encrypted_key, plain_start):
         if not isinstance(headers, CaseInsensitiveDict):
             headers = CaseInsensitiveDict(headers)
 
@@ -100,30 +596,29 @@ class LocalRsaProvider(BaseCryptoProvider):
             headers['x-oss-meta-unencrypted-content-length'] = headers['content-length']
             del headers['content-length']
 
-        headers['x-oss-meta-oss-crypto-key'] = b64encode_as_string(self.__encrypt_obj.encrypt(self.plain_key))
-        headers['x-oss-meta-oss-crypto-start'] = b64encode_as_string(self.__encrypt_obj.encrypt(to_bytes(str(self.plain_start))))
+        headers['x-oss-meta-oss-crypto-key'] = encrypted_key or b64encode_as_string(self.__encrypt_obj.encrypt(plain_key))
+        headers['x-oss-meta-oss-crypto-start'] = b64encode_as_string(self.__encrypt_obj.encrypt(to_bytes(str(plain_start))))
         headers['x-oss-meta-oss-cek-alg'] = self.cipher.ALGORITHM
         headers['x-oss-meta-oss-wrap-alg'] = 'rsa'
 
-        self.plain_key = None
-        self.plain_start = None
-
         return headers
 
-    def get_key(self):
-        self.plain_key = self.cipher.get_key()
-        return self.plain_key
-
-    def get_start(self):
-        self.plain_start = self.cipher.get_start()
-        return self.plain_start
+    def __generate_data_key(self):
+        plain_key = self.cipher.get_key()
+        return plain_key, b64encode_as_string(self.__encrypt_obj.encrypt(plain_key))
 
     def decrypt_oss_meta_data(self, headers, key, conv=lambda x:x):
         try:
-            return conv(self.__decrypt_obj.decrypt(utils.b64decode_from_string(headers[key])))
+            if self.key_cache is None:
+                return conv(self.__decrypt(headers[key]))
+            else:
+                return conv(self.key_cache.decrypt(headers[key], self.__decrypt))
         except:
             return None
 
+    def __decrypt(self, data):
+        return self.__decrypt_obj.decrypt(utils.b64decode_from_string(data))
+
 
 class AliKMSProvider(BaseCryptoProvider):
     """使用aliyun kms服务加密数据密钥。kms的详细说明参见
@@ -138,8 +633,10 @@ class AliKMSProvider(BaseCryptoProvider):
         :param str sts_token: security token，如果使用的是临时AK需提供
         :param str passphrase: kms密钥服务密码
         :param class cipher: 数据加密，默认aes256，当前仅支持默认实现
+        :param key_cache: 数据密钥缓存，参见 :class:`DataKeyCache` 。缺省不缓存
     """
-    def __init__(self, access_key_id, access_key_secret, region, cmkey, sts_token = None, passphrase=None, cipher=utils.AESCipher):
+    def __init__(self, access_key_id, access_key_secret, region, cmkey, sts_token = None, passphrase=None, cipher=utils.AESCipher,
+                 key_cache=None):
 
         if not issubclass(cipher, utils.AESCipher):
             raise ClientError('AliKMSProvider only support AES256 cipher')
@@ -148,11 +645,49 @@ class AliKMSProvider(BaseCryptoProvider):
         self.cmkey = cmkey
         self.sts_token = sts_token
         self.context = '{"x-passphrase":"' + passphrase + '"}' if passphrase else ''
+        from aliyunsdkcore import client
+
         self.clt = client.AcsClient(access_key_id, access_key_secret, region)
+        self.key_cache = key_cache
 
         self.encrypted_key = None
+        self.__cached_start = None
 
     def build_header(self, headers=None):
+        headers = self.__build_header(headers, self.encrypted_key, self.plain_start)
+
+        self.encrypted_key = None
+        self.plain_start = None
+
+        return headers
+
+    def get_key(self):
+        if self.key_cache is None:
+            plain_key, self.encrypted_key = self.__generate_data_key()
+        else:
+            plain_key, self.encrypted_key, self.__cached_start = self.key_cache.acquire(self.__generate_data_key,
+                                                                                        utils.random_counter)
+        return plain_key
+
+    def get_start(self):
+        if self.__cached_start is not None:
+            self.plain_start, self.__cached_start = self.__cached_start, None
+        else:
+            self.plain_start = utils.random_counter()
+        return self.plain_start
+
+    def make_crypto_context(self, headers=None):
+        if self.key_cache is None:
+            plain_key, encrypted_key = self.__generate_data_key()
+            plain_start = utils.random_counter()
+        else:
+            plain_key, encrypted_key, plain_start = self.key_cache.acquire(self.__generate_data_key,
+                                                                           utils.random_counter)
+
+        headers = self.__build_header(headers, encrypted_key, plain_start)
+        return CryptoContext(plain_key, plain_start, headers)
+
+    def __build_header(self, headers, encrypted_key, plain_start):
         if not isinstance(headers, CaseInsensitiveDict):
             headers = CaseInsensitiveDict(headers)
         if 'content-md5' in headers:
@@ -163,25 +698,17 @@ class AliKMSProvider(BaseCryptoProvider):
             headers['x-oss-meta-unencrypted-content-length'] = headers['content-length']
             del headers['content-length']
 
-        headers['x-oss-meta-oss-crypto-key'] = self.encrypted_key
-        headers['x-oss-meta-oss-crypto-start'] = self.__encrypt_data(to_bytes(str(self.plain_start)))
+        headers['x-oss-meta-oss-crypto-key'] = encrypted_key
+        headers['x-oss-meta-oss-crypto-start'] = self.__encrypt_data(to_bytes(str(plain_start)))
         headers['x-oss-meta-oss-cek-alg'] = self.cipher.ALGORITHM
         headers['x-oss-meta-oss-wrap-alg'] = 'kms'
 
-        self.encrypted_key = None
-        self.plain_start = None
-
         return headers
 
-    def get_key(self):
-        plain_key, self.encrypted_key = self.__generate_data_key()
-        return plain_key
-
-    def get_start(self):
-        self.plain_start = utils.random_counter()
-        return self.plain_start
-
     def __generate_data_key(self):
+        from aliyunsdkcore.http import format_type, method_type
+        from aliyunsdkkms.request.v20160120 import GenerateDataKeyRequest
+
         req = GenerateDataKeyRequest.GenerateDataKeyRequest()
 
         req.set_accept_format(format_type.JSON)
@@ -199,6 +726,9 @@ class AliKMSProvider(BaseCryptoProvider):
         return b64decode_from_string(resp['Plaintext']), resp['CiphertextBlob']
 
     def __encrypt_data(self, data):
+        from aliyunsdkcore.http import format_type, method_type
+        from aliyunsdkkms.request.v20160120 import EncryptRequest
+
         req = EncryptRequest.EncryptRequest()
 
         req.set_accept_format(format_type.JSON)
@@ -214,6 +744,9 @@ class AliKMSProvider(BaseCryptoProvider):
         return resp['CiphertextBlob']
 
     def __decrypt_data(self, data):
+        from aliyunsdkcore.http import format_type, method_type
+        from aliyunsdkkms.request.v20160120 import DecryptRequest
+
         req = DecryptRequest.DecryptRequest()
 
         req.set_accept_format(format_type.JSON)
@@ -227,6 +760,7 @@ class AliKMSProvider(BaseCryptoProvider):
         return resp['Plaintext']
 
     def __do(self, req):
+        from aliyunsdkcore.acs_exception.exceptions import ServerException, ClientException
 
         try:
             body = self.clt.do_action_with_exception(req)
@@ -242,9 +776,14 @@ class AliKMSProvider(BaseCryptoProvider):
     def decrypt_oss_meta_data(self, headers, key, conv=lambda x: x):
         try:
             if key.lower() == 'x-oss-meta-oss-crypto-key'.lower():
-                return conv(b64decode_from_string(self.__decrypt_data(headers[key])))
+                decrypt = lambda data: b64decode_from_string(self.__decrypt_data(data))
+            else:
+                decrypt = self.__decrypt_data
+
+            if self.key_cache is None:
+                return conv(decrypt(headers[key]))
             else:
-                return conv(self.__decrypt_data(headers[key]))
+                return conv(self.key_cache.decrypt(headers[key], decrypt))
         except OssError as e:
             raise e
         except:
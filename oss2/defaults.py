@@ -25,6 +25,9 @@ request_retries = 3
 #: 对于某些接口，上传数据长度大于或等于该值时，就采用分片上传。
 multipart_threshold = 10 * 1024 * 1024
 
+#: 拷贝文件时，文件长度大于或等于该值就采用分片拷贝（upload_part_copy）
+multipart_copy_threshold = 1024 * 1024 * 1024
+
 #: 分片上传缺省线程数
 multipart_num_threads = 1
 
@@ -32,9 +35,27 @@ multipart_num_threads = 1
 part_size = 10 * 1024 * 1024
 
 
-#: 每个Session连接池大小
+#: 并发列举（ParallelObjectIterator）缺省线程数
+list_num_threads = 4
+
+
+#: 批量操作（如delete_prefix）缺省线程数
+batch_num_threads = 4
+
+
+#: 进程内共享的传输调度器（oss2.scheduler.default_scheduler）的线程数上限，断点续传的分片都在其中执行
+transfer_num_threads = 10
+
+
+#: 每个Session连接池大小的下限。实际大小取该值与各类并发线程数中的最大值，参见 :class:`Session <oss2.Session>`
 connection_pool_size = 10
 
+#: 连接池阻塞模式：为True时，连接都在使用中的请求会等待空闲连接，而不是新建一个用完即丢弃的连接
+connection_pool_block = False
+
+#: 阻塞模式下等待空闲连接的超时时间（秒），为None则一直等待
+connection_pool_timeout = 60
+
 
 #: 对于断点下载，如果OSS文件大小大于该值就进行并行下载（multiget）
 multiget_threshold = 100 * 1024 * 1024
@@ -44,3 +65,23 @@ multiget_num_threads = 4
 
 #: 并行下载（multiget）的缺省分片大小
 multiget_part_size = 10 * 1024 * 1024
+
+
+#: 随机读（open_read）缺省的块大小
+read_block_size = 1024 * 1024
+
+#: 随机读（open_read）缺省缓存的块数
+read_cache_blocks = 16
+
+#: 读取多个范围（read_ranges）时，间隔不超过该值的相邻范围合并为一个请求
+read_ranges_max_gap = 64 * 1024
+
+#: 读取多个范围（read_ranges）时，合并后单个请求的最大长度
+read_ranges_max_request_size = 8 * 1024 * 1024
+
+
+#: 客户端加密（CryptoBucket）时并发加解密的线程数，为1时在读写数据的线程中依次加解密
+crypto_num_threads = 4
+
+#: 客户端加密时并发加解密的窗口大小，必须是16的倍数
+crypto_window_size = 1024 * 1024
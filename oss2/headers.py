@@ -11,9 +11,12 @@ OSS_CANNED_ACL = "x-oss-acl"
 
 IF_UNMODIFIED_SINCE = "If-Unmodified-Since"
 IF_MATCH = "If-Match"
+IF_NONE_MATCH = "If-None-Match"
 
 OSS_COPY_OBJECT_SOURCE = "x-oss-copy-source"
 OSS_COPY_OBJECT_SOURCE_RANGE = "x-oss-copy-source-range"
+OSS_COPY_OBJECT_SOURCE_IF_MATCH = "x-oss-copy-source-if-match"
+OSS_COPY_OBJECT_SOURCE_IF_UNMODIFIED_SINCE = "x-oss-copy-source-if-unmodified-since"
 
 OSS_REQUEST_ID = "x-oss-request-id"
 
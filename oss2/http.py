@@ -9,9 +9,14 @@ oss2.http
 """
 
 import platform
+import threading
+import weakref
 
 import requests
 from requests.structures import CaseInsensitiveDict
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from requests.packages.urllib3.exceptions import EmptyPoolError
+from requests.packages.urllib3.poolmanager import PoolManager
 
 from . import __version__, defaults
 from .compat import to_bytes
@@ -26,13 +31,36 @@ _USER_AGENT = 'aliyun-sdk-python/{0}({1}/{2}/{3};{4})'.format(
 logger = logging.getLogger(__name__)
 
 class Session(object):
-    """属于同一个Session的请求共享一组连接池，如有可能也会重用HTTP连接。"""
-    def __init__(self):
+    """属于同一个Session的请求共享一组连接池，如有可能也会重用HTTP连接。
+
+    :param int pool_size: 每个连接池的大小。如不指定，则取 `oss2.defaults.connection_pool_size` 和各类并发线程数
+        （如 `oss2.defaults.transfer_num_threads` 、 `oss2.defaults.multiget_num_threads` ）中的最大值，
+        避免并发请求数超过连接池大小时，归还的连接被丢弃、新请求不得不重新建立连接。
+    :param bool pool_block: 为True时，连接都在使用中的请求会等待空闲连接，而不是新建连接；
+        缺省为 `oss2.defaults.connection_pool_block`
+    :param pool_timeout: 阻塞模式下等待空闲连接的秒数，超时则抛出 :class:`RequestError <oss2.exceptions.RequestError>` ；
+        缺省为 `oss2.defaults.connection_pool_timeout` ，为None则一直等待
+    """
+    def __init__(self, pool_size=None, pool_block=None, pool_timeout=None):
         self.session = requests.Session()
 
-        psize = defaults.connection_pool_size
-        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=psize, pool_maxsize=psize))
-        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=psize, pool_maxsize=psize))
+        self.pool_size = defaults.get(pool_size, _auto_pool_size())
+        self.pool_block = defaults.get(pool_block, defaults.connection_pool_block)
+        self.pool_timeout = defaults.get(pool_timeout, defaults.connection_pool_timeout)
+
+        self.__stats = _PoolCounters()
+
+        for prefix in ('http://', 'https://'):
+            self.session.mount(prefix, _HTTPAdapter(self.__stats, self.pool_timeout,
+                                                    pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                                    pool_block=self.pool_block))
+
+    def pool_stats(self):
+        """返回连接池当前的统计信息。
+
+        :rtype: :class:`PoolStats`
+        """
+        return self.__stats.snapshot()
 
     def do_request(self, req, timeout):
         try:
@@ -44,10 +72,135 @@ class Session(object):
                                                  headers=req.headers,
                                                  stream=True,
                                                  timeout=timeout))
-        except requests.RequestException as e:
+        except (requests.RequestException, EmptyPoolError) as e:
             raise RequestError(e)
 
 
+def _auto_pool_size():
+    return max(defaults.connection_pool_size, defaults.transfer_num_threads, defaults.multiget_num_threads,
+               defaults.multipart_num_threads, defaults.batch_num_threads, defaults.list_num_threads)
+
+
+class PoolStats(object):
+    """连接池的统计信息，由 :meth:`Session.pool_stats` 返回。
+
+    :param int in_use: 正在被请求使用的连接数
+    :param int idle: 连接池中空闲、可以重用的连接数
+    :param int created: 新建的连接（即需要重新握手）的次数
+    :param int reused: 请求重用已有连接的次数
+    :param int discarded: 因为连接池已满而被丢弃的连接数。该值持续增长说明连接池太小
+    """
+    def __init__(self, in_use, idle, created, reused, discarded):
+        self.in_use = in_use
+        self.idle = idle
+        self.created = created
+        self.reused = reused
+        self.discarded = discarded
+
+    @property
+    def reuse_ratio(self):
+        """重用已有连接的请求所占的比例。"""
+        total = self.created + self.reused
+        return float(self.reused) / total if total else 0.0
+
+
+class _PoolCounters(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pools = weakref.WeakSet()
+
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def snapshot(self):
+        with self.lock:
+            pools = list(self.pools)
+            in_use, created, reused, discarded = self.in_use, self.created, self.reused, self.discarded
+
+        return PoolStats(in_use, sum(_count_idle(p) for p in pools), created, reused, discarded)
+
+
+def _count_idle(pool):
+    q = pool.pool
+    if q is None:
+        return 0
+
+    with q.mutex:
+        return sum(1 for conn in q.queue if conn is not None and getattr(conn, 'sock', None) is not None)
+
+
+class _PoolStatsMixin(object):
+    # 由 _PoolManager 在创建连接池后设置
+    counters = None
+    pool_timeout = None
+
+    def _get_conn(self, timeout=None):
+        conn = super(_PoolStatsMixin, self)._get_conn(timeout=self.pool_timeout if timeout is None else timeout)
+
+        # 新建的连接，以及已经被关闭的连接，都要在发送请求时重新建立TCP连接
+        with self.counters.lock:
+            self.counters.in_use += 1
+            if getattr(conn, 'sock', None) is not None:
+                self.counters.reused += 1
+            else:
+                self.counters.created += 1
+
+        return conn
+
+    def _put_conn(self, conn):
+        with self.counters.lock:
+            self.counters.in_use -= 1
+            if conn is not None and self.pool is not None and self.pool.full():
+                self.counters.discarded += 1
+
+        super(_PoolStatsMixin, self)._put_conn(conn)
+
+
+class _HTTPConnectionPool(_PoolStatsMixin, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_PoolStatsMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PoolManager(PoolManager):
+    def __init__(self, counters, pool_timeout, *args, **kwargs):
+        super(_PoolManager, self).__init__(*args, **kwargs)
+
+        self.counters = counters
+        self.pool_timeout = pool_timeout
+        self.pool_classes_by_scheme = {'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+    def _new_pool(self, *args, **kwargs):
+        pool = super(_PoolManager, self)._new_pool(*args, **kwargs)
+
+        pool.counters = self.counters
+        pool.pool_timeout = self.pool_timeout
+        with self.counters.lock:
+            self.counters.pools.add(pool)
+
+        return pool
+
+
+class _HTTPAdapter(requests.adapters.HTTPAdapter):
+    def __init__(self, counters, pool_timeout, **kwargs):
+        self.counters = counters
+        self.pool_timeout = pool_timeout
+
+        super(_HTTPAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+
+        self.poolmanager = _PoolManager(self.counters, self.pool_timeout,
+                                        num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs)
+
+
 class Request(object):
     def __init__(self, method, url,
                  data=None,
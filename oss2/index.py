@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+"""
+oss2.index
+~~~~~~~~~~
+
+把Bucket中某个前缀下的文件列表保存在本地SQLite数据库中，用于反复查询文件是否存在、大小或ETag，而不必每次都列举Bucket。
+
+用法 ::
+
+    >>> from oss2.index import ObjectIndex
+    >>> index = ObjectIndex(bucket, 'logs/')
+    >>> index.refresh()                             # 全量列举并建立索引
+    >>> index.object_exists('logs/2018-01-01.log')
+    True
+    >>> index.get('logs/2018-01-01.log').size
+    1024
+    >>> index.refresh(marker=index.last_key)        # 只列举上次之后新增的文件
+    >>> index.refresh(sub_prefix='2018-01-02/')     # 只重新列举 logs/2018-01-02/ 下的文件
+    >>> index.staleness                             # 距离上次全量列举的秒数
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+
+from . import utils
+from .compat import to_bytes, to_string, to_unicode
+from .iterators import ObjectIterator
+from .models import ObjectRecord
+
+logger = logging.getLogger(__name__)
+
+
+_INDEX_DIR = '.py-oss-index'
+
+_BLOOM_META = ('bloom_capacity', 'bloom_bits', 'bloom_version')
+
+
+class BloomFilter(object):
+    """布隆过滤器。`might_contain` 返回False时，一定没有添加过该键值。
+
+    :param int capacity: 预计添加的键值个数
+    :param float error_rate: 添加了 `capacity` 个键值后，误判的概率
+    """
+    def __init__(self, capacity, error_rate=0.01, bits=None):
+        capacity = max(capacity, 1)
+
+        #: 比特数
+        self.num_bits = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+
+        #: 哈希函数个数
+        self.num_hashes = max(int(round(self.num_bits * math.log(2) / capacity)), 1)
+
+        #: 预计添加的键值个数
+        self.capacity = capacity
+
+        if bits is None:
+            self.bits = bytearray((self.num_bits + 7) // 8)
+        else:
+            self.bits = bytearray(bits)
+
+    def add(self, key):
+        bits = self.bits
+        for pos in self.__positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, key):
+        bits = self.bits
+        for pos in self.__positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+
+        return True
+
+    def __positions(self, key):
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(to_bytes(key)).digest())
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+
+class ObjectIndex(object):
+    """Bucket中 `prefix` 下文件列表的本地索引。
+
+    索引存放在 `root/dir/` 下的SQLite数据库文件中，文件名由Bucket名和 `prefix` 决定，因此同一个前缀的索引可以跨进程复用。
+    索引内容只在调用 :func:`refresh` 时更新，查询接口不访问OSS；可以通过 :attr:`staleness` 判断索引是否过旧。
+
+    布隆过滤器和文件列表保存在同一个数据库中，并带有版本号：其他进程刷新了索引之后， :func:`object_exists` 会重新加载过滤器。
+
+    :param bucket: :class:`Bucket <oss2.Bucket>` 对象
+    :param str prefix: 建立索引的文件名前缀
+    :param str root: 父目录，缺省为HOME
+    :param str dir: 子目录，缺省为 `_INDEX_DIR`
+    :param float error_rate: 布隆过滤器的误判概率
+    """
+    def __init__(self, bucket, prefix='', root=None, dir=None, error_rate=0.01):
+        self.bucket = bucket
+        self.prefix = to_string(prefix)
+        self.error_rate = error_rate
+
+        index_dir = os.path.join(root or os.path.expanduser('~'), dir or _INDEX_DIR)
+        utils.makedir_p(index_dir)
+
+        #: 索引文件的路径
+        self.path = os.path.join(index_dir, utils.md5_string('oss://{0}/{1}'.format(bucket.bucket_name, self.prefix)) + '.db')
+
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.__conn.execute('CREATE TABLE IF NOT EXISTS objects (key TEXT PRIMARY KEY, last_modified INTEGER, '
+                            'etag TEXT, type TEXT, size INTEGER, storage_class TEXT, generation INTEGER)')
+        self.__conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)')
+        self.__conn.commit()
+
+        self.__bloom_version = None
+        self.__bloom = self.__load_bloom()
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+    @property
+    def refreshed_at(self):
+        """最近一次全量刷新完成的时间（Unix时间戳），从未刷新过时为None。"""
+        return self.__get_meta('refreshed_at')
+
+    @property
+    def updated_at(self):
+        """最近一次刷新（包括增量刷新）完成的时间（Unix时间戳），从未刷新过时为None。"""
+        return self.__get_meta('updated_at')
+
+    @property
+    def staleness(self):
+        """距离最近一次全量刷新的秒数，从未刷新过时为None。"""
+        refreshed_at = self.refreshed_at
+        if refreshed_at is None:
+            return None
+
+        return time.time() - refreshed_at
+
+    @property
+    def last_key(self):
+        """索引中字典序最大的文件名，可以作为增量刷新的 `marker` 。索引为空时是空串。"""
+        with self.__lock:
+            row = self.__conn.execute('SELECT MAX(key) FROM objects').fetchone()
+
+        return to_string(row[0]) if row[0] is not None else ''
+
+    def refresh(self, sub_prefix='', marker='', max_keys=1000, prefetch=1):
+        """重新列举 `prefix + sub_prefix` 下、文件名在 `marker` 之后的文件，并用结果替换索引中这一范围的内容。
+
+        范围内已经不存在的文件会从索引中删除。`sub_prefix` 和 `marker` 都为空时是全量刷新；
+        `marker` 取 :attr:`last_key` 时只会追加上次刷新之后新增（文件名更大）的文件。
+
+        :param str sub_prefix: 只刷新该子前缀下的文件，比如按日期组织的文件可以只刷新最近的日期
+        :param str marker: 只刷新文件名在该值之后的文件
+
+        :return: 本次列举到的文件个数
+        """
+        scan_prefix = self.prefix + to_string(sub_prefix)
+        marker = to_string(marker)
+
+        logger.info("Start to refresh index, bucket: {0}, prefix: {1}, marker: {2}".format(
+            self.bucket.bucket_name, scan_prefix, marker))
+
+        generation = self.__next_generation()
+        iterator = ObjectIterator(self.bucket, prefix=scan_prefix, marker=marker, max_keys=max_keys, prefetch=prefetch)
+
+        count = 0
+        try:
+            for page in iterator.iter_pages():
+                rows = []
+                for i in range(len(page.keys)):
+                    key = to_unicode(page.keys[i])
+                    rows.append((key, page.last_modifieds[i], page.etags[i], page.types[i], page.sizes[i],
+                                 page.storage_classes[i], generation))
+                    self.__bloom.add(key)
+
+                # 保存的过滤器不包含新加入的文件，在同一个事务中把它作废；刷新中途失败时，下次加载会根据数据库重建
+                with self.__lock:
+                    self.__conn.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+                    self.__invalidate_bloom()
+                    self.__conn.commit()
+
+                count += len(rows)
+        finally:
+            iterator.close()
+
+        with self.__lock:
+            cursor = self.__conn.execute('DELETE FROM objects WHERE key > ? AND substr(key, 1, ?) = ? AND generation < ?',
+                                         (to_unicode(marker), len(to_unicode(scan_prefix)), to_unicode(scan_prefix),
+                                          generation))
+            deleted = cursor.rowcount
+            total = self.__conn.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+
+            now = time.time()
+            self.__set_meta('updated_at', now)
+            if not sub_prefix and not marker:
+                self.__set_meta('refreshed_at', now)
+            self.__conn.commit()
+
+        # 布隆过滤器不支持删除，有文件被删除或者超出容量时重建
+        if deleted > 0 or total > self.__bloom.capacity:
+            self.__rebuild_bloom(total)
+        else:
+            self.__save_bloom()
+
+        logger.info("Refresh index done, listed: {0}, deleted: {1}, total: {2}".format(count, deleted, total))
+        return count
+
+    def object_exists(self, key):
+        """根据索引判断文件是否存在。大部分不存在的文件由布隆过滤器直接判定，不需要查询文件列表。"""
+        if self.__get_meta('bloom_version') != self.__bloom_version:
+            self.__bloom = self.__load_bloom()
+
+        if not self.__bloom.might_contain(to_unicode(key)):
+            return False
+
+        return self.get(key) is not None
+
+    def get(self, key):
+        """返回文件对应的 :class:`ObjectRecord <oss2.models.ObjectRecord>` ，文件不在索引中时返回None。"""
+        with self.__lock:
+            row = self.__conn.execute('SELECT key, last_modified, etag, type, size, storage_class FROM objects '
+                                      'WHERE key = ?', (to_unicode(key),)).fetchone()
+
+        return self.__to_record(row) if row is not None else None
+
+    def iter_prefix(self, prefix='', batch_size=1000):
+        """按文件名的字典序遍历索引中以 `prefix` 开头的文件，每次返回一个 :class:`ObjectRecord <oss2.models.ObjectRecord>` 。"""
+        prefix = to_unicode(prefix)
+        start, inclusive = prefix, True
+
+        while True:
+            with self.__lock:
+                rows = self.__conn.execute('SELECT key, last_modified, etag, type, size, storage_class FROM objects '
+                                           'WHERE key ' + ('>=' if inclusive else '>') + ' ? ORDER BY key LIMIT ?',
+                                           (start, batch_size)).fetchall()
+
+            for row in rows:
+                if not row[0].startswith(prefix):
+                    return
+                yield self.__to_record(row)
+
+            if len(rows) < batch_size:
+                return
+
+            start, inclusive = rows[-1][0], False
+
+    def __contains__(self, key):
+        return self.object_exists(key)
+
+    def __len__(self):
+        with self.__lock:
+            return self.__conn.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+
+    def __to_record(self, row):
+        return ObjectRecord(to_string(row[0]), row[1], to_string(row[2]), to_string(row[3]), row[4], to_string(row[5]))
+
+    def __next_generation(self):
+        with self.__lock:
+            generation = (self.__get_meta_locked('generation') or 0) + 1
+            self.__set_meta('generation', generation)
+            self.__conn.commit()
+
+        return generation
+
+    def __get_meta(self, name):
+        with self.__lock:
+            return self.__get_meta_locked(name)
+
+    def __get_meta_locked(self, name):
+        row = self.__conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def __set_meta(self, name, value):
+        self.__conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (name, value))
+
+    def __load_bloom(self):
+        # 用一条语句读取，保证过滤器和版本号是一致的
+        with self.__lock:
+            meta = dict(self.__conn.execute('SELECT name, value FROM meta WHERE name IN (?, ?, ?)',
+                                            _BLOOM_META).fetchall())
+
+        capacity, bits, version = (meta.get(name) for name in _BLOOM_META)
+        if capacity is None or bits is None:
+            return self.__rebuild_bloom(len(self))
+
+        self.__bloom_version = version
+        return BloomFilter(capacity, self.error_rate, bits=bits)
+
+    def __rebuild_bloom(self, count):
+        bloom = BloomFilter(max(count * 2, 1024), self.error_rate)
+
+        with self.__lock:
+            for row in self.__conn.execute('SELECT key FROM objects'):
+                bloom.add(row[0])
+
+        self.__bloom = bloom
+        self.__save_bloom()
+        return bloom
+
+    def __save_bloom(self):
+        with self.__lock:
+            self.__set_meta('bloom_capacity', self.__bloom.capacity)
+            self.__set_meta('bloom_bits', sqlite3.Binary(bytes(self.__bloom.bits)))
+            self.__set_bloom_version()
+            self.__conn.commit()
+
+    def __invalidate_bloom(self):
+        self.__conn.execute('DELETE FROM meta WHERE name IN (?, ?)', _BLOOM_META[:2])
+        self.__set_bloom_version()
+
+    def __set_bloom_version(self):
+        self.__bloom_version = uuid.uuid4().hex
+        self.__set_meta('bloom_version', self.__bloom_version)
@@ -7,32 +7,77 @@ oss2.iterators
 该模块包含了一些易于使用的迭代器，可以用来遍历Bucket、文件、分片上传等。
 """
 
-from .models import MultipartUploadInfo, SimplifiedObjectInfo
+import collections
+import copy
+import sys
+import threading
+import weakref
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from .models import MultipartUploadInfo, SimplifiedObjectInfo, ObjectPage
 from .exceptions import ServerError
 
 from . import defaults
 
 
 class _BaseIterator(object):
-    def __init__(self, marker, max_retries):
+    # 分页状态，预取时只在调用者收到对应的页之后才更新
+    _MARKER_ATTRS = ('is_truncated', 'next_marker')
+
+    def __init__(self, marker, max_retries, prefetch=0):
         self.is_truncated = True
         self.next_marker = marker
 
         max_retries = defaults.get(max_retries, defaults.request_retries)
         self.max_retries = max_retries if max_retries > 0 else 1
 
-        self.entries = []
+        self.prefetch = prefetch
 
-    def _fetch(self):
+        self.entries = collections.deque()
+
+        self.__prefetched = None
+        self.__prefetch_pages = False
+        self.__closed = False
+
+    def _fetch_entries(self):
+        """获取一页条目，返回（条目列表，is_truncated，next_marker）。"""
         raise NotImplemented    # pragma: no cover
 
+    def _fetch(self):
+        self.entries, is_truncated, next_marker = self._fetch_entries()
+        return is_truncated, next_marker
+
+    def _fetch_page(self):
+        """获取 `iter_pages` 返回的一页，缺省和 `_fetch_entries` 相同。"""
+        return self._fetch_entries()
+
+    def _make_page(self, entries):
+        """把已经缓存、尚未返回的条目转换成和 `_fetch_page` 返回值相同类型的一页。"""
+        return list(entries)
+
+    def _page_entries(self, page):
+        """把 `_fetch_page` 返回的一页转换成和 `_fetch_entries` 返回值相同类型的条目列表。"""
+        return list(page)
+
     def __iter__(self):
         return self
 
     def __next__(self):
         while True:
             if self.entries:
-                return self.entries.pop(0)
+                return self.entries.popleft()
+
+            if self.prefetch > 0:
+                page = self.__next_prefetched(False)
+                if page is None:
+                    raise StopIteration
+
+                self.entries = collections.deque(page)
+                continue
 
             if not self.is_truncated:
                 raise StopIteration
@@ -42,19 +87,154 @@ class _BaseIterator(object):
     def next(self):
         return self.__next__()
 
+    def iter_pages(self):
+        """按页遍历，每次返回一次列举请求得到的全部条目。
+
+        和逐个迭代相比，不需要为每个条目做一次迭代调用；对于 :class:`ObjectIterator` ，
+        每页是按列存储的 :class:`ObjectPage <oss2.models.ObjectPage>` ，不会为每个文件单独创建对象。
+        """
+        if self.entries:
+            page, self.entries = self._make_page(self.entries), collections.deque()
+            yield page
+
+        while True:
+            if self.prefetch > 0:
+                page = self.__next_prefetched(True)
+                if page is None:
+                    return
+            elif self.is_truncated:
+                page, self.is_truncated, self.next_marker = self._retry(self._fetch_page)
+            else:
+                return
+
+            if len(page) > 0:
+                yield page
+
     def fetch_with_retry(self):
+        self.is_truncated, self.next_marker = self._retry(self._fetch)
+        self.entries = collections.deque(self.entries)
+
+    def close(self):
+        """停止预取线程。设置了 `prefetch` 而又没有遍历完就放弃时应调用该函数，或者把迭代器用在with语句中。
+
+        没有调用该函数就丢弃的迭代器被回收后，预取线程也会退出。
+        """
+        self.__closed = True
+        if self.__prefetched is not None:
+            self.__prefetched.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _retry(self, fetch):
         for i in range(self.max_retries):
             try:
-                self.is_truncated, self.next_marker = self._fetch()
+                return fetch()
             except ServerError as e:
                 if e.status // 100 != 5:
                     raise
 
                 if i == self.max_retries - 1:
                     raise
-            else:
+
+    def __next_prefetched(self, as_page):
+        if self.__prefetched is None:
+            self.__prefetched = _PrefetchQueue(self.prefetch)
+            self.__prefetch_pages = as_page
+            if self.__closed:
+                self.__prefetched.close()
+
+            # 预取线程在迭代器的副本上列举，只持有迭代器本身的弱引用，这样迭代器没有调用close()就被丢弃时，线程也能退出
+            t = threading.Thread(target=_prefetch, args=(weakref.ref(self), copy.copy(self), self.__prefetched, as_page))
+            t.daemon = True
+            t.start()
+
+        kind, data = self.__prefetched.get()
+        if kind == 'end':
+            # 之后的调用依然返回None
+            self.__prefetched.put((kind, data))
+            return None
+
+        if kind == 'error':
+            self.__prefetched.put(('end', None))
+            raise data[1]
+
+        page, state = data
+        for name, value in state:
+            setattr(self, name, value)
+
+        if as_page != self.__prefetch_pages:
+            return self._make_page(page) if as_page else self._page_entries(page)
+
+        return page
+
+
+class _PrefetchQueue(object):
+    """预取线程和迭代器之间传递页的队列，最多缓存 `max_pages` 页，结束标志和异常不占用页数。"""
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+
+        self.__items = collections.deque()
+        self.__cond = threading.Condition(threading.Lock())
+        self.__stopped = False
+
+    def wait_for_room(self, ref):
+        """等到可以再预取一页。迭代器已经关闭或被丢弃时返回False。"""
+        with self.__cond:
+            while True:
+                if self.__stopped or ref() is None:
+                    return False
+
+                if len(self.__items) < self.max_pages:
+                    return True
+
+                self.__cond.wait(1)
+
+    def put(self, item):
+        with self.__cond:
+            self.__items.append(item)
+            self.__cond.notify_all()
+
+    def get(self):
+        with self.__cond:
+            while not self.__items:
+                if self.__stopped:
+                    return 'end', None
+
+                # 带超时等待，使KeyboardInterrupt有机会发生
+                self.__cond.wait(1)
+
+            item = self.__items.popleft()
+            self.__cond.notify_all()
+            return item
+
+    def close(self):
+        with self.__cond:
+            self.__stopped = True
+            self.__cond.notify_all()
+
+
+def _prefetch(ref, fetcher, prefetched, as_page):
+    # 只在有空位时才获取下一页，因此放入队列时不会阻塞
+    while prefetched.wait_for_room(ref):
+        try:
+            if not fetcher.is_truncated:
+                prefetched.put(('end', None))
                 return
 
+            page, fetcher.is_truncated, fetcher.next_marker = fetcher._retry(
+                fetcher._fetch_page if as_page else fetcher._fetch_entries)
+        except:
+            prefetched.put(('error', sys.exc_info()))
+            return
+
+        state = [(name, getattr(fetcher, name)) for name in fetcher._MARKER_ATTRS]
+        prefetched.put(('page', (page, state)))
+        del page
+
 
 class BucketIterator(_BaseIterator):
     """遍历用户Bucket的迭代器。
@@ -65,20 +245,20 @@ class BucketIterator(_BaseIterator):
     :param prefix: 只列举匹配该前缀的Bucket
     :param marker: 分页符。只列举Bucket名字典序在此之后的Bucket
     :param max_keys: 每次调用 `list_buckets` 时的max_keys参数。注意迭代器返回的数目可能会大于该值。
+    :param prefetch: 大于0时，由后台线程提前获取最多 `prefetch` 页，使列举和对条目的处理同时进行
     """
-    def __init__(self, service, prefix='', marker='', max_keys=100, max_retries=None):
-        super(BucketIterator, self).__init__(marker, max_retries)
+    def __init__(self, service, prefix='', marker='', max_keys=100, max_retries=None, prefetch=0):
+        super(BucketIterator, self).__init__(marker, max_retries, prefetch)
         self.service = service
         self.prefix = prefix
         self.max_keys = max_keys
 
-    def _fetch(self):
+    def _fetch_entries(self):
         result = self.service.list_buckets(prefix=self.prefix,
                                            marker=self.next_marker,
                                            max_keys=self.max_keys)
-        self.entries = result.buckets
 
-        return result.is_truncated, result.next_marker
+        return result.buckets, result.is_truncated, result.next_marker
 
 
 class ObjectIterator(_BaseIterator):
@@ -92,25 +272,49 @@ class ObjectIterator(_BaseIterator):
     :param delimiter: 目录分隔符
     :param marker: 分页符
     :param max_keys: 每次调用 `list_objects` 时的max_keys参数。注意迭代器返回的数目可能会大于该值。
+    :param prefetch: 大于0时，由后台线程提前获取最多 `prefetch` 页，使列举和对条目的处理同时进行
+
+    遍历文件数目巨大的Bucket时，可以用 `iter_pages()` 按页遍历，每页是一个 :class:`ObjectPage <oss2.models.ObjectPage>` 。
     """
-    def __init__(self, bucket, prefix='', delimiter='', marker='', max_keys=100, max_retries=None):
-        super(ObjectIterator, self).__init__(marker, max_retries)
+    def __init__(self, bucket, prefix='', delimiter='', marker='', max_keys=100, max_retries=None, prefetch=0):
+        super(ObjectIterator, self).__init__(marker, max_retries, prefetch)
 
         self.bucket = bucket
         self.prefix = prefix
         self.delimiter = delimiter
         self.max_keys = max_keys
 
-    def _fetch(self):
+    def _fetch_entries(self):
         result = self.bucket.list_objects(prefix=self.prefix,
                                           delimiter=self.delimiter,
                                           marker=self.next_marker,
                                           max_keys=self.max_keys)
-        self.entries = result.object_list + [SimplifiedObjectInfo(prefix, None, None, None, None, None)
-                                             for prefix in result.prefix_list]
-        self.entries.sort(key=lambda obj: obj.key)
+        entries = result.object_list + [SimplifiedObjectInfo(prefix, None, None, None, None, None)
+                                        for prefix in result.prefix_list]
+        entries.sort(key=lambda obj: obj.key)
+
+        return entries, result.is_truncated, result.next_marker
+
+    def _fetch_page(self):
+        result = self.bucket.list_objects_page(prefix=self.prefix,
+                                               delimiter=self.delimiter,
+                                               marker=self.next_marker,
+                                               max_keys=self.max_keys)
+
+        return result.page, result.is_truncated, result.next_marker
+
+    def _make_page(self, entries):
+        page = ObjectPage()
+        for obj in entries:
+            if obj.is_prefix():
+                page.prefixes.append(obj.key)
+            else:
+                page.add_object(obj.key, obj.last_modified, obj.etag, obj.type, obj.size, obj.storage_class)
 
-        return result.is_truncated, result.next_marker
+        return page
+
+    def _page_entries(self, page):
+        return [SimplifiedObjectInfo(r.key, r.last_modified, r.etag, r.type, r.size, r.storage_class) for r in page]
 
 
 class MultipartUploadIterator(_BaseIterator):
@@ -125,11 +329,14 @@ class MultipartUploadIterator(_BaseIterator):
     :param key_marker: 文件名分页符
     :param upload_id_marker: 分片上传ID分页符
     :param max_uploads: 每次调用 `list_multipart_uploads` 时的max_uploads参数。注意迭代器返回的数目可能会大于该值。
+    :param prefetch: 大于0时，由后台线程提前获取最多 `prefetch` 页，使列举和对条目的处理同时进行
     """
+    _MARKER_ATTRS = _BaseIterator._MARKER_ATTRS + ('next_upload_id_marker',)
+
     def __init__(self, bucket,
                  prefix='', delimiter='', key_marker='', upload_id_marker='',
-                 max_uploads=1000, max_retries=None):
-        super(MultipartUploadIterator, self).__init__(key_marker, max_retries)
+                 max_uploads=1000, max_retries=None, prefetch=0):
+        super(MultipartUploadIterator, self).__init__(key_marker, max_retries, prefetch)
 
         self.bucket = bucket
         self.prefix = prefix
@@ -137,17 +344,17 @@ class MultipartUploadIterator(_BaseIterator):
         self.next_upload_id_marker = upload_id_marker
         self.max_uploads = max_uploads
 
-    def _fetch(self):
+    def _fetch_entries(self):
         result = self.bucket.list_multipart_uploads(prefix=self.prefix,
                                                     delimiter=self.delimiter,
                                                     key_marker=self.next_marker,
                                                     upload_id_marker=self.next_upload_id_marker,
                                                     max_uploads=self.max_uploads)
-        self.entries = result.upload_list + [MultipartUploadInfo(prefix, None, None) for prefix in result.prefix_list]
-        self.entries.sort(key=lambda u: u.key)
+        entries = result.upload_list + [MultipartUploadInfo(prefix, None, None) for prefix in result.prefix_list]
+        entries.sort(key=lambda u: u.key)
 
         self.next_upload_id_marker = result.next_upload_id_marker
-        return result.is_truncated, result.next_key_marker
+        return entries, result.is_truncated, result.next_key_marker
 
 
 class ObjectUploadIterator(_BaseIterator):
@@ -159,30 +366,33 @@ class ObjectUploadIterator(_BaseIterator):
     :param bucket: :class:`Bucket <oss2.Bucket>` 对象
     :param key: 文件名
     :param max_uploads: 每次调用 `list_multipart_uploads` 时的max_uploads参数。注意迭代器返回的数目可能会大于该值。
+    :param prefetch: 大于0时，由后台线程提前获取最多 `prefetch` 页，使列举和对条目的处理同时进行
     """
-    def __init__(self, bucket, key, max_uploads=1000, max_retries=None):
-        super(ObjectUploadIterator, self).__init__('', max_retries)
+    _MARKER_ATTRS = _BaseIterator._MARKER_ATTRS + ('next_upload_id_marker',)
+
+    def __init__(self, bucket, key, max_uploads=1000, max_retries=None, prefetch=0):
+        super(ObjectUploadIterator, self).__init__('', max_retries, prefetch)
         self.bucket = bucket
         self.key = key
         self.next_upload_id_marker = ''
         self.max_uploads = max_uploads
 
-    def _fetch(self):
+    def _fetch_entries(self):
         result = self.bucket.list_multipart_uploads(prefix=self.key,
                                                     key_marker=self.next_marker,
                                                     upload_id_marker=self.next_upload_id_marker,
                                                     max_uploads=self.max_uploads)
 
-        self.entries = [u for u in result.upload_list if u.key == self.key]
+        entries = [u for u in result.upload_list if u.key == self.key]
         self.next_upload_id_marker = result.next_upload_id_marker
 
-        if not result.is_truncated or not self.entries:
-            return False, result.next_key_marker
+        if not result.is_truncated or not entries:
+            return entries, False, result.next_key_marker
 
         if result.next_key_marker > self.key:
-            return False, result.next_key_marker
+            return entries, False, result.next_key_marker
 
-        return result.is_truncated, result.next_key_marker
+        return entries, result.is_truncated, result.next_key_marker
 
 
 class PartIterator(_BaseIterator):
@@ -195,23 +405,23 @@ class PartIterator(_BaseIterator):
     :param upload_id: 分片上传ID
     :param marker: 分页符
     :param max_parts: 每次调用 `list_parts` 时的max_parts参数。注意迭代器返回的数目可能会大于该值。
+    :param prefetch: 大于0时，由后台线程提前获取最多 `prefetch` 页，使列举和对条目的处理同时进行
     """
     def __init__(self, bucket, key, upload_id,
-                 marker='0', max_parts=1000, max_retries=None):
-        super(PartIterator, self).__init__(marker, max_retries)
+                 marker='0', max_parts=1000, max_retries=None, prefetch=0):
+        super(PartIterator, self).__init__(marker, max_retries, prefetch)
 
         self.bucket = bucket
         self.key = key
         self.upload_id = upload_id
         self.max_parts = max_parts
 
-    def _fetch(self):
+    def _fetch_entries(self):
         result = self.bucket.list_parts(self.key, self.upload_id,
                                         marker=self.next_marker,
                                         max_parts=self.max_parts)
-        self.entries = result.parts
 
-        return result.is_truncated, result.next_marker
+        return result.parts, result.is_truncated, result.next_marker
 
 
 class LiveChannelIterator(_BaseIterator):
@@ -223,19 +433,303 @@ class LiveChannelIterator(_BaseIterator):
     :param prefix: 只列举匹配该前缀的文件
     :param marker: 分页符
     :param max_keys: 每次调用 `list_live_channel` 时的max_keys参数。注意迭代器返回的数目可能会大于该值。
+    :param prefetch: 大于0时，由后台线程提前获取最多 `prefetch` 页，使列举和对条目的处理同时进行
     """
-    def __init__(self, bucket, prefix='', marker='', max_keys=100, max_retries=None):
-        super(LiveChannelIterator, self).__init__(marker, max_retries)
+    def __init__(self, bucket, prefix='', marker='', max_keys=100, max_retries=None, prefetch=0):
+        super(LiveChannelIterator, self).__init__(marker, max_retries, prefetch)
 
         self.bucket = bucket
         self.prefix = prefix
         self.max_keys = max_keys
 
-    def _fetch(self):
+    def _fetch_entries(self):
         result = self.bucket.list_live_channel(prefix=self.prefix,
                                                marker=self.next_marker,
                                                max_keys=self.max_keys)
-        self.entries = result.channels
 
-        return result.is_truncated, result.next_marker
+        return result.channels, result.is_truncated, result.next_marker
+
+class ParallelObjectIterator(object):
+    """并发遍历Bucket里文件的迭代器。
+
+    把 `prefix` 作为第一个分片，由 `workers` 个线程并发遍历各个分片。还没有开始的分片不够多时，线程以 `delimiter`
+    为分隔符列举分片的第一层：其中的文件直接返回，每个公共前缀（子目录）作为一个新的分片交给其他线程；否则直接遍历整个分片。
+    这样即使大部分文件都在同一个子目录下，也会逐层拆分，直到所有线程都有事可做。
+    返回的文件和 `ObjectIterator(bucket, prefix)` 相同，不包含公共前缀。
+
+    每次迭代返回的是 :class:`SimplifiedObjectInfo <oss2.models.SimplifiedObjectInfo>` 对象。
+
+    用法 ::
+
+        >>> for obj in oss2.ParallelObjectIterator(bucket, 'logs/', workers=16):
+        ...     print(obj.key)
+
+    :param bucket: :class:`Bucket <oss2.Bucket>` 对象
+    :param prefix: 只列举匹配该前缀的文件
+    :param workers: 并发遍历的线程数，缺省为 `oss2.defaults.list_num_threads`
+    :param ordered: 为True时按文件名的字典序返回；为False（缺省）时按各分片获取到的先后返回，不需要等待排在前面的分片。
+    :param delimiter: 用来划分分片的分隔符
+    :param max_keys: 每次调用 `list_objects` 时的max_keys参数
+    :param max_pages: 每个分片最多缓存的页数，用来限制内存占用
+    """
+    def __init__(self, bucket, prefix='', workers=None, ordered=False, delimiter='/',
+                 max_keys=1000, max_retries=None, max_pages=2):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.workers = defaults.get(workers, defaults.list_num_threads)
+        self.ordered = ordered
+        self.delimiter = delimiter
+        self.max_keys = max_keys
+        self.max_retries = max_retries
+        self.max_pages = max_pages
+
+        self.entries = collections.deque()
+
+        self.__lister = None
+        self.__pages = None
+        self.__closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            if self.entries:
+                return self.entries.popleft()
+
+            if self.__closed:
+                raise StopIteration
+
+            if self.__pages is None:
+                self.__lister = _ParallelLister(self)
+                self.__pages = self.__lister.start(self)
+
+            try:
+                self.entries = collections.deque(next(self.__pages))
+            except StopIteration:
+                self.close()
+                raise
+
+    def next(self):
+        return self.__next__()
+
+    def close(self):
+        """停止后台线程。没有遍历完就放弃时应调用该函数，或者把迭代器用在with语句中。
+
+        没有调用该函数就丢弃的迭代器被回收后，后台线程也会退出。
+        """
+        self.__closed = True
+        if self.__lister is not None:
+            self.__lister.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _Shard(object):
+    def __init__(self, prefix, output):
+        self.prefix = prefix
+        self.output = output
+
+        self.__claimed = False
+        self.__lock = threading.Lock()
+
+    def claim(self):
+        """每个分片只由一个线程遍历，成功占有时返回True。"""
+        with self.__lock:
+            if self.__claimed:
+                return False
+
+            self.__claimed = True
+            return True
+
+
+class _ListingQueue(object):
+    """后台线程的输出。按种类分别限制缓存的个数（比如页数和子分片数），结束标志和异常不受限制。"""
+    def __init__(self, stopped, limits):
+        self.__stopped = stopped
+        self.__limits = limits
+        self.__counts = dict((kind, 0) for kind in limits)
+
+        self.__items = collections.deque()
+        self.__cond = threading.Condition(threading.Lock())
+
+    def put(self, item):
+        """放入（种类，数据）。已经停止时返回False。"""
+        kind = item[0]
+        with self.__cond:
+            while kind in self.__limits and self.__counts[kind] >= self.__limits[kind]:
+                if self.__stopped.is_set():
+                    return False
+
+                self.__cond.wait(1)
+
+            if kind in self.__counts:
+                self.__counts[kind] += 1
+
+            self.__items.append(item)
+            self.__cond.notify_all()
+            return True
+
+    def get(self):
+        """返回（种类，数据），已经停止并且没有缓存的数据时返回None。"""
+        with self.__cond:
+            while not self.__items:
+                if self.__stopped.is_set():
+                    return None
+
+                # 带超时等待，使KeyboardInterrupt有机会发生
+                self.__cond.wait(1)
+
+            item = self.__items.popleft()
+            if item[0] in self.__counts:
+                self.__counts[item[0]] -= 1
+
+            self.__cond.notify_all()
+            return item
+
+
+class _ParallelLister(object):
+    """:class:`ParallelObjectIterator` 的后台部分。
+
+    后台线程只引用该对象，不引用迭代器，因此迭代器没有调用close()就被丢弃时，可以通过弱引用的回调停止后台线程。
+    """
+    def __init__(self, iterator):
+        self.bucket = iterator.bucket
+        self.prefix = iterator.prefix
+        self.workers = max(iterator.workers, 1)
+        self.ordered = iterator.ordered
+        self.delimiter = iterator.delimiter
+        self.max_keys = iterator.max_keys
+        self.max_retries = iterator.max_retries
+        self.max_pages = iterator.max_pages
+
+        self.stopped = threading.Event()
+
+        self.__work_queue = queue.Queue()
+        self.__output = None
+        self.__owner = None
+
+    def start(self, owner):
+        """启动后台线程，返回按页遍历的生成器。 `owner` 被回收时自动停止。"""
+        self.__owner = weakref.ref(owner, lambda ref: self.stop())
+
+        if self.ordered:
+            root = _Shard(self.prefix, self.__new_shard_queue())
+        else:
+            self.__output = _ListingQueue(self.stopped, {'page': (self.workers + 1) * self.max_pages})
+            root = _Shard(self.prefix, self.__output)
+
+        self.__work_queue.put(root)
+        for i in range(self.workers):
+            t = threading.Thread(target=self.__walk)
+            t.daemon = True
+            t.start()
+
+        if self.ordered:
+            return self.__ordered_pages(root)
+        else:
+            return self.__unordered_pages()
+
+    def stop(self):
+        if self.stopped.is_set():
+            return
+
+        self.stopped.set()
+        for i in range(self.workers):
+            self.__work_queue.put(None)
+
+    def __new_shard_queue(self):
+        # 每个分片各自缓存：最多max_pages页，以及最多workers * 2个已经交给其他线程的子分片
+        return _ListingQueue(self.stopped, {'page': self.max_pages, 'shard': self.workers * 2})
+
+    def __unordered_pages(self):
+        running = 1
+        while running:
+            item = self.__output.get()
+            if item is None:
+                return
+
+            kind, data = item
+            if kind == 'page':
+                yield data
+            elif kind == 'shard':
+                running += 1
+            elif kind == 'end':
+                running -= 1
+            else:
+                self.__raise(data)
+
+    def __ordered_pages(self, shard):
+        if shard.claim():
+            # 所有线程都在忙，在当前线程中遍历，不必等待
+            items = self.__list(shard)
+        else:
+            items = iter(shard.output.get, None)
+
+        for kind, data in items:
+            if kind == 'page':
+                yield data
+            elif kind == 'shard':
+                for page in self.__ordered_pages(data):
+                    yield page
+            elif kind == 'end':
+                return
+            else:
+                self.__raise(data)
+
+    def __raise(self, exc_info):
+        self.stop()
+        raise exc_info[1]
+
+    def __walk(self):
+        while True:
+            shard = self.__work_queue.get()
+            if shard is None or self.stopped.is_set():
+                return
+
+            if not shard.claim():
+                continue
+
+            for item in self.__list(shard):
+                if not shard.output.put(item):
+                    return
+
+    def __list(self, shard):
+        """按文件名的顺序返回分片中的（'page'，文件列表）和（'shard'，子分片），最后是（'end'，None）或者（'error'，异常）。"""
+        # 还没有开始的分片不够多时才按分隔符拆分，避免为大量的小目录各发一次列举请求
+        split = shard.prefix == self.prefix or self.__work_queue.qsize() < self.workers
+        iterator = ObjectIterator(self.bucket, prefix=shard.prefix, delimiter=self.delimiter if split else '',
+                                  max_keys=self.max_keys, max_retries=self.max_retries)
+
+        objects = []
+        while not self.stopped.is_set():
+            try:
+                obj = next(iterator)
+            except StopIteration:
+                break
+            except:
+                yield 'error', sys.exc_info()
+                return
+
+            if not obj.is_prefix():
+                objects.append(obj)
+                if len(objects) >= self.max_keys:
+                    yield 'page', objects
+                    objects = []
+                continue
+
+            if objects:
+                yield 'page', objects
+                objects = []
+
+            sub_shard = _Shard(obj.key, self.__new_shard_queue() if self.ordered else self.__output)
+            self.__work_queue.put(sub_shard)
+            yield 'shard', sub_shard
 
+        if objects:
+            yield 'page', objects
+        yield 'end', None
@@ -12,6 +12,7 @@ from .exceptions import ClientError, InconsistentError
 from .compat import urlunquote, to_string
 from .select_response import SelectResponseAdapter
 from .headers import *
+import array
 import json
 
 class PartInfo(object):
@@ -121,13 +122,29 @@ class GetSymlinkResult(RequestResult):
         self.target_key = urlunquote(_hget(self.headers, OSS_SYMLINK_TARGET))
         
         
+_READINTO_CHUNK_SIZE = 64 * 1024
+
+_AES_BLOCK_SIZE = 16
+
+
+def _content_range_start(content_range):
+    # Content-Range: bytes 0-99/1000
+    return int(content_range.split(' ', 1)[1].split('-', 1)[0])
+
+
 class GetObjectResult(HeadObjectResult):
-    def __init__(self, resp, progress_callback=None, crc_enabled=False, crypto_provider=None):
+    """下载文件的结果。
+
+    对于加密文件的范围下载，Range的起始位置必须是16的倍数，才能从对应的计数器开始解密；
+    `discard` 指定解密后丢弃开头的多少个字节，从而得到用户实际请求的范围。
+    """
+    def __init__(self, resp, progress_callback=None, crc_enabled=False, crypto_provider=None, discard=0):
         super(GetObjectResult, self).__init__(resp)
         self.__crc_enabled = crc_enabled
         self.__crypto_provider = crypto_provider
 
-        if _hget(resp.headers, 'x-oss-meta-oss-crypto-key') and _hget(resp.headers, 'Content-Range'):
+        content_range = _hget(resp.headers, 'Content-Range')
+        if _hget(resp.headers, 'x-oss-meta-oss-crypto-key') and content_range and not crypto_provider:
             raise ClientError('Could not get an encrypted object using byte-range parameter')
 
         if progress_callback:
@@ -143,14 +160,50 @@ class GetObjectResult(HeadObjectResult):
             start = self.__crypto_provider.decrypt_oss_meta_data(resp.headers, 'x-oss-meta-oss-crypto-start')
             cek_alg = _hget(resp.headers, 'x-oss-meta-oss-cek-alg')
             if key and start and cek_alg:
-                self.stream = self.__crypto_provider.make_decrypt_adapter(self.stream, key, start)
+                offset = _content_range_start(content_range) if content_range else 0
+                if offset % _AES_BLOCK_SIZE:
+                    raise ClientError('range of an encrypted object should start at a multiple of {0}'.format(
+                        _AES_BLOCK_SIZE))
+
+                self.stream = self.__crypto_provider.make_decrypt_adapter(self.stream, key,
+                                                                          int(start) + offset // _AES_BLOCK_SIZE,
+                                                                          size=self.content_length)
             else:
                 raise InconsistentError('all metadata keys are required for decryption (x-oss-meta-oss-crypto-key, \
                                         x-oss-meta-oss-crypto-start, x-oss-meta-oss-cek-alg)', self.request_id)
 
+            # 服务器忽略了Range时返回的是整个文件，不需要丢弃
+            if content_range and discard > 0:
+                self.__discard(discard)
+
     def read(self, amt=None):
         return self.stream.read(amt)
 
+    def __discard(self, n):
+        if self.content_length is not None:
+            self.content_length -= n
+
+        while n > 0:
+            content = self.stream.read(n)
+            if not content:
+                break
+            n -= len(content)
+
+    def readinto(self, b):
+        """读取数据到预先分配的缓冲区 `b` （如bytearray或memoryview）中，直到填满或者数据读完，返回读取的字节数。"""
+        view = memoryview(b)
+        offset = 0
+
+        while offset < len(view):
+            content = self.stream.read(min(len(view) - offset, _READINTO_CHUNK_SIZE))
+            if not content:
+                break
+
+            view[offset:offset + len(content)] = content
+            offset += len(content)
+
+        return offset
+
     def __iter__(self):
         return iter(self.stream)
     
@@ -208,6 +261,9 @@ class BatchDeleteObjectsResult(RequestResult):
         #: 已经删除的文件名列表
         self.deleted_keys = []
 
+        #: 删除失败的文件，每个元素是(文件名, 错误码, 错误信息)。quiet模式下OSS也会返回删除失败的文件
+        self.errors = []
+
 
 class InitMultipartUploadResult(RequestResult):
     def __init__(self, resp):
@@ -259,6 +315,107 @@ class SimplifiedObjectInfo(object):
         return self.last_modified is None
 
 
+def _int64_array():
+    try:
+        return array.array('q')
+    except ValueError:
+        # Python 2没有'q'类型
+        return array.array('l')
+
+
+class ObjectRecord(object):
+    """:class:`ObjectPage` 中的单个条目，字段和 :class:`SimplifiedObjectInfo` 相同，但使用__slots__以节省内存。"""
+    __slots__ = ('key', 'last_modified', 'etag', 'type', 'size', 'storage_class')
+
+    def __init__(self, key, last_modified, etag, type, size, storage_class):
+        self.key = key
+        self.last_modified = last_modified
+        self.etag = etag
+        self.type = type
+        self.size = size
+        self.storage_class = storage_class
+
+    def is_prefix(self):
+        """如果是公共前缀，返回True；是文件，则返回False"""
+        return self.last_modified is None
+
+
+class ObjectPage(object):
+    """按列存储的一页文件列表，用于遍历文件数目巨大的Bucket。
+
+    第i个文件的信息分别是 `keys[i]` 、 `last_modifieds[i]` 、 `etags[i]` 、 `types[i]` 、 `sizes[i]` 和
+    `storage_classes[i]` ，其中 `sizes` 和 `last_modifieds` 是64位整数的 `array.array` 。公共前缀单独存放在 `prefixes` 中。
+
+    迭代时按文件名（公共前缀名）的字典序依次返回 :class:`ObjectRecord` 。
+    """
+    __slots__ = ('keys', 'last_modifieds', 'etags', 'types', 'sizes', 'storage_classes', 'prefixes')
+
+    def __init__(self):
+        #: 文件名列表
+        self.keys = []
+
+        #: 文件的最后修改时间
+        self.last_modifieds = _int64_array()
+
+        #: 文件的ETag
+        self.etags = []
+
+        #: 文件类型
+        self.types = []
+
+        #: 文件大小
+        self.sizes = _int64_array()
+
+        #: 文件的存储类别
+        self.storage_classes = []
+
+        #: 公共前缀列表
+        self.prefixes = []
+
+    def add_object(self, key, last_modified, etag, type, size, storage_class):
+        self.keys.append(key)
+        self.last_modifieds.append(last_modified)
+        self.etags.append(etag)
+        self.types.append(type)
+        self.sizes.append(size)
+        self.storage_classes.append(storage_class)
+
+    def object_at(self, i):
+        """返回第i个文件对应的 :class:`ObjectRecord` 。"""
+        return ObjectRecord(self.keys[i], self.last_modifieds[i], self.etags[i],
+                            self.types[i], self.sizes[i], self.storage_classes[i])
+
+    def __len__(self):
+        return len(self.keys) + len(self.prefixes)
+
+    def __iter__(self):
+        keys = self.keys
+        prefixes = self.prefixes
+        i, j = 0, 0
+
+        while i < len(keys) or j < len(prefixes):
+            if j == len(prefixes) or (i < len(keys) and keys[i] < prefixes[j]):
+                yield self.object_at(i)
+                i += 1
+            else:
+                yield ObjectRecord(prefixes[j], None, None, None, None, None)
+                j += 1
+
+
+class ListObjectsPageResult(RequestResult):
+    def __init__(self, resp):
+        super(ListObjectsPageResult, self).__init__(resp)
+
+        #: True表示还有更多的文件可以罗列；False表示已经列举完毕。
+        self.is_truncated = False
+
+        #: 下一次罗列的分页标记符
+        self.next_marker = ''
+
+        #: 本次罗列得到的文件及公共前缀，类型为 :class:`ObjectPage` 。
+        self.page = ObjectPage()
+
+
 OBJECT_ACL_DEFAULT = 'default'
 OBJECT_ACL_PRIVATE = 'private'
 OBJECT_ACL_PUBLIC_READ = 'public-read'
@@ -11,16 +11,18 @@ import os
 
 from . import utils
 from . import iterators
+from . import bulk
 from . import exceptions
 from . import defaults
-from .api import Bucket
+from . import http
+from .api import Bucket, CryptoBucket
+from .crypto import MultipartCryptoContext
 
 from .models import PartInfo
 from .compat import json, stringify, to_unicode, to_string
-from .task_queue import TaskQueue
+from .scheduler import default_scheduler
 from .headers import *
 
-import functools
 import threading
 import random
 import string
@@ -39,7 +41,8 @@ def resumable_upload(bucket, key, filename,
                      multipart_threshold=None,
                      part_size=None,
                      progress_callback=None,
-                     num_threads=None):
+                     num_threads=None,
+                     job=None):
     """断点上传本地文件。
 
     实现中采用分片上传方式上传本地文件，缺省的并发数是 `oss2.defaults.multipart_num_threads` ，并且在
@@ -50,7 +53,8 @@ def resumable_upload(bucket, key, filename,
     且目标文件名没有变化时，会根据本地保存的信息，从断点开始上传。
 
     使用该函数应注意如下细节：
-        #. 如果使用CryptoBucket，函数会退化为普通上传
+        #. 如果使用CryptoBucket，各个分片会用同一个数据密钥、按各自的偏移独立加密后并发上传；分片大小会向上取整为16的倍数。
+           加密后的数据密钥（envelope）保存在断点信息中，续传时用它恢复数据密钥。
 
     :param bucket: :class:`Bucket <oss2.Bucket>` 或者 ：:class:`CryptoBucket <oss2.CryptoBucket>` 对象
     :param key: 上传到用户空间的文件名
@@ -60,7 +64,10 @@ def resumable_upload(bucket, key, filename,
     :param multipart_threshold: 文件长度大于该值时，则用分片上传。
     :param part_size: 指定分片上传的每个分片的大小。如不指定，则自动计算。
     :param progress_callback: 上传进度回调函数。参见 :ref:`progress_callback` 。
-    :param num_threads: 并发上传的线程数，如不指定则使用 `oss2.defaults.multipart_num_threads` 。
+    :param num_threads: 并发上传的线程数，如不指定则使用 `oss2.defaults.multipart_num_threads` ，
+        但不超过 `oss2.defaults.transfer_num_threads` （共享的传输调度器的线程数）。
+    :param job: 分片在其中执行的 :class:`TransferJob <oss2.scheduler.TransferJob>` ，用来指定优先级、权重或取消上传。
+        如不指定，则在 :func:`default_scheduler <oss2.scheduler.default_scheduler>` 中创建一个最多使用 `num_threads` 个线程的job。
     """
     logger.info("Start to resumable upload, bucket: {0}, key: {1}, filename: {2}, headers: {3}, "
                 "multipart_threshold: {4}, part_size: {5}, num_threads: {6}".format(bucket.bucket_name, to_string(key),
@@ -70,12 +77,13 @@ def resumable_upload(bucket, key, filename,
     multipart_threshold = defaults.get(multipart_threshold, defaults.multipart_threshold)
 
     logger.debug("The size of file to upload is: {0}, multipart_threshold: {1}".format(size, multipart_threshold))
-    if isinstance(bucket, Bucket) and size >= multipart_threshold:
+    if isinstance(bucket, (Bucket, CryptoBucket)) and size >= multipart_threshold:
         uploader = _ResumableUploader(bucket, key, filename, size, store,
                                       part_size=part_size,
                                       headers=headers,
                                       progress_callback=progress_callback,
-                                      num_threads=num_threads)
+                                      num_threads=num_threads,
+                                      job=job)
         result = uploader.upload()
     else:
         with open(to_unicode(filename), 'rb') as f:
@@ -89,7 +97,8 @@ def resumable_download(bucket, key, filename,
                        part_size=None,
                        progress_callback=None,
                        num_threads=None,
-                       store=None):
+                       store=None,
+                       job=None):
     """断点下载。
 
     实现的方法是：
@@ -106,7 +115,7 @@ def resumable_download(bucket, key, filename,
         #. 对同样的源文件、目标文件，避免多个程序（线程）同时调用该函数。因为断点信息会在磁盘上互相覆盖，或临时文件名会冲突。
         #. 避免使用太小的范围（分片），即 `part_size` 不宜过小，建议大于或等于 `oss2.defaults.multiget_part_size` 。
         #. 如果目标文件已经存在，那么该函数会覆盖此文件。
-        #. 如果使用CryptoBucket，函数会退化为普通下载
+        #. 如果使用CryptoBucket，各个分片从16字节对齐的位置开始独立解密，分片大小会向上取整为16的倍数。
 
 
     :param bucket: :class:`Bucket <oss2.Bucket>` 或者 ：:class:`CryptoBucket <oss2.CryptoBucket>` 对象
@@ -115,11 +124,15 @@ def resumable_download(bucket, key, filename,
     :param int multiget_threshold: 文件长度大于该值时，则使用断点下载。
     :param int part_size: 指定期望的分片大小，即每个请求获得的字节数，实际的分片大小可能有所不同。
     :param progress_callback: 下载进度回调函数。参见 :ref:`progress_callback` 。
-    :param num_threads: 并发下载的线程数，如不指定则使用 `oss2.defaults.multiget_num_threads` 。
+    :param num_threads: 并发下载的线程数，如不指定则使用 `oss2.defaults.multiget_num_threads` ，
+        但不超过 `oss2.defaults.transfer_num_threads` （共享的传输调度器的线程数）。
 
     :param store: 用来保存断点信息的持久存储，可以指定断点信息所在的目录。
     :type store: `ResumableDownloadStore`
 
+    :param job: 分片在其中执行的 :class:`TransferJob <oss2.scheduler.TransferJob>` ，用来指定优先级、权重或取消下载。
+        如不指定，则在 :func:`default_scheduler <oss2.scheduler.default_scheduler>` 中创建一个最多使用 `num_threads` 个线程的job。
+
     :raises: 如果OSS文件不存在，则抛出 :class:`NotFound <oss2.exceptions.NotFound>` ；也有可能抛出其他因下载文件而产生的异常。
     """
 
@@ -128,7 +141,7 @@ def resumable_download(bucket, key, filename,
                                                           multiget_threshold, part_size, num_threads))
     multiget_threshold = defaults.get(multiget_threshold, defaults.multiget_threshold)
 
-    if isinstance(bucket, Bucket):
+    if isinstance(bucket, (Bucket, CryptoBucket)):
         result = bucket.head_object(key)
         logger.debug("The size of object to download is: {0}, multiget_threshold: {1}".format(result.content_length,
                      multiget_threshold))
@@ -137,7 +150,8 @@ def resumable_download(bucket, key, filename,
                                               part_size=part_size,
                                               progress_callback=progress_callback,
                                               num_threads=num_threads,
-                                              store=store)
+                                              store=store,
+                                              job=job)
             downloader.download(result.server_crc)
         else:
             bucket.get_object_to_file(key, filename, progress_callback=progress_callback)
@@ -145,6 +159,102 @@ def resumable_download(bucket, key, filename,
         bucket.get_object_to_file(key, filename, progress_callback=progress_callback)
 
 
+def resumable_copy(bucket, src_bucket, src_key, dst_key,
+                   multipart_threshold=None,
+                   part_size=None,
+                   progress_callback=None,
+                   num_threads=None,
+                   store=None,
+                   headers=None,
+                   job=None):
+    """断点拷贝。把源Bucket中的文件拷贝到 `bucket` ，数据只在OSS服务器端拷贝，不经过客户端。
+
+    文件长度小于 `multipart_threshold` 时直接调用 `copy_object` ；否则用 `upload_part_copy` 并发拷贝各个分片，
+    并在本地磁盘保存已经拷贝的分片信息。如果拷贝中断，下次用同样的源文件和目标文件调用该函数，就只会拷贝缺失的分片。
+
+    拷贝分片时会校验源文件的ETag和最后修改时间：续传时源文件已经被修改，则重新开始拷贝；拷贝过程中源文件被修改，
+    则拷贝失败。Bucket开启CRC校验时，所有分片的CRC64合并后会与源文件的CRC64比较。
+
+    使用该函数应注意如下细节：
+        #. 分片拷贝不会拷贝源文件的元信息，函数会把源文件的自定义元信息以及Content-Type等头部设置到目标文件上，
+           除非通过 `headers` 另行指定。
+        #. 对同样的源文件、目标文件，避免多个程序（线程）同时调用该函数。
+
+    :param bucket: :class:`Bucket <oss2.Bucket>` 对象，即目标Bucket
+    :param src_bucket: 源Bucket，可以是 :class:`Bucket <oss2.Bucket>` 对象，也可以是Bucket名（与 `bucket` 使用相同的认证信息和Endpoint）
+    :param str src_key: 源文件名
+    :param str dst_key: 目标文件名
+    :param int multipart_threshold: 文件长度大于或等于该值时，则用分片拷贝，缺省为 `oss2.defaults.multipart_copy_threshold`
+    :param int part_size: 指定期望的分片大小。如不指定，则自动计算。
+    :param progress_callback: 拷贝进度回调函数。参见 :ref:`progress_callback` 。
+    :param num_threads: 并发拷贝的线程数，如不指定则使用 `oss2.defaults.multipart_num_threads` ，
+        但不超过 `oss2.defaults.transfer_num_threads` （共享的传输调度器的线程数）。
+    :param store: 用来保存断点信息的持久存储，如不指定，则使用 `ResumableCopyStore` 。
+    :param headers: 传给 `copy_object` 或 `init_multipart_upload` 的HTTP头部
+    :param job: 分片在其中执行的 :class:`TransferJob <oss2.scheduler.TransferJob>` ，用来指定优先级、权重或取消拷贝。
+        如不指定，则在 :func:`default_scheduler <oss2.scheduler.default_scheduler>` 中创建一个最多使用 `num_threads` 个线程的job。
+
+    :raises: 如果源文件不存在，则抛出 :class:`NotFound <oss2.exceptions.NotFound>` ；也有可能抛出其他因拷贝文件而产生的异常。
+    """
+    src_bucket = _make_src_bucket(bucket, src_bucket)
+
+    logger.info("Start to resumable copy, source bucket: {0}, source key: {1}, bucket: {2}, key: {3}, "
+                "multipart_threshold: {4}, part_size: {5}, num_threads: {6}".format(
+                src_bucket.bucket_name, to_string(src_key), bucket.bucket_name, to_string(dst_key),
+                multipart_threshold, part_size, num_threads))
+    multipart_threshold = defaults.get(multipart_threshold, defaults.multipart_copy_threshold)
+
+    result = src_bucket.head_object(src_key)
+    logger.debug("The size of object to copy is: {0}, multipart_threshold: {1}".format(result.content_length,
+                 multipart_threshold))
+    if result.content_length >= multipart_threshold:
+        copier = _ResumableCopier(bucket, src_bucket, src_key, dst_key, _ObjectInfo.make(result),
+                                  store=store,
+                                  headers=headers if headers is not None else _copied_headers(result.headers),
+                                  part_size=part_size,
+                                  progress_callback=progress_callback,
+                                  num_threads=num_threads,
+                                  job=job)
+        return copier.copy(result.server_crc)
+    else:
+        headers = http.CaseInsensitiveDict(headers)
+        headers[OSS_COPY_OBJECT_SOURCE_IF_MATCH] = result.etag
+        copy_result = bucket.copy_object(src_bucket.bucket_name, src_key, dst_key, headers=headers)
+        utils._invoke_progress_callback(progress_callback, result.content_length, result.content_length)
+        return copy_result
+
+
+def _new_default_job(num_threads):
+    scheduler = default_scheduler()
+    if num_threads > scheduler.num_threads:
+        logger.warning("num_threads: {0} is capped to {1}, the number of threads of the default transfer scheduler, "
+                       "set oss2.defaults.transfer_num_threads before the first transfer to raise it".format(
+                       num_threads, scheduler.num_threads))
+
+    return scheduler.new_job(max_workers=num_threads)
+
+
+def _make_src_bucket(bucket, src_bucket):
+    if isinstance(src_bucket, Bucket):
+        return src_bucket
+
+    return Bucket(bucket.auth, bucket.endpoint, src_bucket, session=bucket.session, connect_timeout=bucket.timeout,
+                  app_name=bucket.app_name, enable_crc=bucket.enable_crc)
+
+
+def _copied_headers(src_headers):
+    """分片拷贝不会拷贝文件的元信息，从源文件的HEAD结果中挑出需要设置到目标文件上的头部。"""
+    headers = http.CaseInsensitiveDict()
+    for name in src_headers:
+        if name.lower().startswith(OSS_USER_METADATA_PREFIX) or name.lower() in _COPIED_HEADERS:
+            headers[name] = src_headers[name]
+
+    return headers
+
+
+_COPIED_HEADERS = frozenset(['content-type', 'content-encoding', 'content-disposition', 'cache-control', 'expires'])
+
+
 _MAX_MULTIGET_PART_COUNT = 100
 
 
@@ -177,6 +287,11 @@ def _determine_part_size_internal(total_size, preferred_size, max_count):
         return preferred_size
 
 
+def _align_crypto_part_size(part_size):
+    """AES-CTR按16字节的块计数，加密分片的大小（除最后一个分片外）必须是16的倍数。"""
+    return (part_size + 15) // 16 * 16
+
+
 def _split_to_parts(total_size, part_size):
     parts = []
     num_parts = utils.how_many(total_size, part_size)
@@ -202,7 +317,7 @@ class _ResumableOperation(object):
         self.filename = filename
         self.size = size
 
-        self._abspath = os.path.abspath(filename)
+        self._abspath = self._make_abspath(filename)
 
         self.__store = store
         self.__record_key = self.__store.make_store_key(bucket.bucket_name, self.key, self._abspath)
@@ -212,6 +327,10 @@ class _ResumableOperation(object):
         self.__plock = threading.Lock()
         self.__progress_callback = progress_callback
 
+    @staticmethod
+    def _make_abspath(filename):
+        return os.path.abspath(filename)
+
     def _del_record(self):
         self.__store.delete(self.__record_key)
 
@@ -248,7 +367,8 @@ class _ResumableDownloader(_ResumableOperation):
                  part_size=None,
                  store=None,
                  progress_callback=None,
-                 num_threads=None):
+                 num_threads=None,
+                 job=None):
         super(_ResumableDownloader, self).__init__(bucket, key, filename, objectInfo.size,
                                                    store or ResumableDownloadStore(),
                                                    progress_callback=progress_callback)
@@ -257,8 +377,13 @@ class _ResumableDownloader(_ResumableOperation):
         self.__part_size = defaults.get(part_size, defaults.multiget_part_size)
         self.__part_size = _determine_part_size_internal(self.size, self.__part_size, _MAX_MULTIGET_PART_COUNT)
 
+        # 加密文件的每个分片都从16字节对齐的位置开始解密，这样各分片密文的CRC64才能合并出整个文件的CRC64
+        if isinstance(bucket, CryptoBucket):
+            self.__part_size = _align_crypto_part_size(self.__part_size)
+
         self.__tmp_file = None
         self.__num_threads = defaults.get(num_threads, defaults.multiget_num_threads)
+        self.__job = job or _new_default_job(self.__num_threads)
         self.__finished_parts = None
         self.__finished_size = None
 
@@ -277,9 +402,7 @@ class _ResumableDownloader(_ResumableOperation):
         # create tmp file if it is does not exist
         open(self.__tmp_file, 'a').close()
 
-        q = TaskQueue(functools.partial(self.__producer, parts_to_download=parts_to_download),
-                      [self.__consumer] * self.__num_threads)
-        q.run()
+        self.__job.run(self.__download_part, parts_to_download, cost=lambda p: p.size)
 
         if self.bucket.enable_crc:
             parts = sorted(self.__finished_parts, key=lambda p: p.part_number)
@@ -291,18 +414,6 @@ class _ResumableDownloader(_ResumableOperation):
         self._report_progress(self.size)
         self._del_record()
 
-    def __producer(self, q, parts_to_download=None):
-        for part in parts_to_download:
-            q.put(part)
-
-    def __consumer(self, q):
-        while q.ok():
-            part = q.get()
-            if part is None:
-                break
-
-            self.__download_part(part)
-
     def __download_part(self, part):
         self._report_progress(self.__finished_size)
 
@@ -424,7 +535,8 @@ class _ResumableUploader(_ResumableOperation):
                  headers=None,
                  part_size=None,
                  progress_callback=None,
-                 num_threads=None):
+                 num_threads=None,
+                 job=None):
         super(_ResumableUploader, self).__init__(bucket, key, filename, size,
                                                  store or ResumableStore(),
                                                  progress_callback=progress_callback)
@@ -435,8 +547,10 @@ class _ResumableUploader(_ResumableOperation):
         self.__mtime = os.path.getmtime(filename)
 
         self.__num_threads = defaults.get(num_threads, defaults.multipart_num_threads)
+        self.__job = job or _new_default_job(self.__num_threads)
 
         self.__upload_id = None
+        self.__crypto_context = None
 
         # protect below fields
         self.__lock = threading.Lock()
@@ -453,9 +567,7 @@ class _ResumableUploader(_ResumableOperation):
         parts_to_upload = sorted(parts_to_upload, key=lambda p: p.part_number)
         logger.debug("Parts need to upload: {0}".format(parts_to_upload))
 
-        q = TaskQueue(functools.partial(self.__producer, parts_to_upload=parts_to_upload),
-                      [self.__consumer] * self.__num_threads)
-        q.run()
+        self.__job.run(self.__upload_part, parts_to_upload, cost=lambda p: p.size)
 
         self._report_progress(self.size)
 
@@ -464,25 +576,18 @@ class _ResumableUploader(_ResumableOperation):
         
         return result
 
-    def __producer(self, q, parts_to_upload=None):
-        for part in parts_to_upload:
-            q.put(part)
-
-    def __consumer(self, q):
-        while True:
-            part = q.get()
-            if part is None:
-                break
-
-            self.__upload_part(part)
-
     def __upload_part(self, part):
         with open(to_unicode(self.filename), 'rb') as f:
             self._report_progress(self.__finished_size)
 
             f.seek(part.start, os.SEEK_SET)
-            result = self.bucket.upload_part(self.key, self.__upload_id, part.part_number,
-                                             utils.SizedFileAdapter(f, part.size))
+            if self.__crypto_context:
+                result = self.bucket.upload_part(self.key, self.__upload_id, part.part_number,
+                                                 utils.SizedFileAdapter(f, part.size),
+                                                 crypto_context=self.__crypto_context)
+            else:
+                result = self.bucket.upload_part(self.key, self.__upload_id, part.part_number,
+                                                 utils.SizedFileAdapter(f, part.size))
 
             logger.debug("Upload part success, add part info to record, part_number: {0}, etag: {1}, size: {2}".format(
                 part.part_number, result.etag, part.size))
@@ -510,6 +615,11 @@ class _ResumableUploader(_ResumableOperation):
             self._del_record()
             record = None
 
+        if record and self.__is_crypto() != ('crypto' in record):
+            logger.warn("The record does not match the type of bucket, delete the record")
+            self._del_record()
+            record = None
+
         if record and not self.__upload_exists(record['upload_id']):
             logger.warn('Multipart upload: {0} does not exist, delete the record'.format(record['upload_id']))
             self._del_record()
@@ -519,14 +629,29 @@ class _ResumableUploader(_ResumableOperation):
             part_size = determine_part_size(self.size, self.__part_size)
             logger.info("Upload File size: {0}, User-specify part_size: {1}, Calculated part_size: {2}".format(
                 self.size, self.__part_size, part_size))
-            upload_id = self.bucket.init_multipart_upload(self.key, headers=self.__headers).upload_id
+
+            if self.__is_crypto():
+                part_size = _align_crypto_part_size(part_size)
+                result = self.bucket.init_multipart_upload(self.key, headers=self.__headers, part_size=part_size)
+                self.__crypto_context = result.crypto_context
+            else:
+                result = self.bucket.init_multipart_upload(self.key, headers=self.__headers)
+
+            upload_id = result.upload_id
             record = {'upload_id': upload_id, 'mtime': self.__mtime, 'size': self.size, 'parts': [],
                       'abspath': self._abspath, 'bucket': self.bucket.bucket_name, 'key': self.key,
                       'part_size': part_size}
 
+            # 数据密钥只以加密后的形式（envelope）保存
+            if self.__crypto_context:
+                record['crypto'] = self.__crypto_context.envelope
+
             logger.debug('Add new record, bucket: {0}, key: {1}, upload_id: {2}, part_size: {3}'.format(
                 self.bucket.bucket_name, self.key, upload_id, part_size))
             self._put_record(record)
+        elif self.__is_crypto():
+            self.__crypto_context = MultipartCryptoContext.from_envelope(self.bucket.crypto_provider, record['crypto'],
+                                                                         record['part_size'])
 
         self.__record = record
         self.__part_size = self.__record['part_size']
@@ -558,6 +683,9 @@ class _ResumableUploader(_ResumableOperation):
         else:
             return True
 
+    def __is_crypto(self):
+        return isinstance(self.bucket, CryptoBucket)
+
     def __file_changed(self, record):
         return record['mtime'] != self.__mtime or record['size'] != self.size
 
@@ -575,8 +703,188 @@ class _ResumableUploader(_ResumableOperation):
         return all_parts_map.values()
 
 
+class _ResumableCopier(_ResumableOperation):
+    """以断点续传方式拷贝文件。
+
+    断点信息中的 `abspath` 为源文件的 `oss://bucket/key` 路径；`etag` 、 `mtime` 和 `size` 用于判断源文件是否被修改过。
+
+    :param bucket: 目标 :class:`Bucket <oss2.Bucket>` 对象
+    :param src_bucket: 源 :class:`Bucket <oss2.Bucket>` 对象
+    :param src_key: 源文件名
+    :param key: 目标文件名
+    :param objectInfo: 源文件的 :class:`_ObjectInfo`
+    :param store: 用来保存进度的持久化存储
+    :param headers: 传给 `init_multipart_upload` 的HTTP头部
+    :param part_size: 分片大小。优先使用用户提供的值。如果用户没有指定，那么对于新拷贝，计算出一个合理值；对于老的拷贝，采用记录中的值。
+    :param progress_callback: 拷贝进度回调函数。参见 :ref:`progress_callback` 。
+    """
+    def __init__(self, bucket, src_bucket, src_key, key, objectInfo,
+                 store=None,
+                 headers=None,
+                 part_size=None,
+                 progress_callback=None,
+                 num_threads=None,
+                 job=None):
+        self.src_bucket = src_bucket
+        self.src_key = to_string(src_key)
+        self.objectInfo = objectInfo
+
+        super(_ResumableCopier, self).__init__(bucket, key,
+                                               'oss://{0}/{1}'.format(src_bucket.bucket_name, self.src_key),
+                                               objectInfo.size,
+                                               store or ResumableCopyStore(),
+                                               progress_callback=progress_callback)
+
+        self.__headers = headers
+        self.__part_size = defaults.get(part_size, defaults.part_size)
+        self.__num_threads = defaults.get(num_threads, defaults.multipart_num_threads)
+        self.__job = job or _new_default_job(self.__num_threads)
+
+        self.__upload_id = None
+
+        # protect below fields
+        self.__lock = threading.Lock()
+        self.__record = None
+        self.__finished_size = 0
+        self.__finished_parts = None
+        logger.info("Init _ResumableCopier, source bucket: {0}, source key: {1}, bucket: {2}, key: {3}, part_size: {4}, "
+                    "num_thread: {5}".format(src_bucket.bucket_name, self.src_key, bucket.bucket_name, to_string(key),
+                                             self.__part_size, self.__num_threads))
+
+    @staticmethod
+    def _make_abspath(filename):
+        return filename
+
+    def copy(self, server_crc=None):
+        self.__load_record()
+
+        parts_to_copy = self.__get_parts_to_copy()
+        logger.debug("Parts need to copy: {0}".format(parts_to_copy))
+
+        self.__job.run(self.__copy_part, parts_to_copy, cost=lambda p: p.size)
+
+        parts = sorted(self.__finished_parts, key=lambda p: p.part_number)
+        result = self.bucket.complete_multipart_upload(self.key, self.__upload_id, parts)
+
+        if self.bucket.enable_crc:
+            object_crc = utils.calc_obj_crc_from_parts(parts)
+            utils.check_crc('resume copy', object_crc, server_crc, result.request_id)
+            utils.check_crc('resume copy', object_crc, result.crc, result.request_id)
+
+        self._report_progress(self.size)
+        self._del_record()
+
+        return result
+
+    def __copy_part(self, part):
+        self._report_progress(self.__finished_size)
+
+        headers = {OSS_COPY_OBJECT_SOURCE_IF_MATCH: self.objectInfo.etag,
+                   OSS_COPY_OBJECT_SOURCE_IF_UNMODIFIED_SINCE: utils.http_date(self.objectInfo.mtime)}
+        result = self.bucket.upload_part_copy(self.src_bucket.bucket_name, self.src_key, (part.start, part.end - 1),
+                                              self.key, self.__upload_id, part.part_number, headers=headers)
+
+        logger.debug("Copy part success, add part info to record, part_number: {0}, etag: {1}, size: {2}".format(
+            part.part_number, result.etag, part.size))
+        self.__finish_part(PartInfo(part.part_number, result.etag, size=part.size, part_crc=result.crc))
+
+    def __finish_part(self, part_info):
+        with self.__lock:
+            self.__finished_parts.append(part_info)
+            self.__finished_size += part_info.size
+
+            self.__record['parts'].append({'part_number': part_info.part_number, 'etag': part_info.etag,
+                                           'part_crc': part_info.part_crc})
+            self._put_record(self.__record)
+
+    def __load_record(self):
+        record = self._get_record()
+        logger.debug("Load record return {0}".format(record))
+
+        if record and not self.is_record_sane(record):
+            logger.warn("The content of record is invalid, delete the record")
+            self._del_record()
+            record = None
+
+        if record and self.__is_source_changed(record):
+            logger.warn("Object: {0} has been overwritten, delete the record".format(self.src_key))
+            self._del_record()
+            record = None
+
+        if record and not self.__upload_exists(record['upload_id']):
+            logger.warn('Multipart upload: {0} does not exist, delete the record'.format(record['upload_id']))
+            self._del_record()
+            record = None
+
+        if not record:
+            part_size = determine_part_size(self.size, self.__part_size)
+            logger.info("Copy object size: {0}, User-specify part_size: {1}, Calculated part_size: {2}".format(
+                self.size, self.__part_size, part_size))
+            upload_id = self.bucket.init_multipart_upload(self.key, headers=self.__headers).upload_id
+            record = {'upload_id': upload_id, 'mtime': self.objectInfo.mtime, 'etag': self.objectInfo.etag,
+                      'size': self.size, 'parts': [], 'abspath': self._abspath,
+                      'bucket': self.bucket.bucket_name, 'key': self.key, 'part_size': part_size}
+
+            logger.debug('Add new record, bucket: {0}, key: {1}, upload_id: {2}, part_size: {3}'.format(
+                self.bucket.bucket_name, self.key, upload_id, part_size))
+            self._put_record(record)
+
+        self.__record = record
+        self.__part_size = record['part_size']
+        self.__upload_id = record['upload_id']
+        self.__finished_parts = self.__get_finished_parts()
+        self.__finished_size = sum(p.size for p in self.__finished_parts)
+
+    def __get_finished_parts(self):
+        sizes = dict((p.part_number, p.size) for p in _split_to_parts(self.size, self.__part_size))
+
+        return [PartInfo(int(p['part_number']), p['etag'], size=sizes[int(p['part_number'])], part_crc=p['part_crc'])
+                for p in self.__record['parts']]
+
+    def __get_parts_to_copy(self):
+        finished = set(p.part_number for p in self.__finished_parts)
+
+        return [p for p in _split_to_parts(self.size, self.__part_size) if p.part_number not in finished]
+
+    def __upload_exists(self, upload_id):
+        try:
+            list(iterators.PartIterator(self.bucket, self.key, upload_id, '0', max_parts=1))
+        except exceptions.NoSuchUpload:
+            return False
+        else:
+            return True
+
+    def __is_source_changed(self, record):
+        return (record['mtime'] != self.objectInfo.mtime or
+                record['size'] != self.objectInfo.size or
+                record['etag'] != self.objectInfo.etag)
+
+    @staticmethod
+    def is_record_sane(record):
+        try:
+            for key in ('upload_id', 'etag', 'abspath', 'bucket', 'key'):
+                if not isinstance(record[key], str):
+                    logger.info('{0} is not a string: {1}'.format(key, record[key]))
+                    return False
+
+            for key in ('part_size', 'size', 'mtime'):
+                if not isinstance(record[key], int):
+                    logger.info('{0} is not an integer: {1}'.format(key, record[key]))
+                    return False
+
+            if not isinstance(record['parts'], list):
+                logger.info('parts is not a list: {0}'.format(record['parts']))
+                return False
+        except KeyError as e:
+            logger.info('Key not found: {0}'.format(e.args))
+            return False
+
+        return True
+
+
 _UPLOAD_TEMP_DIR = '.py-oss-upload'
 _DOWNLOAD_TEMP_DIR = '.py-oss-download'
+_COPY_TEMP_DIR = '.py-oss-copy'
 
 
 class _ResumableStoreBase(object):
@@ -670,6 +978,23 @@ class ResumableDownloadStore(_ResumableStoreBase):
         return utils.md5_string(oss_pathname) + '-' + utils.md5_string(filepath) + '-download'
 
 
+class ResumableCopyStore(_ResumableStoreBase):
+    """保存断点拷贝断点信息的类。
+
+    每次拷贝的断点信息会保存在 `root/dir/` 下面的某个文件里。
+
+    :param str root: 父目录，缺省为HOME
+    :param str dir: 子目录，缺省为 `_COPY_TEMP_DIR`
+    """
+    def __init__(self, root=None, dir=None):
+        super(ResumableCopyStore, self).__init__(root or os.path.expanduser('~'), dir or _COPY_TEMP_DIR)
+
+    @staticmethod
+    def make_store_key(bucket_name, key, filename):
+        oss_pathname = 'oss://{0}/{1}'.format(bucket_name, key)
+        return utils.md5_string(oss_pathname) + '-' + utils.md5_string(filename) + '-copy'
+
+
 def make_upload_store(root=None, dir=None):
     return ResumableStore(root=root, dir=dir)
 
@@ -678,6 +1003,10 @@ def make_download_store(root=None, dir=None):
     return ResumableDownloadStore(root=root, dir=dir)
 
 
+def make_copy_store(root=None, dir=None):
+    return ResumableCopyStore(root=root, dir=dir)
+
+
 def _rebuild_record(filename, store, bucket, key, upload_id, part_size=None):
     abspath = os.path.abspath(filename)
     mtime = os.path.getmtime(filename)
@@ -744,3 +1073,101 @@ class _PartToProcess(object):
 
     def __key(self):
         return (self.part_number, self.start, self.end)
+
+
+class _PrefixCopier(object):
+    """把 `src_bucket` 中 `src_prefix` 下的文件拷贝到 `bucket` 的 `dst_prefix` 下，参见 :func:`Bucket.copy_prefix <oss2.Bucket.copy_prefix>` 。
+
+    源文件按页列举，每一页的文件全部拷贝（以及移动时删除源文件）成功后，把该页最后一个文件名作为断点保存到 `store` ，
+    重新调用时从断点继续。
+    """
+    def __init__(self, bucket, src_bucket, src_prefix, dst_prefix,
+                 workers=None, move=False, store=None,
+                 multipart_threshold=None, part_size=None,
+                 progress_callback=None):
+        self.bucket = bucket
+        self.src_bucket = src_bucket
+        self.src_prefix = to_string(src_prefix)
+        self.dst_prefix = to_string(dst_prefix)
+        self.workers = defaults.get(workers, defaults.batch_num_threads)
+        self.move = move
+        self.multipart_threshold = defaults.get(multipart_threshold, defaults.multipart_copy_threshold)
+        self.part_size = part_size
+        self.max_retries = max(defaults.request_retries, 1)
+
+        if src_bucket.bucket_name == bucket.bucket_name and self.dst_prefix.startswith(self.src_prefix):
+            raise exceptions.ClientError('dst_prefix should not be under src_prefix in the same bucket')
+
+        self.__store = store or ResumableCopyStore()
+        self.__record_key = '{0}-{1}-prefix'.format(
+            utils.md5_string('oss://{0}/{1}'.format(src_bucket.bucket_name, self.src_prefix)),
+            utils.md5_string('oss://{0}/{1}'.format(bucket.bucket_name, self.dst_prefix)))
+
+        self.__progress_callback = progress_callback
+        self.__copied = 0
+
+    def copy(self):
+        record = self.__store.get(self.__record_key)
+        marker = record['marker'] if record else ''
+        if marker:
+            logger.info("Resume copy prefix from marker: {0}".format(marker))
+
+        iterator = iterators.ObjectIterator(self.src_bucket, prefix=self.src_prefix, marker=marker,
+                                            max_keys=1000, prefetch=1)
+        try:
+            for page in iterator.iter_pages():
+                self.__copy_page(page)
+        finally:
+            iterator.close()
+
+        if record or self.__copied:
+            self.__store.delete(self.__record_key)
+
+        return self.__copied
+
+    def __copy_page(self, page):
+        if not page.keys:
+            return
+
+        objects = [(page.keys[i], page.sizes[i], page.etags[i]) for i in range(len(page.keys))]
+
+        error = None
+        for obj, result in bulk._iter_concurrently(self.__copy_object, objects, self.workers):
+            if isinstance(result, exceptions.OssError) and error is None:
+                error = result
+
+        if error is not None:
+            raise error
+
+        if self.move:
+            bulk._call_with_retry(self.max_retries, self.src_bucket.batch_delete_objects, page.keys, quiet=True)
+
+        self.__copied += len(objects)
+        utils._invoke_progress_callback(self.__progress_callback, self.__copied, None)
+
+        self.__store.put(self.__record_key, {'src_bucket': self.src_bucket.bucket_name,
+                                             'src_prefix': self.src_prefix,
+                                             'bucket': self.bucket.bucket_name,
+                                             'dst_prefix': self.dst_prefix,
+                                             'marker': page.keys[-1]})
+
+    def __copy_object(self, obj):
+        key, size, etag = obj
+        dst_key = self.dst_prefix + key[len(self.src_prefix):]
+
+        if size < self.multipart_threshold:
+            bulk._call_with_retry(self.max_retries, self.bucket.copy_object, self.src_bucket.bucket_name, key, dst_key,
+                                  headers={OSS_COPY_OBJECT_SOURCE_IF_MATCH: etag})
+        else:
+            self.__multipart_copy(key, size, etag, dst_key)
+
+    def __multipart_copy(self, key, size, etag, dst_key):
+        result = self.src_bucket.head_object(key, headers={IF_MATCH: etag})
+
+        copier = _ResumableCopier(self.bucket, self.src_bucket, key, dst_key, _ObjectInfo.make(result),
+                                  store=self.__store,
+                                  headers=_copied_headers(result.headers),
+                                  part_size=self.part_size,
+                                  num_threads=self.workers)
+        copier.copy(result.server_crc)
+
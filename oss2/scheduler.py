@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""
+oss2.scheduler
+~~~~~~~~~~~~~~
+
+进程内共享的传输调度器。
+
+断点续传等并发传输把各自的分片提交到同一个有界的线程池中执行，而不是每次传输都创建自己的线程：
+
+- 优先级（priority）高的传输总是先执行；
+- 同一优先级的传输按权重（weight）公平地分享线程：每次挑选“已经处理的数据量/权重”最小的传输；
+- 可以随时取消一个传输，还没有开始的分片不再执行。
+"""
+
+import collections
+import logging
+import sys
+import threading
+import traceback
+
+from . import defaults
+from .exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+
+class TransferJob(object):
+    """一个传输任务，由 :meth:`TransferScheduler.new_job` 创建。
+
+    同一个job可以多次（甚至在多个线程中同时）调用 :meth:`run` ，它们共享该job的优先级、权重和并发数上限。
+    """
+    def __init__(self, scheduler, priority, weight, max_workers):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.weight = weight
+        self.max_workers = max_workers
+
+        # 以下字段由scheduler的锁保护
+        self._tasks = collections.deque()
+        self._running = 0
+        self._vtime = 0.0
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def run(self, func, items, cost=None):
+        """对 `items` 中的每个元素调用 `func` ，全部完成后返回。
+
+        某个元素失败时，本次调用中还没有开始的元素不再执行，等已经开始的完成后抛出第一个异常。
+
+        :param func: 处理单个元素的函数
+        :param items: 待处理的元素
+        :param cost: 计算单个元素开销（如分片长度）的函数，用于在多个job之间公平分配；如不指定，每个元素的开销都是1
+
+        :raises: 在全部完成之前job被取消，则抛出 :class:`ClientError <oss2.exceptions.ClientError>` ，
+            即使所有元素都已经开始或完成
+        """
+        self.scheduler._run(self, func, items, cost)
+
+    def cancel(self):
+        """取消该job：还没有开始的元素不再执行，正在执行的不受影响。还没有返回的 :meth:`run` 都会抛出异常。"""
+        self.scheduler._cancel(self)
+
+
+class _Batch(object):
+    def __init__(self):
+        self.unfinished = 0
+        self.cancelled = False
+        self.exc_info = None
+        self.exc_stack = ''
+
+
+class TransferScheduler(object):
+    """传输调度器，拥有一个有界的线程池，多个job的分片都在其中执行。
+
+    线程在需要时才创建，且都是daemon线程。通常使用 :func:`default_scheduler` 返回的进程内共享的对象即可。
+
+    :param int num_threads: 线程数上限，如不指定则使用 `oss2.defaults.transfer_num_threads`
+    """
+    def __init__(self, num_threads=None):
+        self.num_threads = max(defaults.get(num_threads, defaults.transfer_num_threads), 1)
+
+        self.__cond = threading.Condition(threading.Lock())
+        self.__local = threading.local()
+
+        # 有待执行元素的job
+        self.__jobs = []
+        self.__threads = 0
+        self.__idle = 0
+        self.__vtime = 0.0
+
+    def new_job(self, priority=0, weight=1, max_workers=None):
+        """创建一个job。
+
+        :param int priority: 优先级，数值大的先执行
+        :param weight: 权重，同一优先级的job按权重的比例分享线程
+        :param int max_workers: 该job同时使用的线程数上限，如不指定则不单独限制
+        """
+        if weight <= 0:
+            raise ClientError('weight must be positive, got {0}'.format(weight))
+
+        return TransferJob(self, priority, weight, max_workers)
+
+    def _run(self, job, func, items, cost):
+        # 在工作线程中再提交任务，如果所有线程都在等待就会死锁，因此直接在当前线程中依次执行
+        if getattr(self.__local, 'is_worker', False):
+            for item in items:
+                if job.cancelled:
+                    raise ClientError('Transfer job is cancelled')
+                func(item)
+
+            if job.cancelled:
+                raise ClientError('Transfer job is cancelled')
+            return
+
+        batch = _Batch()
+
+        with self.__cond:
+            if job.cancelled:
+                raise ClientError('Transfer job is cancelled')
+
+            for item in items:
+                job._tasks.append((batch, func, item, cost(item) if cost else 1))
+                batch.unfinished += 1
+
+            if not batch.unfinished:
+                return
+
+            if job not in self.__jobs:
+                job._vtime = max(job._vtime, self.__vtime)
+                self.__jobs.append(job)
+
+            self.__start_threads(batch.unfinished)
+            self.__cond.notify_all()
+
+            # 带超时等待，使KeyboardInterrupt有机会发生
+            while batch.unfinished:
+                self.__cond.wait(1)
+
+        if batch.exc_info:
+            logger.error('An exception was thrown by transfer job, backtrace: {0}'.format(batch.exc_stack))
+            raise batch.exc_info[1]
+
+        # 所有元素都已经开始之后才取消的，也视为取消
+        if batch.cancelled or job.cancelled:
+            raise ClientError('Transfer job is cancelled')
+
+    def _cancel(self, job):
+        with self.__cond:
+            job._cancelled = True
+            self.__drop_tasks(job, lambda batch: True)
+            self.__cond.notify_all()
+
+    def __start_threads(self, count):
+        count = min(count - self.__idle, self.num_threads - self.__threads)
+
+        for i in range(count):
+            t = threading.Thread(target=self.__worker)
+            t.daemon = True
+            t.start()
+            self.__threads += 1
+
+    def __worker(self):
+        self.__local.is_worker = True
+
+        while True:
+            job, batch, func, item = self.__next_task()
+
+            try:
+                func(item)
+            except:
+                self.__finish_task(job, batch, sys.exc_info(), traceback.format_exc())
+            else:
+                self.__finish_task(job, batch, None, '')
+
+    def __next_task(self):
+        with self.__cond:
+            while True:
+                job = self.__pick_job()
+                if job is not None:
+                    break
+
+                self.__idle += 1
+                self.__cond.wait()
+                self.__idle -= 1
+
+            batch, func, item, cost = job._tasks.popleft()
+            if not job._tasks:
+                self.__jobs.remove(job)
+
+            self.__vtime = max(self.__vtime, job._vtime)
+            job._vtime += float(cost) / job.weight
+            job._running += 1
+
+            return job, batch, func, item
+
+    def __pick_job(self):
+        best = None
+        for job in self.__jobs:
+            if job.max_workers is not None and job._running >= job.max_workers:
+                continue
+
+            if best is None or (-job.priority, job._vtime) < (-best.priority, best._vtime):
+                best = job
+
+        return best
+
+    def __finish_task(self, job, batch, exc_info, exc_stack):
+        with self.__cond:
+            job._running -= 1
+            batch.unfinished -= 1
+
+            if exc_info and batch.exc_info is None:
+                batch.exc_info = exc_info
+                batch.exc_stack = exc_stack
+                self.__drop_tasks(job, lambda b: b is batch)
+
+            self.__cond.notify_all()
+
+    def __drop_tasks(self, job, pred):
+        kept = collections.deque()
+        for task in job._tasks:
+            batch = task[0]
+            if pred(batch):
+                batch.unfinished -= 1
+                batch.cancelled = True
+            else:
+                kept.append(task)
+
+        job._tasks = kept
+        if not kept and job in self.__jobs:
+            self.__jobs.remove(job)
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def default_scheduler():
+    """返回进程内共享的 :class:`TransferScheduler` ，第一次调用时按 `oss2.defaults.transfer_num_threads` 创建。"""
+    global _default_scheduler
+
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = TransferScheduler()
+
+        return _default_scheduler
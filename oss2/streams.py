@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+
+"""
+oss2.streams
+~~~~~~~~~~~~
+
+以文件对象的方式读写OSS文件。
+
+用法 ::
+
+    >>> with bucket.open_write('backup.tar.gz', part_size=16 * 1024 * 1024, max_in_flight=4) as f:
+    ...     for chunk in tar_process.stdout:
+    ...         f.write(chunk)
+
+    >>> with bucket.open_read('archive.zip') as f:
+    ...     print(zipfile.ZipFile(f).namelist())
+"""
+
+import collections
+import io
+import logging
+import os
+import sys
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from . import bulk
+from . import defaults
+from . import http
+from . import utils
+from .compat import to_bytes, to_string
+from .exceptions import ClientError, InconsistentError
+from .headers import IF_MATCH
+from .models import PartInfo
+
+logger = logging.getLogger(__name__)
+
+
+_MIN_PART_SIZE = 100 * 1024
+_MAX_PART_COUNT = 10000
+
+
+class _BufferReader(object):
+    """把缓冲区的前 `size` 个字节包装成可读的文件对象，读取时不复制整个缓冲区。"""
+    def __init__(self, buf, size):
+        self.view = memoryview(buf)[:size]
+        self.size = size
+        self.offset = 0
+
+    def __len__(self):
+        return self.size - self.offset
+
+    def read(self, amt=None):
+        if amt is None or amt < 0:
+            end = self.size
+        else:
+            end = min(self.offset + amt, self.size)
+
+        content = self.view[self.offset:end].tobytes()
+        self.offset = end
+        return content
+
+
+class ObjectWriter(object):
+    """以只写文件对象的方式上传OSS文件，由 :func:`Bucket.open_write <oss2.Bucket.open_write>` 返回。
+
+    写入的数据按 `part_size` 切分成分片，由后台线程用 `upload_part` 并发上传，同时上传或等待上传的分片不超过
+    `max_in_flight` 个；分片缓冲区循环使用，因此占用的内存不超过 `part_size` × `max_in_flight` 。
+    上传跟不上写入时， `write` 会阻塞。
+
+    `close` 时完成分片上传；写入的数据不足一个分片时，不使用分片上传，而是用 `put_object` 一次上传。
+    出错时（包括在 `with` 语句中抛出异常）会取消分片上传，不会生成文件。
+
+    :param bucket: :class:`Bucket <oss2.Bucket>` 对象
+    :param str key: 文件名
+    :param int part_size: 分片大小，缺省为 `oss2.defaults.part_size`
+    :param int max_in_flight: 分片缓冲区个数，也是上传线程数，缺省为 `oss2.defaults.multipart_num_threads`
+    :param headers: 传给 `put_object` 或 `init_multipart_upload` 的HTTP头部
+    """
+    def __init__(self, bucket, key, part_size=None, max_in_flight=None, headers=None):
+        self.bucket = bucket
+        self.key = to_string(key)
+        self.part_size = defaults.get(part_size, defaults.part_size)
+        self.max_in_flight = max(defaults.get(max_in_flight, defaults.multipart_num_threads), 1)
+        self.headers = headers
+
+        if self.part_size < _MIN_PART_SIZE:
+            raise ClientError('part_size should not be less than {0}'.format(_MIN_PART_SIZE))
+
+        #: 上传完成后的结果，为 :class:`PutObjectResult <oss2.models.PutObjectResult>`
+        self.result = None
+
+        self.upload_id = None
+        self.closed = False
+
+        self.__offset = 0
+        self.__next_part_number = 1
+
+        # 空闲的缓冲区，最多创建max_in_flight个
+        self.__pool = queue.Queue()
+        self.__num_buffers = 0
+        self.__buffer = None
+        self.__buffer_size = 0
+
+        self.__tasks = queue.Queue()
+        self.__threads = []
+
+        # protect below fields
+        self.__lock = threading.Lock()
+        self.__parts = []
+        self.__exc_info = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.__offset
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        """写入数据，返回写入的字节数。"""
+        if self.closed:
+            raise ValueError('I/O operation on closed ObjectWriter')
+
+        self.__check_error()
+
+        view = memoryview(to_bytes(data))
+        written = 0
+        while written < len(view):
+            if self.__buffer is None:
+                self.__buffer = self.__get_buffer()
+                self.__buffer_size = 0
+
+            n = min(self.part_size - self.__buffer_size, len(view) - written)
+            self.__buffer[self.__buffer_size:self.__buffer_size + n] = view[written:written + n]
+            self.__buffer_size += n
+            written += n
+
+            if self.__buffer_size == self.part_size:
+                self.__submit_buffer()
+
+        self.__offset += written
+        return written
+
+    def close(self):
+        """等待所有分片上传完成，并完成分片上传；出错时取消分片上传，并抛出异常。"""
+        if self.closed:
+            return
+
+        self.closed = True
+
+        try:
+            if self.upload_id is None:
+                data = _BufferReader(self.__buffer, self.__buffer_size).read() if self.__buffer else b''
+                self.result = self.bucket.put_object(self.key, data, headers=self.headers)
+                return
+
+            if self.__buffer_size > 0:
+                self.__submit_buffer()
+
+            self.__stop_threads()
+            self.__check_error()
+
+            parts = sorted(self.__parts, key=lambda p: p.part_number)
+            self.result = self.bucket.complete_multipart_upload(self.key, self.upload_id, parts)
+
+            if self.bucket.enable_crc:
+                utils.check_crc('open write', utils.calc_obj_crc_from_parts(parts), self.result.crc,
+                                self.result.request_id)
+        except:
+            self.__stop_threads()
+            self.__abort_upload()
+            raise
+        finally:
+            self.__release_buffers()
+
+    def abort(self):
+        """放弃写入，取消分片上传。"""
+        if self.closed:
+            return
+
+        self.closed = True
+
+        with self.__lock:
+            if self.__exc_info is None:
+                self.__exc_info = (ClientError, ClientError('ObjectWriter is aborted'), None)
+
+        self.__stop_threads()
+        self.__abort_upload()
+        self.__release_buffers()
+
+    def __get_buffer(self):
+        if self.__num_buffers < self.max_in_flight and self.__pool.empty():
+            self.__num_buffers += 1
+            return bytearray(self.part_size)
+
+        # 所有缓冲区都在上传，等待其中一个上传完成；上传线程出错时不再等待
+        while True:
+            self.__check_error()
+            try:
+                return self.__pool.get(timeout=1)
+            except queue.Empty:
+                pass
+
+    def __submit_buffer(self):
+        if self.upload_id is None:
+            self.upload_id = self.bucket.init_multipart_upload(self.key, headers=self.headers).upload_id
+            self.__start_threads()
+
+        if self.__next_part_number > _MAX_PART_COUNT:
+            raise ClientError('too many parts, part_size should be larger than {0}'.format(self.part_size))
+
+        self.__tasks.put((self.__next_part_number, self.__buffer, self.__buffer_size))
+        self.__next_part_number += 1
+        self.__buffer = None
+        self.__buffer_size = 0
+
+    def __start_threads(self):
+        for i in range(self.max_in_flight):
+            t = threading.Thread(target=self.__upload_func)
+            t.daemon = True
+            t.start()
+            self.__threads.append(t)
+
+    def __stop_threads(self):
+        for t in self.__threads:
+            self.__tasks.put(None)
+
+        for t in self.__threads:
+            t.join()
+
+        self.__threads = []
+
+    def __upload_func(self):
+        while True:
+            task = self.__tasks.get()
+            if task is None:
+                return
+
+            part_number, buf, size = task
+            try:
+                with self.__lock:
+                    failed = self.__exc_info is not None
+
+                if not failed:
+                    result = self.bucket.upload_part(self.key, self.upload_id, part_number, _BufferReader(buf, size))
+                    with self.__lock:
+                        self.__parts.append(PartInfo(part_number, result.etag, size=size, part_crc=result.crc))
+            except:
+                with self.__lock:
+                    if self.__exc_info is None:
+                        self.__exc_info = sys.exc_info()
+            finally:
+                self.__pool.put(buf)
+
+    def __check_error(self):
+        with self.__lock:
+            exc_info = self.__exc_info
+
+        if exc_info is not None:
+            raise exc_info[1]
+
+    def __abort_upload(self):
+        if self.upload_id is None:
+            return
+
+        try:
+            self.bucket.abort_multipart_upload(self.key, self.upload_id)
+        except Exception as e:
+            logger.warning("Abort multipart upload failed, key: {0}, upload_id: {1}, error: {2}".format(
+                self.key, self.upload_id, e))
+
+    def __release_buffers(self):
+        self.__buffer = None
+        self.__pool = queue.Queue()
+
+
+class ObjectReader(io.RawIOBase):
+    """可以seek的只读文件对象，由 :func:`Bucket.open_read <oss2.Bucket.open_read>` 返回。
+
+    文件被划分为 `block_size` 大小的块，读取时按块用Range GET获取，最近使用的 `cache_blocks` 个块缓存在内存中。
+    检测到顺序读取时，会在后台预读之后的 `read_ahead` 个块。所有请求都带上打开时文件的ETag（If-Match），
+    文件在读取过程中被覆盖时会抛出 :class:`PreconditionFailed <oss2.exceptions.PreconditionFailed>` ，不会读到新旧混杂的数据。
+
+    :param bucket: :class:`Bucket <oss2.Bucket>` 对象
+    :param str key: 文件名
+    :param int block_size: 块大小，缺省为 `oss2.defaults.read_block_size`
+    :param int cache_blocks: 缓存的块数，缺省为 `oss2.defaults.read_cache_blocks`
+    :param int read_ahead: 顺序读取时预读的块数，为0则不预读
+    """
+    def __init__(self, bucket, key, block_size=None, cache_blocks=None, read_ahead=2):
+        super(ObjectReader, self).__init__()
+
+        self.bucket = bucket
+        self.key = to_string(key)
+        self.block_size = max(defaults.get(block_size, defaults.read_block_size), 1)
+        self.cache_blocks = max(defaults.get(cache_blocks, defaults.read_cache_blocks), 1)
+        self.read_ahead = min(read_ahead, self.cache_blocks - 1)
+
+        result = bucket.head_object(key)
+
+        #: 文件长度
+        self.size = result.content_length
+
+        #: 打开时文件的ETag
+        self.etag = result.etag
+
+        #: 从缓存中读到块的次数
+        self.hits = 0
+
+        #: 需要从OSS读取块的次数
+        self.misses = 0
+
+        self.__offset = 0
+        self.__last_block = None
+
+        # protect below fields
+        self.__lock = threading.Lock()
+        self.__blocks = collections.OrderedDict()
+        self.__pending = {}
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.__offset
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self.__offset + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError('invalid whence: {0}'.format(whence))
+
+        if position < 0:
+            raise ValueError('negative seek position {0}'.format(position))
+
+        self.__offset = position
+        return position
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError('I/O operation on closed ObjectReader')
+
+        view = memoryview(b)
+        length = min(len(view), max(self.size - self.__offset, 0))
+
+        copied = 0
+        while copied < length:
+            index, start = divmod(self.__offset + copied, self.block_size)
+            block = self.__get_block(index)
+
+            n = min(len(block) - start, length - copied)
+            view[copied:copied + n] = block[start:start + n]
+            copied += n
+
+        self.__offset += copied
+        return copied
+
+    def readall(self):
+        buf = bytearray(max(self.size - self.__offset, 0))
+        return bytes(buf[:self.readinto(buf)])
+
+    def close(self):
+        with self.__lock:
+            self.__blocks.clear()
+
+        super(ObjectReader, self).close()
+
+    def __get_block(self, index):
+        sequential = self.__last_block is not None and index in (self.__last_block, self.__last_block + 1)
+        self.__last_block = index
+
+        with self.__lock:
+            block = self.__blocks.pop(index, None)
+            if block is not None:
+                self.__blocks[index] = block
+                self.hits += 1
+            event = self.__pending.get(index)
+
+        if block is None and event is not None:
+            # 块正在被预读，等待预读完成；预读失败时下面重新读取
+            event.wait()
+            with self.__lock:
+                block = self.__blocks.get(index)
+                if block is not None:
+                    self.hits += 1
+
+        if block is None:
+            with self.__lock:
+                self.misses += 1
+            block = self.__fetch_block(index)
+            self.__put_block(index, block)
+
+        if sequential:
+            for i in range(index + 1, index + 1 + self.read_ahead):
+                self.__start_read_ahead(i)
+
+        return block
+
+    def __fetch_block(self, index):
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+
+        return self.bucket.get_object(self.key, byte_range=(start, end), headers={IF_MATCH: self.etag}).read()
+
+    def __put_block(self, index, block):
+        with self.__lock:
+            self.__blocks.pop(index, None)
+            self.__blocks[index] = block
+
+            while len(self.__blocks) > self.cache_blocks:
+                self.__blocks.popitem(last=False)
+
+    def __start_read_ahead(self, index):
+        if index * self.block_size >= self.size:
+            return
+
+        with self.__lock:
+            if index in self.__blocks or index in self.__pending:
+                return
+
+            event = threading.Event()
+            self.__pending[index] = event
+
+        t = threading.Thread(target=self.__read_ahead_func, args=(index, event))
+        t.daemon = True
+        t.start()
+
+    def __read_ahead_func(self, index, event):
+        try:
+            self.__put_block(index, self.__fetch_block(index))
+        except Exception as e:
+            logger.debug("Read ahead failed, key: {0}, block: {1}, error: {2}".format(self.key, index, e))
+        finally:
+            with self.__lock:
+                del self.__pending[index]
+            event.set()
+
+
+def _coalesce_ranges(ranges, max_gap, max_request_size):
+    """把 `ranges` 按起始位置排序，间隔不超过 `max_gap` 的相邻范围合并，合并后的长度不超过 `max_request_size` 。
+
+    返回[(起始，结束，[原范围的下标，...])，...]，起始和结束都包含在内。
+    """
+    groups = []
+
+    for i in sorted(range(len(ranges)), key=lambda i: ranges[i]):
+        start, end = ranges[i]
+        if groups:
+            group = groups[-1]
+            new_end = max(end, group[1])
+            if start <= group[1] + 1 + max_gap and new_end - group[0] + 1 <= max_request_size:
+                group[1] = new_end
+                group[2].append(i)
+                continue
+
+        groups.append([start, end, [i]])
+
+    return groups
+
+
+def _read_ranges(bucket, key, ranges, max_gap=None, max_request_size=None, workers=None, headers=None):
+    ranges = [(int(start), int(end)) for start, end in ranges]
+    for start, end in ranges:
+        if start < 0 or end < start:
+            raise ClientError('invalid range: ({0}, {1})'.format(start, end))
+
+    max_gap = defaults.get(max_gap, defaults.read_ranges_max_gap)
+    max_request_size = defaults.get(max_request_size, defaults.read_ranges_max_request_size)
+    workers = defaults.get(workers, defaults.multiget_num_threads)
+
+    if not ranges:
+        return []
+
+    # 所有请求都要求是同一个版本，否则文件中途被覆盖时会拼接出两个版本的数据
+    headers = http.CaseInsensitiveDict(headers)
+    if IF_MATCH not in headers:
+        result = bucket.head_object(key, headers=headers)
+        headers[IF_MATCH] = result.etag
+
+        # 起始位置超出文件长度的Range会被OSS忽略，返回整个文件
+        for start, end in ranges:
+            if end >= result.content_length:
+                raise ClientError('range ({0}, {1}) exceeds the object size {2}'.format(start, end,
+                                                                                         result.content_length))
+
+    groups = _coalesce_ranges(ranges, max_gap, max_request_size)
+    logger.debug("Read ranges, key: {0}, ranges: {1}, requests: {2}".format(to_string(key), len(ranges), len(groups)))
+
+    def fetch(group):
+        result = bucket.get_object(key, byte_range=(group[0], group[1]), headers=headers)
+
+        content_range = result.headers.get('Content-Range', '')
+        if result.status != 206 or not content_range.startswith('bytes {0}-{1}/'.format(group[0], group[1])):
+            raise InconsistentError('range ({0}, {1}) is not returned, status: {2}, Content-Range: {3}'.format(
+                group[0], group[1], result.status, content_range), result.request_id)
+
+        data = result.read()
+        if len(data) != group[1] - group[0] + 1:
+            raise InconsistentError('IncompleteRead from source, expected: {0}, actual: {1}'.format(
+                group[1] - group[0] + 1, len(data)), result.request_id)
+
+        return memoryview(data)
+
+    views = [None] * len(ranges)
+    for group, result in bulk._iter_concurrently(fetch, groups, min(workers, len(groups)) or 1):
+        if isinstance(result, Exception):
+            raise result
+
+        for i in group[2]:
+            start, end = ranges[i]
+            views[i] = result[start - group[0]:end - group[0] + 1]
+
+    return views
+
+
+def _get_object_parallel(bucket, key, part_size=None, num_threads=None, headers=None):
+    part_size = max(defaults.get(part_size, defaults.multiget_part_size), 1)
+    num_threads = defaults.get(num_threads, defaults.multiget_num_threads)
+    max_retries = max(defaults.request_retries, 1)
+
+    result = bucket.head_object(key, headers=headers)
+    size = result.content_length
+
+    buf = bytearray(size)
+    view = memoryview(buf)
+
+    # 所有分片都要求是打开时的版本
+    part_headers = http.CaseInsensitiveDict(headers)
+    part_headers[IF_MATCH] = result.etag
+
+    # 有分片失败后，其他分片（包括它们的重试）不再发送请求
+    failed = threading.Event()
+
+    def fetch(part):
+        if failed.is_set():
+            return None
+
+        part_number, start, end = part
+        part_result = bucket.get_object(key, byte_range=(start, end - 1), headers=part_headers)
+
+        n = part_result.readinto(view[start:end])
+        if n != end - start:
+            raise InconsistentError('IncompleteRead from source, expected: {0}, actual: {1}'.format(end - start, n),
+                                    part_result.request_id)
+
+        return PartInfo(part_number, None, size=n, part_crc=part_result.client_crc)
+
+    def fetch_with_retry(part):
+        return bulk._call_with_retry(max_retries, fetch, part)
+
+    parts = [(i + 1, start, min(start + part_size, size)) for i, start in enumerate(range(0, size, part_size))]
+    logger.debug("Get object parallel, key: {0}, size: {1}, parts: {2}".format(to_string(key), size, len(parts)))
+
+    part_infos = []
+    iterator = bulk._iter_concurrently(fetch_with_retry, parts, max(min(num_threads, len(parts)), 1))
+    try:
+        for part, part_info in iterator:
+            if isinstance(part_info, Exception):
+                failed.set()
+                raise part_info
+            part_infos.append(part_info)
+    finally:
+        # 等正在进行的请求都结束后再返回或抛出异常
+        iterator.close()
+
+    if bucket.enable_crc and part_infos:
+        part_infos.sort(key=lambda p: p.part_number)
+        utils.check_crc('get object parallel', utils.calc_obj_crc_from_parts(part_infos), result.server_crc,
+                        result.request_id)
+
+    return buf
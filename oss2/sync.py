@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+
+"""
+oss2.sync
+~~~~~~~~~
+
+本地目录与OSS前缀之间的增量同步。
+"""
+
+import collections
+import logging
+import os
+
+from . import bulk
+from . import defaults
+from . import exceptions
+from . import utils
+from .api import Bucket
+from .compat import json, to_string
+from .iterators import ObjectIterator
+from .resumable import resumable_upload, _ResumableDownloader, _ObjectInfo
+from .transfer import _list_dir, _file_crc, _gen_tmp_suffix
+
+
+logger = logging.getLogger(__name__)
+
+
+#: 以本地目录为准：上传本地新增或修改的文件，`delete` 为True时删除OSS上多余的文件
+SYNC_UPLOAD = 'upload'
+
+#: 以OSS为准：下载OSS上新增或修改的文件，`delete` 为True时删除本地多余的文件
+SYNC_DOWNLOAD = 'download'
+
+#: 双向同步：哪边修改了就同步到另一边，两边都修改了则以修改时间较晚的为准
+SYNC_BOTH = 'both'
+
+_SYNC_MANIFEST_DIR = '.py-oss-sync'
+_MANIFEST_VERSION = 1
+
+_UPLOAD = 'upload'
+_DOWNLOAD = 'download'
+_DELETE_LOCAL = 'delete_local'
+_DELETE_REMOTE = 'delete_remote'
+_RECORD = 'record'
+_FAILED = 'failed'
+
+# 连续的不需要同步的文件最多攒这么多个，随下一个任务按顺序写入清单
+_MAX_UNCHANGED_RUN = 1000
+
+# 按顺序写入清单时，最多有这么多倍于线程数的任务在进行中或等待写入
+_IN_FLIGHT_PER_WORKER = 16
+
+
+# 本地文件：长度和修改时间（秒）
+_LocalFile = collections.namedtuple('_LocalFile', ['size', 'mtime'])
+
+# OSS文件：长度、ETag和最后修改时间
+_RemoteFile = collections.namedtuple('_RemoteFile', ['size', 'etag', 'last_modified'])
+
+# 清单中的一项，即上次同步完成时的状态：本地文件的长度、修改时间，以及内容的CRC64和OSS文件的ETag
+_ManifestEntry = collections.namedtuple('_ManifestEntry', ['size', 'mtime', 'crc', 'etag'])
+
+
+class SyncResult(object):
+    """同步的结果。
+
+    :param int uploaded: 上传的文件数
+    :param int downloaded: 下载的文件数
+    :param int deleted_local: 删除的本地文件数
+    :param int deleted_remote: 删除的OSS文件数
+    :param int unchanged: 不需要同步的文件数
+    :param dict failed: 同步失败的文件，相对路径（以'/'分隔） -> 异常。下次同步时会重试
+    """
+    def __init__(self):
+        self.uploaded = 0
+        self.downloaded = 0
+        self.deleted_local = 0
+        self.deleted_remote = 0
+        self.unchanged = 0
+        self.failed = {}
+
+
+def sync_directory(bucket, local_dir, prefix='', mode=SYNC_BOTH, delete=False, manifest=None, workers=None,
+                   multipart_threshold=None, multiget_threshold=None):
+    """同步本地目录 `local_dir` 与 `prefix` 下的文件，相对路径相同（OSS文件名去掉 `prefix` ，以'/'分隔）的视为同一个文件。
+
+    每次同步完成后，在本地清单中记录每个文件的长度、本地修改时间、CRC64和OSS上的ETag。下次同步时：
+
+    - 本地文件长度和修改时间与清单一致的，认为没有修改；只有修改时间变了的，再用CRC64确认内容是否改变
+    - OSS文件ETag与清单一致的，认为没有修改
+    - 两边都没有修改的文件不做任何操作，也不需要读取本地文件或者访问OSS文件
+
+    OSS文件列表、按文件名排序遍历的本地目录和清单都是流式读取的，三者按文件名做归并，内存占用与文件总数无关。
+    需要同步的文件交给 `workers` 个线程并发上传、下载或删除，结果按文件名的顺序边同步边写入新的清单，
+    因此只需要缓存有限个进行中的文件；一个很大的文件会让排在它后面的文件最多等待 `workers` 的若干倍个。
+
+    文件只存在于一边时：如果清单中有记录且这边没有修改，说明另一边删除了它，`delete` 为True时同样删除；
+    否则把它同步到另一边（单向同步时只会同步到目标一方）。
+
+    用法 ::
+
+        >>> result = oss2.sync.sync_directory(bucket, '/data/photos', 'photos/', mode=oss2.sync.SYNC_BOTH)
+        >>> print(result.uploaded, result.downloaded, result.failed)
+
+    :param bucket: :class:`Bucket <oss2.Bucket>` 对象
+    :param local_dir: 本地目录
+    :param prefix: OSS文件名前缀
+    :param mode: 同步方向，`SYNC_UPLOAD` 、 `SYNC_DOWNLOAD` 或 `SYNC_BOTH`
+    :param delete: 是否删除多余的文件
+    :param manifest: 清单文件路径。缺省保存在用户HOME目录的 `.py-oss-sync` 下，由Bucket名、前缀和本地目录决定
+    :param workers: 线程数，缺省为 `oss2.defaults.batch_num_threads`
+    :param multipart_threshold: 上传文件长度不小于该值时用断点续传上传，缺省为 `oss2.defaults.multipart_threshold`
+    :param multiget_threshold: 下载文件长度不小于该值时用断点续传下载，缺省为 `oss2.defaults.multiget_threshold`
+
+    :return: :class:`SyncResult`
+    """
+    return _DirectorySyncer(bucket, local_dir, prefix, mode=mode, delete=delete, manifest=manifest, workers=workers,
+                            multipart_threshold=multipart_threshold, multiget_threshold=multiget_threshold).sync()
+
+
+def _iter_sorted_files(root, rel_dir=''):
+    """按相对路径（以'/'分隔）的字典序遍历 `root` 下的文件，返回（相对路径， :class:`_LocalFile` ）。
+
+    同一目录下的目录名按加上'/'后参与排序，这样整个遍历结果与OSS列举的顺序一致。每次只保存一层目录的内容。
+    """
+    entries = []
+    for name, is_dir, st in _list_dir(os.path.join(root, rel_dir) if rel_dir else root):
+        name = to_string(name)
+        entries.append((name + '/' if is_dir else name, is_dir, st))
+    entries.sort(key=lambda e: e[0])
+
+    for name, is_dir, st in entries:
+        if is_dir:
+            for item in _iter_sorted_files(root, rel_dir + name):
+                yield item
+        else:
+            yield rel_dir + name, _LocalFile(st.st_size, int(st.st_mtime))
+
+
+def _merge_join(*iterators):
+    """对若干个按路径排好序、每次返回（路径，值）的迭代器做归并，返回（路径，[各个迭代器中该路径的值或None]）。"""
+    iterators = [iter(it) for it in iterators]
+    heads = [next(it, None) for it in iterators]
+
+    while True:
+        paths = [head[0] for head in heads if head is not None]
+        if not paths:
+            return
+
+        path = min(paths)
+        values = []
+        for i, head in enumerate(heads):
+            if head is not None and head[0] == path:
+                values.append(head[1])
+                heads[i] = next(iterators[i], None)
+            else:
+                values.append(None)
+
+        yield path, values
+
+
+def _write_manifest_entry(f, path, entry):
+    if entry is not None:
+        f.write(json.dumps([path, entry.size, entry.mtime, entry.crc, entry.etag]) + '\n')
+
+
+class _DirectorySyncer(object):
+    def __init__(self, bucket, local_dir, prefix, mode=SYNC_BOTH, delete=False, manifest=None, workers=None,
+                 multipart_threshold=None, multiget_threshold=None):
+        if not isinstance(bucket, Bucket):
+            raise exceptions.ClientError('sync only support Bucket, CRC64 of encrypted objects can not be compared')
+
+        if mode not in (SYNC_UPLOAD, SYNC_DOWNLOAD, SYNC_BOTH):
+            raise exceptions.ClientError('invalid sync mode: {0}'.format(mode))
+
+        self.bucket = bucket
+        self.local_dir = os.path.abspath(local_dir)
+        self.prefix = to_string(prefix)
+        self.mode = mode
+        self.delete = delete
+        self.workers = max(defaults.get(workers, defaults.batch_num_threads), 1)
+        self.multipart_threshold = defaults.get(multipart_threshold, defaults.multipart_threshold)
+        self.multiget_threshold = defaults.get(multiget_threshold, defaults.multiget_threshold)
+        self.max_retries = max(defaults.request_retries, 1)
+
+        self.manifest = manifest or os.path.join(
+            os.path.expanduser('~'), _SYNC_MANIFEST_DIR,
+            '{0}-{1}'.format(utils.md5_string('oss://{0}/{1}'.format(bucket.bucket_name, self.prefix)),
+                             utils.md5_string(self.local_dir)))
+        self.__header = {'version': _MANIFEST_VERSION, 'bucket': bucket.bucket_name, 'prefix': self.prefix}
+
+        self.__result = SyncResult()
+
+    def sync(self):
+        utils.makedir_p(os.path.dirname(os.path.abspath(self.manifest)))
+        tmp_file = self.manifest + _gen_tmp_suffix()
+
+        iterator = ObjectIterator(self.bucket, prefix=self.prefix, max_keys=1000, prefetch=1)
+        try:
+            with open(tmp_file, 'w') as f:
+                f.write(json.dumps(self.__header) + '\n')
+
+                # 按顺序返回结果，新的清单也就是按文件名排好序的
+                items = _merge_join(self.__iter_local(tmp_file), self.__iter_remote(iterator), self.__iter_manifest())
+                for task, (action, value) in bulk._iter_concurrently(self.__reconcile, self.__iter_tasks(items),
+                                                                      self.workers, ordered=True,
+                                                                      max_in_flight=self.workers * _IN_FLIGHT_PER_WORKER):
+                    path, local, remote, base, unchanged = task
+                    for unchanged_path, entry in unchanged:
+                        _write_manifest_entry(f, unchanged_path, entry)
+
+                    if path is None:
+                        continue
+
+                    # 失败的文件保留原来的记录，下次同步时重试
+                    self.__count(path, action, value)
+                    _write_manifest_entry(f, path, base if action == _FAILED else value)
+
+            utils.force_rename(tmp_file, self.manifest)
+        except:
+            utils.silently_remove(tmp_file)
+            raise
+        finally:
+            iterator.close()
+
+        result = self.__result
+        logger.info("Sync directory done, bucket: {0}, prefix: {1}, local_dir: {2}, mode: {3}, uploaded: {4}, "
+                    "downloaded: {5}, deleted_local: {6}, deleted_remote: {7}, unchanged: {8}, failed: {9}".format(
+                        self.bucket.bucket_name, self.prefix, self.local_dir, self.mode, result.uploaded,
+                        result.downloaded, result.deleted_local, result.deleted_remote, result.unchanged,
+                        len(result.failed)))
+        return result
+
+    def __iter_tasks(self, items):
+        """返回（路径，本地文件，OSS文件，清单项，之前不需要同步的[（路径，清单项）]）。
+
+        不需要同步的文件不交给线程处理，而是附在下一个任务上；路径为None的任务只用来带出这些文件。
+        """
+        unchanged = []
+        for path, (local, remote, base) in items:
+            if remote is not None and not self.__is_valid_path(path):
+                self.__result.failed[path] = exceptions.ClientError(
+                    'object {0} can not be mapped to a local file'.format(self.prefix + path))
+                unchanged.append((path, base))
+            elif local is None and remote is None:
+                # 两边都已经删除，从清单中去掉
+                pass
+            elif (base is not None and local is not None and remote is not None and
+                  local.size == base.size and local.mtime == base.mtime and remote.etag == base.etag):
+                self.__result.unchanged += 1
+                unchanged.append((path, base))
+            else:
+                yield path, local, remote, base, unchanged
+                unchanged = []
+                continue
+
+            if len(unchanged) >= _MAX_UNCHANGED_RUN:
+                yield None, None, None, None, unchanged
+                unchanged = []
+
+        if unchanged:
+            yield None, None, None, None, unchanged
+
+    def __reconcile(self, item):
+        path, local, remote, base, unchanged = item
+        if path is None:
+            return None, None
+
+        try:
+            return self.__do_reconcile(path, local, remote, base)
+        except (exceptions.OssError, IOError, OSError) as e:
+            logger.warning("Sync file failed, path: {0}, error: {1}".format(path, e))
+            return _FAILED, e
+
+    def __do_reconcile(self, path, local, remote, base):
+        filename = self.__local_path(path)
+
+        local_crc = [None]
+
+        def get_local_crc():
+            if local_crc[0] is None:
+                local_crc[0] = _file_crc(filename)
+            return local_crc[0]
+
+        local_changed = local is not None and not (
+            base is not None and local.size == base.size and
+            (local.mtime == base.mtime or (base.crc is not None and get_local_crc() == base.crc)))
+        remote_changed = remote is not None and not (base is not None and remote.etag == base.etag)
+
+        # 只存在于一边：另一边删除了没有修改过的文件，或者这边新增、修改了文件
+        if remote is None:
+            if self.mode == SYNC_DOWNLOAD and not self.delete:
+                return _RECORD, None
+            if self.mode == SYNC_DOWNLOAD or (self.mode == SYNC_BOTH and self.delete and
+                                              base is not None and not local_changed):
+                os.remove(filename)
+                return _DELETE_LOCAL, None
+            return self.__upload(path, filename, local)
+
+        if local is None:
+            if self.mode == SYNC_UPLOAD and not self.delete:
+                return _RECORD, None
+            if self.mode == SYNC_UPLOAD or (self.mode == SYNC_BOTH and self.delete and
+                                            base is not None and not remote_changed):
+                bulk._call_with_retry(self.max_retries, self.bucket.delete_object, self.prefix + path)
+                return _DELETE_REMOTE, None
+            return self.__download(path, filename, remote)
+
+        if not local_changed and not remote_changed:
+            # 只是修改时间变了，更新清单，下次不必再计算CRC64
+            return _RECORD, _ManifestEntry(local.size, local.mtime, base.crc, base.etag)
+
+        if base is None or (local_changed and remote_changed):
+            if local.size == remote.size:
+                head = bulk._call_with_retry(self.max_retries, self.bucket.head_object, self.prefix + path)
+                if head.server_crc is not None and head.server_crc == get_local_crc():
+                    return _RECORD, _ManifestEntry(local.size, local.mtime, head.server_crc, remote.etag)
+
+            if self.mode == SYNC_UPLOAD or (self.mode == SYNC_BOTH and local.mtime > remote.last_modified):
+                return self.__upload(path, filename, local)
+            return self.__download(path, filename, remote)
+
+        if (local_changed and self.mode != SYNC_DOWNLOAD) or (remote_changed and self.mode == SYNC_UPLOAD):
+            return self.__upload(path, filename, local)
+        return self.__download(path, filename, remote)
+
+    def __upload(self, path, filename, local):
+        result = bulk._call_with_retry(self.max_retries, resumable_upload, self.bucket, self.prefix + path, filename,
+                                       multipart_threshold=self.multipart_threshold)
+        return _UPLOAD, _ManifestEntry(local.size, local.mtime, result.crc, result.etag)
+
+    def __download(self, path, filename, remote):
+        key = self.prefix + path
+        utils.makedir_p(os.path.dirname(filename))
+
+        if remote.size >= self.multiget_threshold:
+            # 各个分片都要求与这次HEAD的ETag一致，因此清单中记录的ETag和CRC64就是下载到的内容的
+            head = bulk._call_with_retry(self.max_retries, self.bucket.head_object, key)
+            downloader = _ResumableDownloader(self.bucket, key, filename, _ObjectInfo.make(head))
+            downloader.download(head.server_crc)
+            crc, etag = head.server_crc, head.etag
+        else:
+            tmp_file = filename + _gen_tmp_suffix()
+            try:
+                result = bulk._call_with_retry(self.max_retries, self.bucket.get_object_to_file, key, tmp_file)
+                utils.force_rename(tmp_file, filename)
+            except:
+                utils.silently_remove(tmp_file)
+                raise
+            crc, etag = result.server_crc, result.etag
+
+        st = os.stat(filename)
+        return _DOWNLOAD, _ManifestEntry(st.st_size, int(st.st_mtime), crc, etag)
+
+    def __count(self, path, action, value):
+        result = self.__result
+        if action == _FAILED:
+            result.failed[path] = value
+        elif action == _UPLOAD:
+            result.uploaded += 1
+        elif action == _DOWNLOAD:
+            result.downloaded += 1
+        elif action == _DELETE_LOCAL:
+            result.deleted_local += 1
+        elif action == _DELETE_REMOTE:
+            result.deleted_remote += 1
+        else:
+            result.unchanged += 1
+
+    def __iter_local(self, tmp_file):
+        # 清单放在本地目录中时，清单和正在写的新清单都不参与同步
+        excluded = (os.path.abspath(self.manifest), os.path.abspath(tmp_file))
+        for path, local in _iter_sorted_files(self.local_dir):
+            if self.__local_path(path) not in excluded:
+                yield path, local
+
+    def __iter_remote(self, iterator):
+        for page in iterator.iter_pages():
+            for i, key in enumerate(page.keys):
+                path = to_string(key)[len(self.prefix):]
+                if path and not path.endswith('/'):
+                    yield path, _RemoteFile(page.sizes[i], page.etags[i], page.last_modifieds[i])
+
+    def __iter_manifest(self):
+        if not os.path.exists(self.manifest):
+            return
+
+        with open(self.manifest, 'r') as f:
+            header = json.loads(f.readline() or '{}')
+            if header != self.__header:
+                logger.warning("Manifest {0} does not match, ignore it. Expected: {1}, actual: {2}".format(
+                    self.manifest, self.__header, header))
+                return
+
+            for line in f:
+                path, size, mtime, crc, etag = json.loads(line)
+                yield to_string(path), _ManifestEntry(size, mtime, crc, etag)
+
+    def __local_path(self, path):
+        return os.path.join(self.local_dir, *path.split('/'))
+
+    def __is_valid_path(self, path):
+        names = path.split('/')
+        return '' not in names and '.' not in names and '..' not in names
@@ -15,7 +15,7 @@ import traceback
 
 
 class TaskQueue(object):
-    def __init__(self, producer, consumers):
+    def __init__(self, producer, consumers, maxsize=0):
         self.__producer = producer
         self.__consumers = consumers
 
@@ -24,6 +24,11 @@ class TaskQueue(object):
         # must be an infinite queue, otherwise producer may be blocked after all consumers being dead.
         self.__queue = queue.Queue()
 
+        # if maxsize > 0, put() blocks while maxsize items are waiting, but gives up once any thread failed.
+        self.__maxsize = maxsize
+        self.__pending = 0
+        self.__not_full = threading.Condition(threading.Lock())
+
         self.__lock = threading.Lock()
         self.__exc_info = None
         self.__exc_stack = ''
@@ -45,10 +50,27 @@ class TaskQueue(object):
 
     def put(self, data):
         assert data is not None
+
+        if self.__maxsize > 0:
+            with self.__not_full:
+                while self.__pending >= self.__maxsize:
+                    if not self.ok():
+                        raise RuntimeError('TaskQueue is aborted because of previous errors')
+                    self.__not_full.wait(1)
+
+                self.__pending += 1
+
         self.__queue.put(data)
 
     def get(self):
-        return self.__queue.get()
+        data = self.__queue.get()
+
+        if data is not None and self.__maxsize > 0:
+            with self.__not_full:
+                self.__pending -= 1
+                self.__not_full.notify()
+
+        return data
 
     def ok(self):
         with self.__lock:
@@ -0,0 +1,627 @@
+# -*- coding: utf-8 -*-
+
+"""
+oss2.transfer
+~~~~~~~~~~~~~
+
+本地目录与OSS之间的批量传输。
+"""
+
+import collections
+import functools
+import logging
+import os
+import random
+import shutil
+import string
+import threading
+import time
+
+from . import bulk
+from . import defaults
+from . import exceptions
+from . import utils
+from .api import Bucket, CryptoBucket
+from .compat import to_string
+from .headers import IF_MATCH
+from .iterators import ObjectIterator
+from .models import PartInfo
+from .resumable import (determine_part_size, resumable_upload,
+                        _align_crypto_part_size, _determine_part_size_internal, _MAX_MULTIGET_PART_COUNT)
+
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class TransferResult(object):
+    """批量传输的结果。
+
+    :param int files: 成功传输的文件数
+    :param int bytes: 成功传输的字节数
+    :param int skipped: 因为已经是最新而跳过的文件数
+    :param dict failed: 传输失败的文件，本地路径或OSS文件名 -> 异常
+    """
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.failed = {}
+
+
+def upload_directory(bucket, local_dir, prefix='', workers=None,
+                     multipart_threshold=None, part_size=None,
+                     headers=None, progress_callback=None):
+    """把本地目录 `local_dir` 下的所有文件上传到 `prefix` 下，文件名为 `prefix` 加上相对路径（以'/'分隔）。
+
+    所有上传共用 `workers` 个线程。小文件各自调用一次 :func:`put_object <oss2.Bucket.put_object>` ；
+    不小于 `multipart_threshold` 的文件用分片上传，它的各个分片也作为独立的任务交给这些线程，按从大到小的顺序
+    优先上传，避免最后只剩下一个大文件在上传。
+
+    目录遍历两遍，都是逐层进行的，不会把所有文件名保存在内存中：第一遍只记录大文件和总长度，第二遍上传小文件。
+    Content-Type按扩展名只推断一次。
+
+    单个文件失败不影响其他文件，失败的文件及其异常记录在返回结果的 `failed` 中。
+
+    用法 ::
+
+        >>> result = oss2.transfer.upload_directory(bucket, '/data/photos', 'photos/', workers=16)
+        >>> print(result.files, result.bytes, result.failed)
+
+    :param bucket: :class:`Bucket <oss2.Bucket>` 或者 :class:`CryptoBucket <oss2.CryptoBucket>` 对象。
+        对于CryptoBucket，大文件整个作为一个任务，用 :func:`resumable_upload <oss2.resumable_upload>` 上传
+    :param local_dir: 本地目录
+    :param prefix: OSS文件名前缀
+    :param workers: 线程数，缺省为 `oss2.defaults.batch_num_threads`
+    :param multipart_threshold: 文件长度不小于该值时用分片上传，缺省为 `oss2.defaults.multipart_threshold`
+    :param part_size: 分片大小，如不指定则自动计算
+    :param headers: 每个文件上传时都带上的HTTP头部
+    :param progress_callback: 进度回调函数，参数为已上传的字节数和总字节数。参见 :ref:`progress_callback`
+
+    :return: :class:`TransferResult`
+    """
+    return _DirectoryUploader(bucket, local_dir, prefix, workers=workers,
+                              multipart_threshold=multipart_threshold, part_size=part_size,
+                              headers=headers, progress_callback=progress_callback).upload()
+
+
+def download_prefix(bucket, prefix, local_dir, workers=None,
+                    multiget_threshold=None, part_size=None,
+                    progress_callback=None):
+    """把 `prefix` 下的所有文件下载到本地目录 `local_dir` ，本地文件名为 `local_dir` 加上去掉 `prefix` 后的文件名。
+
+    边列举边下载，所有下载共用 `workers` 个线程。不小于 `multiget_threshold` 的文件分成多个范围下载，
+    每个范围作为独立的任务交给这些线程，写入临时文件，全部完成并校验CRC64后再改名为目标文件。
+    每个本地目录只创建一次。
+
+    下载完成的文件，本地修改时间设置为OSS文件的最后修改时间。下次下载时，本地文件长度和修改时间都与OSS文件
+    一致的直接跳过；长度相同但修改时间不同的，如果本地文件的CRC64与OSS文件一致也跳过。
+
+    以'/'结尾的文件（目录）不下载；包含'.'或'..'的文件名会使目标路径超出 `local_dir` ，作为失败处理。
+    单个文件失败不影响其他文件，失败的OSS文件名及其异常记录在返回结果的 `failed` 中。
+
+    用法 ::
+
+        >>> result = oss2.transfer.download_prefix(bucket, 'photos/', '/data/photos', workers=16)
+        >>> print(result.files, result.skipped, result.failed)
+
+    :param bucket: :class:`Bucket <oss2.Bucket>` 或者 :class:`CryptoBucket <oss2.CryptoBucket>` 对象。
+        对于CryptoBucket，不做CRC64比较，分片大小会向上取整为16的倍数
+    :param prefix: OSS文件名前缀
+    :param local_dir: 本地目录
+    :param workers: 线程数，缺省为 `oss2.defaults.batch_num_threads`
+    :param multiget_threshold: 文件长度不小于该值时分范围下载，缺省为 `oss2.defaults.multiget_threshold`
+    :param part_size: 每个范围的大小，缺省为 `oss2.defaults.multiget_part_size`
+    :param progress_callback: 进度回调函数，参数为已下载的字节数和None。参见 :ref:`progress_callback`
+
+    :return: :class:`TransferResult`
+    """
+    return _PrefixDownloader(bucket, prefix, local_dir, workers=workers,
+                             multiget_threshold=multiget_threshold, part_size=part_size,
+                             progress_callback=progress_callback).download()
+
+
+def _file_crc(path):
+    crc = utils.Crc64()
+    with open(path, 'rb') as f:
+        while True:
+            content = f.read(utils._CHUNK_SIZE * 8)
+            if not content:
+                return crc.crc
+            crc(content)
+
+
+def _gen_tmp_suffix():
+    return '.tmp-' + ''.join(random.choice(string.ascii_lowercase) for i in range(12))
+
+
+def _iter_files(root, onerror=None):
+    """逐层遍历 `root` 下的所有文件（不进入指向目录的符号链接），返回（路径，相对路径，长度）。
+
+    无法列举的目录会被跳过，如果指定了 `onerror` ，则调用 `onerror(目录, 异常)` 。
+    """
+    dirs = ['']
+    while dirs:
+        rel_dir = dirs.pop()
+        path = os.path.join(root, rel_dir)
+
+        try:
+            entries = _list_dir(path)
+        except (IOError, OSError) as e:
+            if onerror is not None:
+                onerror(path, e)
+            continue
+
+        for name, is_dir, st in entries:
+            rel_path = os.path.join(rel_dir, name) if rel_dir else name
+            if is_dir:
+                dirs.append(rel_path)
+            else:
+                yield os.path.join(root, rel_path), rel_path, st.st_size
+
+
+def _list_dir(path):
+    """返回列举 `path` 的迭代器，每次返回（名称，是否为目录，文件的os.stat结果）。目录不存在或者无法读取时直接抛出异常。"""
+    if _scandir is not None:
+        return _iter_dir_entries(_scandir(path))
+    else:
+        return _iter_dir_names(path, os.listdir(path))
+
+
+def _iter_dir_entries(entries):
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield entry.name, True, None
+        elif entry.is_file():
+            yield entry.name, False, entry.stat()
+
+
+def _iter_dir_names(path, names):
+    for name in names:
+        full_path = os.path.join(path, name)
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            yield name, True, None
+        elif os.path.isfile(full_path):
+            yield name, False, os.stat(full_path)
+
+
+class _LargeFile(object):
+    def __init__(self, path, key, size):
+        self.path = path
+        self.key = key
+        self.size = size
+        self.upload_id = None
+        self.parts = []
+        self.remaining = 0
+        self.error = None
+
+
+class _DirectoryUploader(object):
+    def __init__(self, bucket, local_dir, prefix, workers=None,
+                 multipart_threshold=None, part_size=None,
+                 headers=None, progress_callback=None):
+        self.bucket = bucket
+        self.local_dir = local_dir
+        self.prefix = to_string(prefix)
+        self.workers = max(defaults.get(workers, defaults.batch_num_threads), 1)
+        self.multipart_threshold = defaults.get(multipart_threshold, defaults.multipart_threshold)
+        self.part_size = part_size
+        self.headers = headers
+        self.max_retries = max(defaults.request_retries, 1)
+
+        self.__progress_callback = progress_callback
+        self.__lock = threading.Lock()
+        self.__content_types = {}
+        self.__total_bytes = 0
+        self.__uploaded_bytes = 0
+        self.__result = TransferResult()
+
+    def upload(self):
+        start = time.time()
+
+        large_files = []
+        for path, rel_path, size in _iter_files(self.local_dir, onerror=self.__fail):
+            self.__total_bytes += size
+            if size > 0 and size >= self.multipart_threshold:
+                large_files.append(_LargeFile(path, self.__make_key(rel_path), size))
+
+        large_files.sort(key=lambda f: f.size, reverse=True)
+        large_paths = set(f.path for f in large_files)
+
+        for task, _ in bulk._iter_concurrently(lambda task: task(), self.__iter_tasks(large_files, large_paths),
+                                               self.workers):
+            pass
+
+        result = self.__result
+        elapsed = time.time() - start
+        logger.info("Upload directory done, bucket: {0}, local_dir: {1}, prefix: {2}, files: {3}, bytes: {4}, "
+                    "failed: {5}, elapsed: {6:.1f}s".format(self.bucket.bucket_name, self.local_dir, self.prefix,
+                                                             result.files, result.bytes, len(result.failed), elapsed))
+        return result
+
+    def __iter_tasks(self, large_files, large_paths):
+        for f in large_files:
+            if not isinstance(self.bucket, Bucket):
+                yield functools.partial(self.__upload_large_file, f)
+                continue
+
+            try:
+                f.upload_id = bulk._call_with_retry(self.max_retries, self.bucket.init_multipart_upload, f.key,
+                                                    headers=self.__make_headers(f.key)).upload_id
+            except exceptions.OssError as e:
+                self.__fail(f.path, e)
+                continue
+
+            part_size = determine_part_size(f.size, preferred_size=self.part_size)
+            offsets = range(0, f.size, part_size)
+            f.remaining = len(offsets)
+
+            for i, offset in enumerate(offsets):
+                yield functools.partial(self.__upload_part, f, i + 1, offset, min(part_size, f.size - offset))
+
+        for path, rel_path, size in _iter_files(self.local_dir, onerror=self.__fail):
+            if path not in large_paths:
+                yield functools.partial(self.__put_file, path, self.__make_key(rel_path), size)
+
+    def __put_file(self, path, key, size):
+        def put():
+            with open(path, 'rb') as f:
+                return self.bucket.put_object(key, f, headers=self.__make_headers(key))
+
+        try:
+            bulk._call_with_retry(self.max_retries, put)
+        except (exceptions.OssError, IOError, OSError) as e:
+            self.__fail(path, e)
+            return
+
+        self.__report_progress(size)
+        self.__succeed(size)
+
+    def __upload_large_file(self, f):
+        try:
+            resumable_upload(self.bucket, f.key, f.path, headers=self.__make_headers(f.key),
+                             multipart_threshold=self.multipart_threshold, part_size=self.part_size)
+        except (exceptions.OssError, IOError, OSError) as e:
+            self.__fail(f.path, e)
+            return
+
+        self.__report_progress(f.size)
+        self.__succeed(f.size)
+
+    def __upload_part(self, f, part_number, offset, size):
+        def upload():
+            with open(f.path, 'rb') as fileobj:
+                fileobj.seek(offset, os.SEEK_SET)
+                return self.bucket.upload_part(f.key, f.upload_id, part_number,
+                                               utils.SizedFileAdapter(fileobj, size))
+
+        if f.error is None:
+            try:
+                result = bulk._call_with_retry(self.max_retries, upload)
+            except (exceptions.OssError, IOError, OSError) as e:
+                f.error = e
+            else:
+                with self.__lock:
+                    f.parts.append(PartInfo(part_number, result.etag, size=size, part_crc=result.crc))
+                self.__report_progress(size)
+
+        with self.__lock:
+            f.remaining -= 1
+            if f.remaining > 0:
+                return
+
+        # 最后一个结束的分片负责完成或者取消分片上传
+        if f.error is None:
+            try:
+                self.__complete(f)
+            except exceptions.OssError as e:
+                f.error = e
+
+        if f.error is not None:
+            self.__fail(f.path, f.error)
+            try:
+                self.bucket.abort_multipart_upload(f.key, f.upload_id)
+            except exceptions.OssError as e:
+                logger.warning("Abort multipart upload failed, key: {0}, upload_id: {1}, error: {2}".format(
+                    to_string(f.key), f.upload_id, e))
+            return
+
+        self.__succeed(f.size)
+
+    def __complete(self, f):
+        parts = sorted(f.parts, key=lambda p: p.part_number)
+        result = bulk._call_with_retry(self.max_retries, self.bucket.complete_multipart_upload,
+                                       f.key, f.upload_id, parts)
+
+        if self.bucket.enable_crc:
+            object_crc = utils.calc_obj_crc_from_parts(parts)
+            utils.check_crc('upload directory', object_crc, result.crc, result.request_id)
+
+    def __make_key(self, rel_path):
+        return self.prefix + to_string(rel_path).replace(os.sep, '/')
+
+    def __make_headers(self, key):
+        ext = os.path.splitext(key)[1].lower()
+        if ext not in self.__content_types:
+            self.__content_types[ext] = utils.content_type_by_name(key)
+
+        headers = dict(self.headers or {})
+        if self.__content_types[ext] and 'Content-Type' not in headers:
+            headers['Content-Type'] = self.__content_types[ext]
+
+        return headers
+
+    def __report_progress(self, size):
+        with self.__lock:
+            self.__uploaded_bytes += size
+            utils._invoke_progress_callback(self.__progress_callback, self.__uploaded_bytes, self.__total_bytes)
+
+    def __succeed(self, size):
+        with self.__lock:
+            self.__result.files += 1
+            self.__result.bytes += size
+
+    def __fail(self, path, e):
+        logger.warning("Upload file failed, file: {0}, error: {1}".format(to_string(path), e))
+        with self.__lock:
+            self.__result.failed[path] = e
+
+
+class _RemoteObject(object):
+    def __init__(self, key, path, size, etag, last_modified):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+
+        # 分范围下载时使用
+        self.tmp_file = None
+        self.parts = []
+        self.remaining = 0
+        self.error = None
+        self.server_crc = None
+
+
+class _PrefixDownloader(object):
+    def __init__(self, bucket, prefix, local_dir, workers=None,
+                 multiget_threshold=None, part_size=None,
+                 progress_callback=None):
+        self.bucket = bucket
+        self.prefix = to_string(prefix)
+        self.local_dir = local_dir
+        self.workers = max(defaults.get(workers, defaults.batch_num_threads), 1)
+        self.multiget_threshold = defaults.get(multiget_threshold, defaults.multiget_threshold)
+        self.part_size = defaults.get(part_size, defaults.multiget_part_size)
+        self.max_retries = max(defaults.request_retries, 1)
+
+        # CryptoBucket不支持列举；本地文件是明文，无法与密文的CRC64比较
+        self.is_crypto = isinstance(bucket, CryptoBucket)
+        self.list_bucket = bucket.bucket if self.is_crypto else bucket
+
+        self.__progress_callback = progress_callback
+        self.__lock = threading.Lock()
+        self.__dirs = set()
+        self.__downloaded_bytes = 0
+        self.__result = TransferResult()
+
+        # CRC64不一致、需要重新分范围下载的大文件
+        self.__redownloads = collections.deque()
+
+    def download(self):
+        start = time.time()
+
+        iterator = ObjectIterator(self.list_bucket, prefix=self.prefix, max_keys=1000, prefetch=1)
+        try:
+            self.__run(self.__iter_tasks(iterator))
+        finally:
+            iterator.close()
+
+        # 列举完成后才发现需要重新下载的文件
+        self.__run(self.__iter_redownload_tasks())
+
+        result = self.__result
+        elapsed = time.time() - start
+        logger.info("Download prefix done, bucket: {0}, prefix: {1}, local_dir: {2}, files: {3}, bytes: {4}, "
+                    "skipped: {5}, failed: {6}, elapsed: {7:.1f}s".format(
+                        self.bucket.bucket_name, self.prefix, self.local_dir, result.files, result.bytes,
+                        result.skipped, len(result.failed), elapsed))
+        return result
+
+    def __run(self, tasks):
+        for task, _ in bulk._iter_concurrently(lambda task: task(), tasks, self.workers):
+            pass
+
+    def __iter_tasks(self, iterator):
+        for page in iterator.iter_pages():
+            for i, key in enumerate(page.keys):
+                for task in self.__iter_redownload_tasks():
+                    yield task
+
+                if key.endswith('/'):
+                    continue
+
+                path = self.__make_path(key)
+                if path is None:
+                    self.__fail(key, exceptions.ClientError('object {0} is outside local_dir'.format(key)))
+                    continue
+
+                obj = _RemoteObject(key, path, page.sizes[i], page.etags[i], page.last_modifieds[i])
+
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    st = None
+
+                if st is not None and st.st_size == obj.size:
+                    if int(st.st_mtime) == obj.last_modified:
+                        self.__skip()
+                        continue
+
+                    if self.bucket.enable_crc and not self.is_crypto:
+                        yield functools.partial(self.__check_and_get_file, obj)
+                        continue
+
+                try:
+                    self.__make_dir(os.path.dirname(path))
+                except (IOError, OSError) as e:
+                    self.__fail(key, e)
+                    continue
+
+                if obj.size == 0 or obj.size < self.multiget_threshold:
+                    yield functools.partial(self.__get_file, obj)
+                    continue
+
+                for task in self.__iter_part_tasks(obj):
+                    yield task
+
+    def __iter_part_tasks(self, obj):
+        part_size = _determine_part_size_internal(obj.size, self.part_size, _MAX_MULTIGET_PART_COUNT)
+        if self.is_crypto:
+            part_size = _align_crypto_part_size(part_size)
+
+        obj.tmp_file = obj.path + _gen_tmp_suffix()
+        try:
+            with open(obj.tmp_file, 'wb') as f:
+                f.truncate(obj.size)
+        except (IOError, OSError) as e:
+            self.__fail(obj.key, e)
+            return
+
+        offsets = range(0, obj.size, part_size)
+        obj.remaining = len(offsets)
+
+        for i, offset in enumerate(offsets):
+            yield functools.partial(self.__get_part, obj, i + 1, offset, min(offset + part_size, obj.size))
+
+    def __iter_redownload_tasks(self):
+        while True:
+            with self.__lock:
+                if not self.__redownloads:
+                    return
+                obj = self.__redownloads.popleft()
+
+            for task in self.__iter_part_tasks(obj):
+                yield task
+
+    def __check_and_get_file(self, obj):
+        try:
+            server_crc = bulk._call_with_retry(self.max_retries, self.bucket.head_object, obj.key).server_crc
+            if server_crc is not None and server_crc == _file_crc(obj.path):
+                os.utime(obj.path, (obj.last_modified, obj.last_modified))
+                self.__skip()
+                return
+        except (exceptions.OssError, IOError, OSError) as e:
+            self.__fail(obj.key, e)
+            return
+
+        # 大文件和普通下载一样分范围并发下载，范围任务交给下载线程池
+        if obj.size > 0 and obj.size >= self.multiget_threshold:
+            with self.__lock:
+                self.__redownloads.append(obj)
+            return
+
+        self.__get_file(obj)
+
+    def __get_file(self, obj):
+        tmp_file = obj.path + _gen_tmp_suffix()
+
+        try:
+            bulk._call_with_retry(self.max_retries, self.bucket.get_object_to_file, obj.key, tmp_file)
+            utils.force_rename(tmp_file, obj.path)
+
+            # 即使下载到的是列举之后更新的版本，下次列举时修改时间不一致，也会通过CRC64比较得到正确结果
+            os.utime(obj.path, (obj.last_modified, obj.last_modified))
+        except (exceptions.OssError, IOError, OSError) as e:
+            utils.silently_remove(tmp_file)
+            self.__fail(obj.key, e)
+            return
+
+        self.__report_progress(obj.size)
+        self.__succeed(obj.size)
+
+    def __get_part(self, obj, part_number, start, end):
+        def get():
+            result = self.bucket.get_object(obj.key, byte_range=(start, end - 1), headers={IF_MATCH: obj.etag})
+            with open(obj.tmp_file, 'rb+') as f:
+                f.seek(start, os.SEEK_SET)
+                shutil.copyfileobj(result, f)
+                n = f.tell() - start
+
+            if n != end - start:
+                raise exceptions.InconsistentError('IncompleteRead from source, expected: {0}, actual: {1}'.format(
+                    end - start, n), result.request_id)
+            return result
+
+        if obj.error is None:
+            try:
+                result = bulk._call_with_retry(self.max_retries, get)
+            except (exceptions.OssError, IOError, OSError) as e:
+                obj.error = e
+            else:
+                with self.__lock:
+                    obj.parts.append(PartInfo(part_number, None, size=end - start, part_crc=result.client_crc))
+                    obj.server_crc = result.server_crc
+                self.__report_progress(end - start)
+
+        with self.__lock:
+            obj.remaining -= 1
+            if obj.remaining > 0:
+                return
+
+        # 最后一个结束的范围负责校验并改名
+        if obj.error is None:
+            try:
+                if self.bucket.enable_crc:
+                    parts = sorted(obj.parts, key=lambda p: p.part_number)
+                    utils.check_crc('download prefix', utils.calc_obj_crc_from_parts(parts), obj.server_crc, None)
+
+                utils.force_rename(obj.tmp_file, obj.path)
+                os.utime(obj.path, (obj.last_modified, obj.last_modified))
+            except (exceptions.OssError, IOError, OSError) as e:
+                obj.error = e
+
+        if obj.error is not None:
+            utils.silently_remove(obj.tmp_file)
+            self.__fail(obj.key, obj.error)
+            return
+
+        self.__succeed(obj.size)
+
+    def __make_path(self, key):
+        names = [name for name in to_string(key)[len(self.prefix):].split('/') if name]
+        if not names or '.' in names or '..' in names:
+            return None
+
+        return os.path.join(self.local_dir, *names)
+
+    def __make_dir(self, dirname):
+        if dirname not in self.__dirs:
+            utils.makedir_p(dirname)
+            self.__dirs.add(dirname)
+
+    def __report_progress(self, size):
+        with self.__lock:
+            self.__downloaded_bytes += size
+            utils._invoke_progress_callback(self.__progress_callback, self.__downloaded_bytes, None)
+
+    def __succeed(self, size):
+        with self.__lock:
+            self.__result.files += 1
+            self.__result.bytes += size
+
+    def __skip(self):
+        with self.__lock:
+            self.__result.skipped += 1
+
+    def __fail(self, key, e):
+        logger.warning("Download object failed, key: {0}, error: {1}".format(to_string(key), e))
+        with self.__lock:
+            self.__result.failed[key] = e
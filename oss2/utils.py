@@ -27,10 +27,6 @@ import re
 import sys
 import random
 
-from Crypto.Cipher import AES
-from Crypto import Random
-from Crypto.Util import Counter
-
 from .crc64_combine import mkCombineFun
 from .compat import to_string, to_bytes
 from .exceptions import ClientError, InconsistentError, RequestError, OpenApiFormatError
@@ -524,6 +520,7 @@ class Crc32(object):
         return self.crc32.crcValue
 
 def random_aes256_key():
+    from Crypto import Random
     return Random.new().read(_AES_256_KEY_SIZE)
 
 
@@ -567,60 +564,10 @@ class AESCipher:
             self.start = random_counter()
         else:
             self.start = int(start)
-        ctr = Counter.new(_AES_CTR_COUNTER_BITS_LEN, initial_value=self.start)
-        self.__cipher = AES.new(self.key, AES.MODE_CTR, counter=ctr)
-
-    def encrypt(self, raw):
-        return self.__cipher.encrypt(raw)
-
-    def decrypt(self, enc):
-        return self.__cipher.decrypt(enc)
-
-
-def random_aes256_key():
-    return Random.new().read(_AES_256_KEY_SIZE)
-
-
-def random_counter(begin=1, end=10):
-    return random.randint(begin, end)
-
-
-# aes 256, key always is 32 bytes
-_AES_256_KEY_SIZE = 32
-
-_AES_CTR_COUNTER_BITS_LEN = 8 * 16
-
-_AES_GCM = 'AES/GCM/NoPadding'
-
-
-class AESCipher:
-    """AES256 加密实现。
-        :param str key: 对称加密数据密钥
-        :param str start: 对称加密初始随机值
-    .. note::
-        用户可自行实现对称加密算法，需服务如下规则：
-        1、提供对称加密算法名，ALGORITHM
-        2、提供静态方法，返回加密密钥和初始随机值（若算法不需要初始随机值，也需要提供）
-        3、提供加密解密方法
-    """
-    ALGORITHM = _AES_GCM
-
-    @staticmethod
-    def get_key():
-        return random_aes256_key()
+        # 只有用到客户端加密时才加载Crypto，减少import oss2的时间
+        from Crypto.Cipher import AES
+        from Crypto.Util import Counter
 
-    @staticmethod
-    def get_start():
-        return random_counter()
-
-    def __init__(self, key=None, start=None):
-        self.key = key
-        if not self.key:
-            self.key = random_aes256_key()
-        if not start:
-            self.start = random_counter()
-        else:
-            self.start = int(start)
         ctr = Counter.new(_AES_CTR_COUNTER_BITS_LEN, initial_value=self.start)
         self.__cipher = AES.new(self.key, AES.MODE_CTR, counter=ctr)
 
@@ -696,9 +643,55 @@ def http_to_unixtime(time_string):
     return calendar.timegm(tm)
 
 
+def _days_from_civil(year, month, day):
+    """返回公历日期距1970-01-01的天数。"""
+    if month <= 2:
+        year -= 1
+
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+
+    return era * 146097 + doe - 719468
+
+
+def _fixed_iso8601_to_unixtime(time_string):
+    """按固定位置解析形如 `2012-02-24T06:07:48.000Z` 的时间字符串；格式不完全匹配时返回None。"""
+    if (len(time_string) != 24 or time_string[19:] != '.000Z' or
+            time_string[4] != '-' or time_string[7] != '-' or time_string[10] != 'T' or
+            time_string[13] != ':' or time_string[16] != ':'):
+        return None
+
+    digits = (time_string[0:4] + time_string[5:7] + time_string[8:10] +
+              time_string[11:13] + time_string[14:16] + time_string[17:19])
+    if not digits.isdigit():
+        return None
+
+    year = int(digits[0:4])
+    month = int(digits[4:6])
+    day = int(digits[6:8])
+    hour = int(digits[8:10])
+    minute = int(digits[10:12])
+    second = int(digits[12:14])
+
+    if not (1 <= month <= 12 and 1 <= day and hour <= 23 and minute <= 59 and second <= 59):
+        return None
+
+    if day > 28 and day > calendar.monthrange(year, month)[1]:
+        return None
+
+    return _days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second
+
+
 def iso8601_to_unixtime(time_string):
     """把ISO8601时间字符串（形如，2012-02-24T06:07:48.000Z）转换为UNIX时间，精确到秒。"""
 
+    # 列举结果中的每个条目都有一个时间戳，这里先尝试按固定格式快速解析
+    t = _fixed_iso8601_to_unixtime(time_string)
+    if t is not None:
+        return t
+
     m = _ISO8601_RE.match(time_string)
 
     if not m:
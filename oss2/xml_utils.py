@@ -11,10 +11,12 @@ XML处理相关。
     - to_开头的函数：用来生成发往服务器端的XML
 
 """
+import io
 import logging
 import xml.etree.ElementTree as ElementTree
 
 from .models import (SimplifiedObjectInfo,
+                     ListObjectsPageResult,
                      SimplifiedBucketInfo,
                      PartInfo,
                      MultipartUploadInfo,
@@ -31,7 +33,7 @@ from .models import (SimplifiedObjectInfo,
                      AbortMultipartUpload,
                      StorageTransition)
 
-from .compat import urlunquote, to_unicode, to_string
+from .compat import urlunquote, to_unicode, to_string, to_bytes
 from .utils import iso8601_to_unixtime, date_to_iso8601, iso8601_to_date
 from . import utils
 import base64
@@ -98,25 +100,131 @@ def _add_text_child(parent, tag, text):
 def _add_node_child(parent, tag):
     return ElementTree.SubElement(parent, tag)
 
-def parse_list_objects(result, body):
-    root = ElementTree.fromstring(body)
-    url_encoded = _is_url_encoding(root)
-    result.is_truncated = _find_bool(root, 'IsTruncated')
+def _iterparse(body, tags):
+    """流式解析XML，依次返回标签名属于 `tags` 的节点。
+
+    `body` 可以是bytes，也可以是支持read的file-like object（如HTTP响应），后者会边读取边解析。
+    节点在其结束标签被解析后返回，下一次迭代时根节点的所有子节点即被清空，因此内存占用和节点的个数无关。
+    调用者需要保证 `tags` 中的标签名只出现在根节点之下的第一层。
+    """
+    if not hasattr(body, 'read'):
+        body = io.BytesIO(to_bytes(body))
+
+    root = None
+    for event, node in ElementTree.iterparse(body, events=('start', 'end')):
+        if root is None:
+            root = node
+        elif event == 'end' and node.tag in tags:
+            yield node
+            # 只清空节点本身的话，空节点依然挂在根节点下，因此清空整个根节点
+            root.clear()
+
+
+def _child_texts(node):
+    texts = {}
+    for child in node:
+        texts[child.tag] = child.text
+
+    return texts
+
+
+def _get_text(texts, tag, parent_tag):
+    try:
+        text = texts[tag]
+    except KeyError:
+        raise RuntimeError("parse xml: " + tag + " could not be found under " + parent_tag)
+
+    if text is None:
+        return ''
+
+    return to_string(text)
+
+
+def _node_text(node):
+    if node.text is None:
+        return ''
+
+    return to_string(node.text)
+
+
+def _to_bool(text, tag, parent_tag):
+    if text == 'true':
+        return True
+    elif text == 'false':
+        return False
+    else:
+        raise RuntimeError("parse xml: value of " + tag + " is not a boolean under " + parent_tag)
+
+
+def _check_found(value, tag, parent_tag):
+    if value is None:
+        raise RuntimeError("parse xml: " + tag + " could not be found under " + parent_tag)
+
+    return value
+
+
+_LIST_OBJECTS_TAGS = frozenset(['Contents', 'CommonPrefixes', 'IsTruncated', 'NextMarker', 'EncodingType'])
+
+
+def parse_list_objects_page(result, body):
+    parent_tag = 'ListBucketResult'
+    url_encoded = False
+    is_truncated = None
+    next_marker = None
+
+    page = result.page
+    keys, prefixes = page.keys, page.prefixes
+
+    # Type和StorageClass的取值很少，复用同一个字符串对象以节省内存
+    interned = {}
+
+    for node in _iterparse(body, _LIST_OBJECTS_TAGS):
+        tag = node.tag
+
+        if tag == 'Contents':
+            texts = _child_texts(node)
+            key = _get_text(texts, 'Key', tag)
+            obj_type = _get_text(texts, 'Type', tag)
+            storage_class = _get_text(texts, 'StorageClass', tag)
+            page.add_object(urlunquote(key) if url_encoded else key,
+                            iso8601_to_unixtime(_get_text(texts, 'LastModified', tag)),
+                            _get_text(texts, 'ETag', tag).strip('"'),
+                            interned.setdefault(obj_type, obj_type),
+                            int(_get_text(texts, 'Size', tag)),
+                            interned.setdefault(storage_class, storage_class))
+        elif tag == 'CommonPrefixes':
+            prefix = _get_text(_child_texts(node), 'Prefix', tag)
+            prefixes.append(urlunquote(prefix) if url_encoded else prefix)
+        elif tag == 'IsTruncated':
+            is_truncated = _to_bool(_node_text(node), tag, parent_tag)
+        elif tag == 'NextMarker':
+            next_marker = _node_text(node)
+        elif tag == 'EncodingType' and _node_text(node) == 'url' and not url_encoded:
+            url_encoded = True
+
+            # EncodingType出现在部分条目之后，对已经解析的条目补做解码
+            keys[:] = [urlunquote(key) for key in keys]
+            prefixes[:] = [urlunquote(prefix) for prefix in prefixes]
+
+    result.is_truncated = _check_found(is_truncated, 'IsTruncated', parent_tag)
     if result.is_truncated:
-        result.next_marker = _find_object(root, 'NextMarker', url_encoded)
-
-    for contents_node in root.findall('Contents'):
-        result.object_list.append(SimplifiedObjectInfo(
-            _find_object(contents_node, 'Key', url_encoded),
-            iso8601_to_unixtime(_find_tag(contents_node, 'LastModified')),
-            _find_tag(contents_node, 'ETag').strip('"'),
-            _find_tag(contents_node, 'Type'),
-            int(_find_tag(contents_node, 'Size')),
-            _find_tag(contents_node, 'StorageClass')
-        ))
+        next_marker = _check_found(next_marker, 'NextMarker', parent_tag)
+        result.next_marker = urlunquote(next_marker) if url_encoded else next_marker
+
+    return result
+
+
+def parse_list_objects(result, body):
+    page_result = parse_list_objects_page(ListObjectsPageResult(result.resp), body)
+    page = page_result.page
+
+    result.is_truncated = page_result.is_truncated
+    result.next_marker = page_result.next_marker
 
-    for prefix_node in root.findall('CommonPrefixes'):
-        result.prefix_list.append(_find_object(prefix_node, 'Prefix', url_encoded))
+    for i in range(len(page.keys)):
+        result.object_list.append(SimplifiedObjectInfo(page.keys[i], page.last_modifieds[i], page.etags[i],
+                                                       page.types[i], page.sizes[i], page.storage_classes[i]))
+    result.prefix_list = page.prefixes
 
     return result
 
@@ -152,40 +260,79 @@ def parse_init_multipart_upload(result, body):
     return result
 
 
-def parse_list_multipart_uploads(result, body):
-    root = ElementTree.fromstring(body)
+_LIST_MULTIPART_UPLOADS_TAGS = frozenset(['Upload', 'CommonPrefixes', 'IsTruncated', 'NextKeyMarker',
+                                          'NextUploadIdMarker', 'EncodingType'])
 
-    url_encoded = _is_url_encoding(root)
 
-    result.is_truncated = _find_bool(root, 'IsTruncated')
-    result.next_key_marker = _find_object(root, 'NextKeyMarker', url_encoded)
-    result.next_upload_id_marker = _find_tag(root, 'NextUploadIdMarker')
-
-    for upload_node in root.findall('Upload'):
-        result.upload_list.append(MultipartUploadInfo(
-            _find_object(upload_node, 'Key', url_encoded),
-            _find_tag(upload_node, 'UploadId'),
-            iso8601_to_unixtime(_find_tag(upload_node, 'Initiated'))
-        ))
-
-    for prefix_node in root.findall('CommonPrefixes'):
-        result.prefix_list.append(_find_object(prefix_node, 'Prefix', url_encoded))
+def parse_list_multipart_uploads(result, body):
+    parent_tag = 'ListMultipartUploadsResult'
+    url_encoded = False
+    is_truncated = None
+    next_key_marker = None
+    next_upload_id_marker = None
+
+    for node in _iterparse(body, _LIST_MULTIPART_UPLOADS_TAGS):
+        tag = node.tag
+
+        if tag == 'Upload':
+            texts = _child_texts(node)
+            key = _get_text(texts, 'Key', tag)
+            result.upload_list.append(MultipartUploadInfo(
+                urlunquote(key) if url_encoded else key,
+                _get_text(texts, 'UploadId', tag),
+                iso8601_to_unixtime(_get_text(texts, 'Initiated', tag))
+            ))
+        elif tag == 'CommonPrefixes':
+            prefix = _get_text(_child_texts(node), 'Prefix', tag)
+            result.prefix_list.append(urlunquote(prefix) if url_encoded else prefix)
+        elif tag == 'IsTruncated':
+            is_truncated = _to_bool(_node_text(node), tag, parent_tag)
+        elif tag == 'NextKeyMarker':
+            next_key_marker = _node_text(node)
+        elif tag == 'NextUploadIdMarker':
+            next_upload_id_marker = _node_text(node)
+        elif tag == 'EncodingType' and _node_text(node) == 'url' and not url_encoded:
+            url_encoded = True
+
+            for upload in result.upload_list:
+                upload.key = urlunquote(upload.key)
+            result.prefix_list = [urlunquote(prefix) for prefix in result.prefix_list]
+
+    result.is_truncated = _check_found(is_truncated, 'IsTruncated', parent_tag)
+
+    next_key_marker = _check_found(next_key_marker, 'NextKeyMarker', parent_tag)
+    result.next_key_marker = urlunquote(next_key_marker) if url_encoded else next_key_marker
+    result.next_upload_id_marker = _check_found(next_upload_id_marker, 'NextUploadIdMarker', parent_tag)
 
     return result
 
 
-def parse_list_parts(result, body):
-    root = ElementTree.fromstring(body)
+_LIST_PARTS_TAGS = frozenset(['Part', 'IsTruncated', 'NextPartNumberMarker'])
 
-    result.is_truncated = _find_bool(root, 'IsTruncated')
-    result.next_marker = _find_tag(root, 'NextPartNumberMarker')
-    for part_node in root.findall('Part'):
-        result.parts.append(PartInfo(
-            _find_int(part_node, 'PartNumber'),
-            _find_tag(part_node, 'ETag').strip('"'),
-            size=_find_int(part_node, 'Size'),
-            last_modified=iso8601_to_unixtime(_find_tag(part_node, 'LastModified'))
-        ))
+
+def parse_list_parts(result, body):
+    parent_tag = 'ListPartsResult'
+    is_truncated = None
+    next_marker = None
+
+    for node in _iterparse(body, _LIST_PARTS_TAGS):
+        tag = node.tag
+
+        if tag == 'Part':
+            texts = _child_texts(node)
+            result.parts.append(PartInfo(
+                int(_get_text(texts, 'PartNumber', tag)),
+                _get_text(texts, 'ETag', tag).strip('"'),
+                size=int(_get_text(texts, 'Size', tag)),
+                last_modified=iso8601_to_unixtime(_get_text(texts, 'LastModified', tag))
+            ))
+        elif tag == 'IsTruncated':
+            is_truncated = _to_bool(_node_text(node), tag, parent_tag)
+        elif tag == 'NextPartNumberMarker':
+            next_marker = _node_text(node)
+
+    result.is_truncated = _check_found(is_truncated, 'IsTruncated', parent_tag)
+    result.next_marker = _check_found(next_marker, 'NextPartNumberMarker', parent_tag)
 
     return result
 
@@ -200,6 +347,11 @@ def parse_batch_delete_objects(result, body):
     for deleted_node in root.findall('Deleted'):
         result.deleted_keys.append(_find_object(deleted_node, 'Key', url_encoded))
 
+    for error_node in root.findall('Error'):
+        result.errors.append((_find_object(error_node, 'Key', url_encoded),
+                              _find_tag(error_node, 'Code'),
+                              _find_tag(error_node, 'Message')))
+
     return result
 
 
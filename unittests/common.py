@@ -7,7 +7,9 @@ import tempfile
 import os
 import io
 import functools
+import hashlib
 import re
+import threading
 
 import xml
 from xml.dom import minidom
@@ -190,6 +192,283 @@ def make_do4body(req_infos=None, body_list=None):
     return do4body_func
 
 
+def list_objects_body(keys, params, sizes=None, etags=None):
+    """根据list_objects的请求参数，模拟OSS列举 `keys` ，返回响应的XML。
+
+    文件大小和ETag可以由 `sizes` 和 `etags` 两个dict指定，缺省分别为文件名的长度和固定的ETag。
+    """
+    prefix = params.get('prefix', '')
+    delimiter = params.get('delimiter', '')
+    marker = params.get('marker', '')
+    max_keys = int(params.get('max-keys', 100))
+
+    contents = []
+    prefixes = []
+    next_marker = ''
+    is_truncated = False
+
+    for key in sorted(keys):
+        if not key.startswith(prefix) or key <= marker:
+            continue
+
+        if delimiter and marker.endswith(delimiter) and key.startswith(marker):
+            continue
+
+        pos = key.find(delimiter, len(prefix)) if delimiter else -1
+        if pos >= 0:
+            common_prefix = key[:pos + len(delimiter)]
+            if prefixes and prefixes[-1] == common_prefix:
+                continue
+
+        if len(contents) + len(prefixes) == max_keys:
+            is_truncated = True
+            break
+
+        if pos >= 0:
+            prefixes.append(common_prefix)
+            next_marker = common_prefix
+        else:
+            contents.append(key)
+            next_marker = key
+
+    body = '<?xml version="1.0" encoding="UTF-8"?><ListBucketResult><Name>{0}</Name>'.format(BUCKET_NAME)
+    body += '<IsTruncated>{0}</IsTruncated>'.format('true' if is_truncated else 'false')
+    if is_truncated:
+        body += '<NextMarker>{0}</NextMarker>'.format(next_marker)
+
+    for key in contents:
+        body += '''<Contents><Key>{0}</Key><LastModified>2016-01-07T11:10:00.000Z</LastModified>
+            <ETag>"{2}"</ETag><Type>Normal</Type><Size>{1}</Size>
+            <StorageClass>Standard</StorageClass></Contents>'''.format(
+            key,
+            sizes[key] if sizes is not None else len(key),
+            etags[key] if etags is not None else '5EB63BBBE01EEED093CB22BB8F5ACDC3')
+
+    for common_prefix in prefixes:
+        body += '<CommonPrefixes><Prefix>{0}</Prefix></CommonPrefixes>'.format(common_prefix)
+
+    body += '</ListBucketResult>'
+    return oss2.to_bytes(body)
+
+
+def make_do4list(keys, req_infos=None):
+    """返回模拟list_objects的do_request，可以被多个线程同时调用。每个请求的参数会被追加到 `req_infos` 。"""
+    def do4list_func(req, timeout):
+        if req_infos is not None:
+            req_infos.append(dict(req.params))
+
+        return do4body(req, timeout, body=list_objects_body(keys, req.params))
+
+    return do4list_func
+
+
+class FakeObject(object):
+    def __init__(self, data, headers=None, etag=None):
+        self.data = data
+        self.headers = oss2.CaseInsensitiveDict(headers)
+        self.etag = etag or hashlib.md5(data).hexdigest().upper()
+        self.crc = calc_crc(data)
+
+
+class FakeOss(object):
+    """在内存中模拟OSS的文件接口，可以作为 `oss2.Session.do_request` 的side_effect，被多个线程同时调用。
+
+    支持列举、上传、下载（包括Range）、HEAD、objectMeta、拷贝、分片上传、分片拷贝、删除和批量删除，
+    以及If-Match、If-None-Match和x-oss-copy-source-if-match。
+
+    `hook(req)` 可以返回一个响应来代替正常处理，用来模拟错误。
+    """
+    def __init__(self, hook=None):
+        self.objects = {}
+        self.uploads = {}
+        self.requests = []
+        self.hook = hook
+        self.lock = threading.RLock()
+        self.__next_upload_id = 0
+
+    def put(self, key, data, headers=None, bucket_name=BUCKET_NAME):
+        with self.lock:
+            self.objects[(bucket_name, key)] = FakeObject(oss2.to_bytes(data), headers)
+
+    def get(self, key, bucket_name=BUCKET_NAME):
+        return self.objects[(bucket_name, key)]
+
+    def keys(self, bucket_name=BUCKET_NAME):
+        with self.lock:
+            return sorted(k for b, k in self.objects if b == bucket_name)
+
+    def __call__(self, req, timeout):
+        url = oss2.urlparse(req.url)
+        bucket_name = url.netloc.split('.')[0]
+        key = oss2.to_string(oss2.urlunquote(url.path[1:]))
+
+        data = self.__read_data(req.data)
+
+        with self.lock:
+            self.requests.append((req.method, key, dict(req.params), req.headers))
+
+        if self.hook:
+            resp = self.hook(req)
+            if resp is not None:
+                return resp
+
+        with self.lock:
+            return self.__dispatch(req, bucket_name, key, data)
+
+    def __dispatch(self, req, bucket_name, key, data):
+        params = req.params
+        headers = req.headers
+
+        if req.method == 'GET' and not key:
+            keys = self.keys(bucket_name)
+            sizes = dict((k, len(self.objects[(bucket_name, k)].data)) for k in keys)
+            etags = dict((k, self.objects[(bucket_name, k)].etag) for k in keys)
+            return r4get(list_objects_body(keys, params, sizes=sizes, etags=etags))
+
+        if req.method == 'POST' and 'delete' in params:
+            deleted = [oss2.to_string(k) for k in re.findall(b'<Key>(.*?)</Key>', data)]
+            for k in deleted:
+                self.objects.pop((bucket_name, k), None)
+            if b'<Quiet>true</Quiet>' in data:
+                return r4put()
+            return r4get('<?xml version="1.0" encoding="UTF-8"?><DeleteResult>' +
+                         ''.join('<Deleted><Key>{0}</Key></Deleted>'.format(k) for k in deleted) + '</DeleteResult>')
+
+        if req.method == 'POST' and 'uploads' in params:
+            self.__next_upload_id += 1
+            upload_id = 'upload-' + str(self.__next_upload_id)
+            self.uploads[upload_id] = (bucket_name, key, oss2.CaseInsensitiveDict(headers), {})
+            return r4get('''<?xml version="1.0" encoding="UTF-8"?><InitiateMultipartUploadResult>
+                <Bucket>{0}</Bucket><Key>{1}</Key><UploadId>{2}</UploadId></InitiateMultipartUploadResult>'''.format(
+                bucket_name, key, upload_id))
+
+        if req.method == 'POST' and 'uploadId' in params:
+            upload_bucket, upload_key, upload_headers, parts = self.uploads.pop(params['uploadId'])
+            numbers = [int(n) for n in re.findall(b'<PartNumber>(.*?)</PartNumber>', data)]
+            obj = FakeObject(b''.join(parts[n] for n in numbers), upload_headers,
+                             etag=hashlib.md5(b''.join(parts[n] for n in numbers)).hexdigest().upper() + '-' + str(len(numbers)))
+            self.objects[(bucket_name, key)] = obj
+            return r4get('''<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUploadResult>
+                <ETag>"{0}"</ETag></CompleteMultipartUploadResult>'''.format(obj.etag),
+                in_headers={'ETag': '"' + obj.etag + '"', 'x-oss-hash-crc64ecma': str(obj.crc)})
+
+        if req.method == 'GET' and 'uploadId' in params:
+            if params['uploadId'] not in self.uploads:
+                return self.error(404, 'NoSuchUpload')
+            parts = self.uploads[params['uploadId']][3]
+            return r4get('''<?xml version="1.0" encoding="UTF-8"?><ListPartsResult>
+                <IsTruncated>false</IsTruncated><NextPartNumberMarker>{0}</NextPartNumberMarker>{1}</ListPartsResult>'''.format(
+                max(parts) if parts else 0,
+                ''.join('''<Part><PartNumber>{0}</PartNumber><LastModified>2015-12-12T00:36:29.000Z</LastModified>
+                    <ETag>"{1}"</ETag><Size>{2}</Size></Part>'''.format(n, hashlib.md5(parts[n]).hexdigest().upper(), len(parts[n]))
+                        for n in sorted(parts))))
+
+        if req.method == 'DELETE' and 'uploadId' in params:
+            self.uploads.pop(params['uploadId'], None)
+            return r4delete()
+
+        if req.method == 'DELETE':
+            self.objects.pop((bucket_name, key), None)
+            return r4delete()
+
+        if req.method == 'PUT':
+            copy_source = headers.get(oss2.headers.OSS_COPY_OBJECT_SOURCE)
+            if copy_source:
+                src_bucket, src_key = copy_source[1:].split('/', 1)
+                src = self.objects.get((src_bucket, oss2.to_string(oss2.urlunquote(src_key))))
+                if src is None:
+                    return self.error(404, 'NoSuchKey')
+
+                if_match = headers.get(oss2.headers.OSS_COPY_OBJECT_SOURCE_IF_MATCH)
+                if if_match is not None and if_match.strip('"') != src.etag:
+                    return self.error(412, 'PreconditionFailed')
+
+                data = src.data
+                copy_range = headers.get(oss2.headers.OSS_COPY_OBJECT_SOURCE_RANGE)
+                if copy_range:
+                    start, end = copy_range[len('bytes='):].split('-')
+                    data = data[int(start):int(end) + 1]
+
+            if 'uploadId' in params:
+                self.uploads[params['uploadId']][3][int(params['partNumber'])] = data
+                etag = hashlib.md5(data).hexdigest().upper()
+                return r4put(in_headers={'ETag': '"' + etag + '"', 'x-oss-hash-crc64ecma': str(calc_crc(data))})
+
+            if copy_source:
+                obj = FakeObject(data, src.headers)
+                self.objects[(bucket_name, key)] = obj
+                return r4get('''<?xml version="1.0" encoding="UTF-8"?><CopyObjectResult>
+                    <ETag>"{0}"</ETag><LastModified>2015-12-12T00:36:29.000Z</LastModified></CopyObjectResult>'''.format(
+                    obj.etag), in_headers={'ETag': '"' + obj.etag + '"'})
+
+            obj_headers = dict((name, headers[name]) for name in headers
+                               if name.lower().startswith('x-oss-meta-') or name.lower() == 'content-type')
+            obj = FakeObject(data, obj_headers)
+            self.objects[(bucket_name, key)] = obj
+            return r4put(in_headers={'ETag': '"' + obj.etag + '"', 'x-oss-hash-crc64ecma': str(obj.crc)})
+
+        obj = self.objects.get((bucket_name, key))
+        if obj is None:
+            return self.error(404, 'NoSuchKey')
+
+        if_match = headers.get('If-Match')
+        if if_match is not None and if_match.strip('"') != obj.etag:
+            return self.error(412, 'PreconditionFailed')
+
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match is not None and if_none_match.strip('"') == obj.etag:
+            return self.error(304, 'NotModified')
+
+        resp_headers = oss2.CaseInsensitiveDict(obj.headers)
+        resp_headers.update({'ETag': '"' + obj.etag + '"', 'Content-Length': str(len(obj.data)),
+                             'x-oss-hash-crc64ecma': str(obj.crc)})
+
+        if req.method == 'HEAD' or 'objectMeta' in params:
+            return MockResponse(200, _fake_headers(resp_headers), b'')
+
+        byte_range = headers.get('Range')
+        if byte_range:
+            start, end = byte_range[len('bytes='):].split('-')
+            if not start:
+                start, end = max(len(obj.data) - int(end), 0), len(obj.data) - 1
+            else:
+                start, end = int(start), min(int(end), len(obj.data) - 1) if end else len(obj.data) - 1
+            resp_headers['Content-Length'] = str(end - start + 1)
+            resp_headers['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, end, len(obj.data))
+            return MockResponse(206, _fake_headers(resp_headers), obj.data[start:end + 1])
+
+        return MockResponse(200, _fake_headers(resp_headers), obj.data)
+
+    def error(self, status, code):
+        body = '''<?xml version="1.0" encoding="UTF-8"?><Error><Code>{0}</Code><Message>{0}</Message>
+            <RequestId>{1}</RequestId></Error>'''.format(code, REQUEST_ID)
+        if status == 304:
+            body = ''
+        return MockResponse(status, {'x-oss-request-id': REQUEST_ID, 'Content-Length': str(len(body))}, body)
+
+    def __read_data(self, data):
+        if data is None:
+            return b''
+        if is_string_type(data):
+            return oss2.to_bytes(data)
+        if hasattr(data, 'read'):
+            return read_file(data)
+        return b''.join(oss2.to_bytes(chunk) for chunk in data)
+
+
+def _fake_headers(headers):
+    result = oss2.CaseInsensitiveDict({
+        'Server': 'AliyunOSS',
+        'Date': 'Fri, 11 Dec 2015 11:40:31 GMT',
+        'Content-Type': 'application/octet-stream',
+        'Last-Modified': MTIME_STRING,
+        'x-oss-object-type': 'Normal',
+        'x-oss-request-id': REQUEST_ID
+    })
+    result.update(headers)
+    return result
+
+
 def is_string_type(obj):
     if oss2.compat.is_py2:
         return isinstance(obj, (str, bytes, unicode))
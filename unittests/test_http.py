@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+import oss2
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.url = 'http://127.0.0.1:{0}/'.format(self.server.server_address[1])
+
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def get(self, session):
+        return session.do_request(oss2.http.Request('GET', self.url), timeout=10)
+
+    def test_pool_size(self):
+        self.assertEqual(oss2.Session().pool_size, oss2.defaults.connection_pool_size)
+        self.assertEqual(oss2.Session(pool_size=3).pool_size, 3)
+
+        saved = oss2.defaults.multiget_num_threads
+        oss2.defaults.multiget_num_threads = 32
+        try:
+            self.assertEqual(oss2.Session().pool_size, 32)
+        finally:
+            oss2.defaults.multiget_num_threads = saved
+
+    def test_pool_stats(self):
+        session = oss2.Session(pool_size=2)
+
+        for i in range(5):
+            self.assertEqual(self.get(session).read(), b'ok')
+
+        stats = session.pool_stats()
+        self.assertEqual((stats.in_use, stats.idle, stats.created, stats.reused, stats.discarded), (0, 1, 1, 4, 0))
+        self.assertEqual(stats.reuse_ratio, 0.8)
+
+        # 同时使用的连接超过连接池大小，多出的连接归还时被丢弃
+        responses = [self.get(session) for i in range(3)]
+        self.assertEqual(session.pool_stats().in_use, 3)
+
+        for resp in responses:
+            resp.read()
+
+        stats = session.pool_stats()
+        self.assertEqual((stats.in_use, stats.idle, stats.created, stats.reused, stats.discarded), (0, 2, 3, 5, 1))
+
+    def test_pool_block(self):
+        session = oss2.Session(pool_size=1, pool_block=True, pool_timeout=0.1)
+
+        resp = self.get(session)
+        self.assertRaises(oss2.exceptions.RequestError, self.get, session)
+
+        resp.read()
+        self.assertEqual(self.get(session).read(), b'ok')
+
+        stats = session.pool_stats()
+        self.assertEqual((stats.created, stats.reused, stats.discarded), (1, 1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+
+from mock import patch
+from unittests.common import *
+
+from oss2.index import ObjectIndex, BloomFilter
+
+
+class TestIndex(OssTestCase):
+    def setUp(self):
+        OssTestCase.setUp(self)
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        OssTestCase.tearDown(self)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add('key-' + str(i))
+
+        for i in range(1000):
+            self.assertTrue(bloom.might_contain('key-' + str(i)))
+
+        false_positives = sum(1 for i in range(10000) if bloom.might_contain('other-' + str(i)))
+        self.assertTrue(false_positives < 300)
+
+        loaded = BloomFilter(1000, bits=bytes(bloom.bits))
+        self.assertTrue(loaded.might_contain('key-1'))
+
+    @patch('oss2.Session.do_request')
+    def test_refresh_and_lookup(self, do_request):
+        keys = ['logs/a', 'logs/b', 'logs/c/1', 'logs/c/2', 'logs/中文']
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(keys + ['other'])
+
+        index = ObjectIndex(bucket(), 'logs/', root=self.root)
+        self.assertEqual(index.staleness, None)
+        self.assertEqual(index.last_key, '')
+
+        self.assertEqual(index.refresh(max_keys=2), 5)
+        self.assertEqual(len(index), 5)
+        self.assertTrue(index.staleness >= 0)
+        self.assertEqual(index.last_key, 'logs/中文')
+
+        self.assertTrue(index.object_exists('logs/a'))
+        self.assertTrue('logs/中文' in index)
+        self.assertFalse(index.object_exists('logs/d'))
+        self.assertFalse(index.object_exists('other'))
+
+        record = index.get('logs/b')
+        self.assertEqual(record.size, 6)
+        self.assertEqual(record.etag, '5EB63BBBE01EEED093CB22BB8F5ACDC3')
+        self.assertEqual(record.last_modified, 1452165000)
+        self.assertEqual(index.get('logs/d'), None)
+
+        self.assertEqual([r.key for r in index.iter_prefix('logs/c/')], ['logs/c/1', 'logs/c/2'])
+        self.assertEqual([r.key for r in index.iter_prefix('logs/', batch_size=2)], keys)
+        index.close()
+
+        # 索引保存在本地，重新打开后不需要列举
+        do_request.side_effect = None
+        index = ObjectIndex(bucket(), 'logs/', root=self.root)
+        self.assertEqual(len(index), 5)
+        self.assertTrue(index.object_exists('logs/c/2'))
+        self.assertFalse(index.object_exists('logs/c/3'))
+        index.close()
+
+    @patch('oss2.Session.do_request')
+    def test_incremental_refresh(self, do_request):
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(['a', 'b', 'd/1', 'd/2'])
+
+        index = ObjectIndex(bucket(), root=self.root)
+        index.refresh()
+        refreshed_at = index.refreshed_at
+
+        # 从marker开始增量刷新，只会追加新的文件
+        req_infos = []
+        do_request.side_effect = make_do4list(['b', 'd/1', 'd/2', 'e'], req_infos=req_infos)
+        self.assertEqual(index.refresh(marker=index.last_key), 1)
+        self.assertEqual(req_infos[0]['marker'], 'd/2')
+        self.assertEqual([r.key for r in index.iter_prefix()], ['a', 'b', 'd/1', 'd/2', 'e'])
+        self.assertEqual(index.refreshed_at, refreshed_at)
+        self.assertTrue(index.updated_at >= refreshed_at)
+
+        # 刷新子前缀，子前缀下被删除的文件从索引中删除
+        do_request.side_effect = make_do4list(['b', 'd/2', 'd/3', 'e'])
+        self.assertEqual(index.refresh(sub_prefix='d/'), 2)
+        self.assertEqual([r.key for r in index.iter_prefix()], ['a', 'b', 'd/2', 'd/3', 'e'])
+        self.assertFalse(index.object_exists('d/1'))
+        self.assertTrue(index.object_exists('d/3'))
+
+        # 全量刷新
+        index.refresh()
+        self.assertEqual([r.key for r in index.iter_prefix()], ['b', 'd/2', 'd/3', 'e'])
+        self.assertFalse(index.object_exists('a'))
+        index.close()
+
+    @patch('oss2.Session.do_request')
+    def test_refresh_failure_and_sharing(self, do_request):
+        do4list = make_do4list(['a', 'b', 'c', 'd'])
+        calls = NonlocalObject(0)
+
+        def fail_second_page(req, timeout):
+            calls.var += 1
+            if calls.var > 1:
+                raise oss2.exceptions.RequestError(Exception('connection reset'))
+            return do4list(req, timeout)
+
+        do_request.auto_spec = True
+        do_request.side_effect = fail_second_page
+
+        index = ObjectIndex(bucket(), root=self.root)
+        self.assertRaises(oss2.exceptions.RequestError, index.refresh, max_keys=2)
+        index.close()
+
+        # 中途失败时已经保存的文件，重新打开后仍然能通过过滤器查到
+        index = ObjectIndex(bucket(), root=self.root)
+        self.assertTrue(index.object_exists('a'))
+        self.assertTrue(index.object_exists('b'))
+
+        # 另一个进程刷新索引后，已经打开的索引重新加载过滤器
+        do_request.side_effect = make_do4list(['a', 'b', 'c', 'd'])
+        other = ObjectIndex(bucket(), root=self.root)
+        other.refresh()
+        other.close()
+
+        self.assertTrue(index.object_exists('d'))
+        index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import gc
+import threading
+import time
+
 from mock import patch
 from unittests.common import *
 
@@ -403,6 +407,71 @@ class TestIterator(OssTestCase):
         for i in range(len(expected)):
             self.assertInstanceEqual(expected[i], got[i])
 
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_encoding_type_after_contents(self, do_request):
+        body_list = [b'''<?xml version="1.0" encoding="UTF-8"?>
+        <ListBucketResult>
+          <Name>ming-spike</Name>
+          <IsTruncated>false</IsTruncated>
+          <Contents>
+            <Key>%E4%B8%AD%E6%96%87.txt</Key>
+            <LastModified>2016-01-07T11:09:39.000Z</LastModified>
+            <ETag>"FC3FF98E8C6A0D3087D515C0473F8677"</ETag>
+            <Type>Normal</Type>
+            <Size>12</Size>
+            <StorageClass>Standard</StorageClass>
+          </Contents>
+          <CommonPrefixes>
+            <Prefix>%E6%96%87%E4%BB%B6%2F</Prefix>
+          </CommonPrefixes>
+          <EncodingType>url</EncodingType>
+        </ListBucketResult>''']
+
+        expected = [SimplifiedObjectInfo('中文.txt', 1452164979, 'FC3FF98E8C6A0D3087D515C0473F8677', 'Normal', 12, 'Standard'),
+                    SimplifiedObjectInfo('文件/', None, None, None, None, None)]
+
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4body(body_list=body_list)
+
+        got = list(oss2.ObjectIterator(bucket(), max_keys=1000))
+
+        self.assertEqual(len(expected), len(got))
+        for i in range(len(expected)):
+            self.assertInstanceEqual(expected[i], got[i])
+
+    def test_iterparse_clears_root(self):
+        body = '<ListBucketResult><Name>ming-spike</Name>{0}</ListBucketResult>'.format(
+            ''.join('<Contents><Key>{0}</Key></Contents>'.format(i) for i in range(100)))
+
+        roots = []
+        iterparse = oss2.xml_utils.ElementTree.iterparse
+
+        def recording_iterparse(*args, **kwargs):
+            for event, node in iterparse(*args, **kwargs):
+                if not roots:
+                    roots.append(node)
+                yield event, node
+
+        keys = []
+        with patch('oss2.xml_utils.ElementTree.iterparse', new=recording_iterparse):
+            for node in oss2.xml_utils._iterparse(body, ['Contents']):
+                keys.append(node.find('Key').text)
+
+        self.assertEqual(keys, [str(i) for i in range(100)])
+        self.assertEqual(len(roots[0]), 0)
+
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_missing_is_truncated(self, do_request):
+        body_list = [b'''<?xml version="1.0" encoding="UTF-8"?>
+        <ListBucketResult>
+          <Name>ming-spike</Name>
+        </ListBucketResult>''']
+
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4body(body_list=body_list)
+
+        self.assertRaises(RuntimeError, list, oss2.ObjectIterator(bucket()))
+
     @patch('oss2.Session.do_request')
     def test_upload_iterator_empty(self, do_request):
         body_list = [b'''<?xml version="1.0" encoding="UTF-8"?>
@@ -425,6 +494,345 @@ class TestIterator(OssTestCase):
         got = list(oss2.MultipartUploadIterator(bucket(), max_uploads=1000))
         self.assertEqual(len(got), 0)
 
+    _PAGE_BODIES = [b'''<?xml version="1.0" encoding="UTF-8"?>
+        <ListBucketResult>
+          <Name>ming-spike</Name>
+          <Delimiter>%2F</Delimiter>
+          <EncodingType>url</EncodingType>
+          <IsTruncated>true</IsTruncated>
+          <NextMarker>b.txt</NextMarker>
+          <Contents>
+            <Key>a.txt</Key>
+            <LastModified>2016-01-07T11:10:00.000Z</LastModified>
+            <ETag>"5EB63BBBE01EEED093CB22BB8F5ACDC3"</ETag>
+            <Type>Normal</Type>
+            <Size>11</Size>
+            <StorageClass>Standard</StorageClass>
+          </Contents>
+          <Contents>
+            <Key>b.txt</Key>
+            <LastModified>2016-01-07T11:09:39.000Z</LastModified>
+            <ETag>"FC3FF98E8C6A0D3087D515C0473F8677"</ETag>
+            <Type>Multipart</Type>
+            <Size>12</Size>
+            <StorageClass>IA</StorageClass>
+          </Contents>
+          <CommonPrefixes>
+            <Prefix>%E6%96%87%E4%BB%B6%2F</Prefix>
+          </CommonPrefixes>
+        </ListBucketResult>''',
+        b'''<?xml version="1.0" encoding="UTF-8"?>
+        <ListBucketResult>
+          <Name>ming-spike</Name>
+          <EncodingType>url</EncodingType>
+          <IsTruncated>false</IsTruncated>
+          <Contents>
+            <Key>%E9%98%BF%E9%87%8C%E4%BA%91.txt</Key>
+            <LastModified>2016-01-07T11:07:32.000Z</LastModified>
+            <ETag>"5D41402ABC4B2A76B9719D911017C592"</ETag>
+            <Type>Normal</Type>
+            <Size>5</Size>
+            <StorageClass>Standard</StorageClass>
+          </Contents>
+        </ListBucketResult>''']
+
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_iter_pages(self, do_request):
+        req_infos = [RequestInfo(), RequestInfo()]
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4body(req_infos=req_infos, body_list=self._PAGE_BODIES)
+
+        pages = list(oss2.ObjectIterator(bucket(), delimiter='/', max_keys=3).iter_pages())
+        self.assertEqual(len(pages), 2)
+
+        page = pages[0]
+        self.assertTrue(isinstance(page, oss2.models.ObjectPage))
+        self.assertEqual(len(page), 3)
+        self.assertEqual(page.keys, ['a.txt', 'b.txt'])
+        self.assertEqual(list(page.sizes), [11, 12])
+        self.assertEqual(list(page.last_modifieds), [1452165000, 1452164979])
+        self.assertEqual(page.etags, ['5EB63BBBE01EEED093CB22BB8F5ACDC3', 'FC3FF98E8C6A0D3087D515C0473F8677'])
+        self.assertEqual(page.types, ['Normal', 'Multipart'])
+        self.assertEqual(page.storage_classes, ['Standard', 'IA'])
+        self.assertEqual(page.prefixes, ['文件/'])
+
+        records = list(page)
+        self.assertEqual([r.key for r in records], ['a.txt', 'b.txt', '文件/'])
+        self.assertTrue(records[2].is_prefix())
+        self.assertFalse(records[1].is_prefix())
+        self.assertEqual(records[1].size, 12)
+        self.assertFalse(hasattr(records[0], '__dict__'))
+
+        self.assertEqual(pages[1].keys, ['阿里云.txt'])
+        self.assertEqual(pages[1].prefixes, [])
+
+        self.assertEqual(req_infos[0].req.params.get('marker', ''), '')
+        self.assertEqual(req_infos[1].req.params.get('marker', ''), 'b.txt')
+
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_iter_pages_after_next(self, do_request):
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4body(body_list=self._PAGE_BODIES)
+
+        iterator = oss2.ObjectIterator(bucket(), delimiter='/', max_keys=3)
+        self.assertEqual(next(iterator).key, 'a.txt')
+
+        pages = list(iterator.iter_pages())
+        self.assertEqual(len(pages), 2)
+        self.assertEqual([r.key for r in pages[0]], ['b.txt', '文件/'])
+        self.assertEqual(list(pages[0].sizes), [12])
+        self.assertEqual(pages[1].keys, ['阿里云.txt'])
+
+        self.assertRaises(StopIteration, next, iterator)
+
+    @patch('oss2.Session.do_request')
+    def test_part_iterator_iter_pages(self, do_request):
+        body_list = [b'''<?xml version="1.0" encoding="UTF-8"?>
+        <ListPartsResult>
+          <Bucket>ming-spike</Bucket>
+          <Key>fake-key</Key>
+          <UploadId>fake-upload-id</UploadId>
+          <NextPartNumberMarker>1</NextPartNumberMarker>
+          <MaxParts>1</MaxParts>
+          <IsTruncated>true</IsTruncated>
+          <Part>
+            <PartNumber>1</PartNumber>
+            <LastModified>2016-01-07T11:10:00.000Z</LastModified>
+            <ETag>"5EB63BBBE01EEED093CB22BB8F5ACDC3"</ETag>
+            <Size>11</Size>
+          </Part>
+        </ListPartsResult>''',
+        b'''<?xml version="1.0" encoding="UTF-8"?>
+        <ListPartsResult>
+          <Bucket>ming-spike</Bucket>
+          <Key>fake-key</Key>
+          <UploadId>fake-upload-id</UploadId>
+          <NextPartNumberMarker>2</NextPartNumberMarker>
+          <MaxParts>1</MaxParts>
+          <IsTruncated>false</IsTruncated>
+          <Part>
+            <PartNumber>2</PartNumber>
+            <LastModified>2016-01-07T11:10:00.000Z</LastModified>
+            <ETag>"FC3FF98E8C6A0D3087D515C0473F8677"</ETag>
+            <Size>12</Size>
+          </Part>
+        </ListPartsResult>''']
+
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4body(body_list=body_list)
+
+        pages = list(oss2.PartIterator(bucket(), 'fake-key', 'fake-upload-id', max_parts=1).iter_pages())
+        self.assertEqual([[p.part_number for p in page] for page in pages], [[1], [2]])
+
+    _SHARDED_KEYS = ['a.txt', 'a/1', 'a/2', 'a/3/x', 'b', 'c/1', 'c/2', 'c/3', 'c/4', 'c/5', 'd/e/f', 'z.txt']
+
+    @patch('oss2.Session.do_request')
+    def test_parallel_object_iterator_ordered(self, do_request):
+        req_infos = []
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(self._SHARDED_KEYS, req_infos=req_infos)
+
+        got = list(oss2.ParallelObjectIterator(bucket(), workers=3, ordered=True, max_keys=2))
+        self.assertEqual([obj.key for obj in got], self._SHARDED_KEYS)
+        self.assertEqual(got[1].size, 3)
+        self.assertFalse(any(obj.is_prefix() for obj in got))
+
+        shard_prefixes = set(params.get('prefix') for params in req_infos)
+        self.assertTrue(set(['a/', 'c/', 'd/']) <= shard_prefixes)
+
+    @patch('oss2.Session.do_request')
+    def test_parallel_object_iterator_nested(self, do_request):
+        # 大部分文件都在同一个子目录下
+        keys = sorted(['top.txt'] + ['data/{0}/{1}'.format(d, i) for d in range(8) for i in range(5)] + ['data/z'])
+
+        for ordered in [True, False]:
+            req_infos = []
+            do_request.auto_spec = True
+            do_request.side_effect = make_do4list(keys, req_infos=req_infos)
+
+            got = [obj.key for obj in oss2.ParallelObjectIterator(bucket(), workers=4, ordered=ordered, max_keys=2)]
+            self.assertEqual(got if ordered else sorted(got), keys)
+
+            # data/被进一步拆分成子目录
+            shard_prefixes = set(params.get('prefix') for params in req_infos)
+            self.assertTrue('data/' in shard_prefixes)
+            self.assertTrue(any(prefix.startswith('data/') and prefix != 'data/' for prefix in shard_prefixes))
+
+    @patch('oss2.Session.do_request')
+    def test_parallel_object_iterator_abandoned(self, do_request):
+        keys = ['{0}/{1}'.format(d, i) for d in range(10) for i in range(20)]
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(keys)
+
+        num_threads = threading.active_count()
+
+        for ordered in [True, False]:
+            iterator = oss2.ParallelObjectIterator(bucket(), workers=3, ordered=ordered, max_keys=1, max_pages=1)
+            next(iterator)
+            del iterator
+            gc.collect()
+
+            for i in range(50):
+                if threading.active_count() == num_threads:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(threading.active_count(), num_threads)
+
+    @patch('oss2.Session.do_request')
+    def test_parallel_object_iterator_unordered(self, do_request):
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(self._SHARDED_KEYS)
+
+        got = [obj.key for obj in oss2.ParallelObjectIterator(bucket(), workers=4, max_keys=1)]
+        self.assertEqual(sorted(got), self._SHARDED_KEYS)
+
+        got = [obj.key for obj in oss2.ParallelObjectIterator(bucket(), prefix='c/', workers=2)]
+        self.assertEqual(sorted(got), ['c/1', 'c/2', 'c/3', 'c/4', 'c/5'])
+
+    @patch('oss2.Session.do_request')
+    def test_parallel_object_iterator_error(self, do_request):
+        list_func = make_do4list(self._SHARDED_KEYS)
+        error_body = b'''<?xml version="1.0" encoding="UTF-8"?>
+        <Error>
+          <Code>AccessDenied</Code>
+          <Message>Access Denied</Message>
+          <RequestId>5C3D9175B6FC201293AD4890</RequestId>
+        </Error>'''
+
+        def do4list(req, timeout):
+            if req.params.get('prefix') == 'c/':
+                return do4body(req, timeout, status=403, body=error_body)
+            return list_func(req, timeout)
+
+        do_request.auto_spec = True
+        do_request.side_effect = do4list
+
+        for ordered in [True, False]:
+            iterator = oss2.ParallelObjectIterator(bucket(), workers=2, ordered=ordered)
+            self.assertRaises(oss2.exceptions.AccessDenied, list, iterator)
+
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_prefetch(self, do_request):
+        req_infos = []
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(self._SHARDED_KEYS, req_infos=req_infos)
+
+        iterator = oss2.ObjectIterator(bucket(), max_keys=2, prefetch=2)
+        got = [obj.key for obj in iterator]
+
+        self.assertEqual(got, self._SHARDED_KEYS)
+        self.assertEqual(len(req_infos), 6)
+        self.assertEqual([params.get('marker', '') for params in req_infos],
+                         ['', 'a/1', 'a/3/x', 'c/1', 'c/3', 'c/5'])
+        self.assertRaises(StopIteration, next, iterator)
+
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_prefetch_pages(self, do_request):
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(self._SHARDED_KEYS)
+
+        iterator = oss2.ObjectIterator(bucket(), max_keys=5, prefetch=1)
+        pages = list(iterator.iter_pages())
+
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        self.assertTrue(all(isinstance(page, oss2.models.ObjectPage) for page in pages))
+        self.assertEqual(sum([page.keys for page in pages], []), self._SHARDED_KEYS)
+
+        # 逐个迭代时开始预取，剩下的部分按页遍历
+        do_request.side_effect = make_do4list(self._SHARDED_KEYS)
+        iterator = oss2.ObjectIterator(bucket(), max_keys=5, prefetch=1)
+        self.assertEqual(next(iterator).key, 'a.txt')
+
+        pages = list(iterator.iter_pages())
+        self.assertEqual(sum([page.keys for page in pages], []), self._SHARDED_KEYS[1:])
+
+        # 先按页遍历，之后逐个迭代，返回的依然是SimplifiedObjectInfo
+        do_request.side_effect = make_do4list(self._SHARDED_KEYS)
+        iterator = oss2.ObjectIterator(bucket(), max_keys=5, prefetch=1)
+        page = next(iterator.iter_pages())
+        self.assertEqual(page.keys, self._SHARDED_KEYS[:5])
+
+        got = list(iterator)
+        self.assertEqual([obj.key for obj in got], self._SHARDED_KEYS[5:])
+        self.assertTrue(all(isinstance(obj, SimplifiedObjectInfo) for obj in got))
+
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_prefetch_marker(self, do_request):
+        req_infos = []
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(self._SHARDED_KEYS, req_infos=req_infos)
+
+        iterator = oss2.ObjectIterator(bucket(), max_keys=2, prefetch=3)
+        self.assertEqual(next(iterator).key, 'a.txt')
+
+        # 等预取线程获取了更多的页，分页状态依然是调用者已经收到的那一页的
+        for i in range(50):
+            if len(req_infos) >= 4:
+                break
+            time.sleep(0.1)
+        self.assertTrue(len(req_infos) >= 4)
+        self.assertEqual(iterator.next_marker, 'a/1')
+        self.assertTrue(iterator.is_truncated)
+
+        iterator.close()
+
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_prefetch_error(self, do_request):
+        list_func = make_do4list(self._SHARDED_KEYS)
+        error_body = b'''<?xml version="1.0" encoding="UTF-8"?>
+        <Error>
+          <Code>InternalError</Code>
+          <Message>Please try again</Message>
+          <RequestId>5C3D9175B6FC201293AD4890</RequestId>
+        </Error>'''
+        counter = NonlocalObject(0)
+
+        def do4list(req, timeout):
+            if req.params.get('marker') == 'a/3/x':
+                counter.var += 1
+                return do4body(req, timeout, status=500, body=error_body)
+            return list_func(req, timeout)
+
+        do_request.auto_spec = True
+        do_request.side_effect = do4list
+
+        iterator = oss2.ObjectIterator(bucket(), max_keys=2, max_retries=3, prefetch=3)
+        got = [next(iterator).key for i in range(4)]
+        self.assertEqual(got, self._SHARDED_KEYS[:4])
+
+        self.assertRaises(oss2.exceptions.ServerError, next, iterator)
+        self.assertEqual(counter.var, 3)
+        self.assertRaises(StopIteration, next, iterator)
+
+    @patch('oss2.Session.do_request')
+    def test_object_iterator_prefetch_abandoned(self, do_request):
+        req_infos = []
+        do_request.auto_spec = True
+        do_request.side_effect = make_do4list(self._SHARDED_KEYS, req_infos=req_infos)
+
+        def wait_for_threads(count):
+            for i in range(50):
+                if threading.active_count() == count:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(threading.active_count(), count)
+
+        num_threads = threading.active_count()
+
+        # 没有调用close()就丢弃
+        iterator = oss2.ObjectIterator(bucket(), max_keys=2, prefetch=1)
+        self.assertEqual(next(iterator).key, 'a.txt')
+        del iterator
+        gc.collect()
+        wait_for_threads(num_threads)
+        self.assertTrue(len(req_infos) < 6)
+
+        # with语句结束时关闭，之后不再返回条目
+        with oss2.ObjectIterator(bucket(), max_keys=2, prefetch=1) as iterator:
+            self.assertEqual(next(iterator).key, 'a.txt')
+        wait_for_threads(num_threads)
+        self.assertTrue(len(list(iterator)) < len(self._SHARDED_KEYS) - 1)
+
     def test_part_iterator_default_max_retries(self):
         iter = oss2.PartIterator(bucket(), 'fake-key', 'fake-upload-id')
         self.assertEqual(iter.max_retries, oss2.defaults.request_retries)
@@ -1,6 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import io
 import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
 import oss2
 
 from functools import partial
@@ -89,6 +96,11 @@ x-oss-hash-crc64ecma: {1}'''.format(position + len(content), calc_crc(content))
     return request_text, response_text
 
 
+def _copy_record_key(src_prefix, dst_prefix):
+    return '{0}-{1}-prefix'.format(oss2.utils.md5_string('oss://{0}/{1}'.format(BUCKET_NAME, src_prefix)),
+                                   oss2.utils.md5_string('oss://{0}/{1}'.format(BUCKET_NAME, dst_prefix)))
+
+
 class TestObject(OssTestCase):
     @patch('oss2.Session.do_request')
     def test_head(self, do_request):
@@ -507,6 +519,653 @@ x-oss-request-id: 566B6BE9229E6BA1F6F538DE
         self.assertRequest(req_info, request_text)
         self.assertEqual(result.deleted_keys, list(to_string(key) for key in key_list))
 
+    @patch('oss2.Session.do_request')
+    def test_delete_prefix(self, do_request):
+        keys = set('dir/' + str(i) for i in range(2500))
+        keys.update(['dir.txt', 'other/1'])
+        list_func = make_do4list(keys)
+
+        lock = threading.Lock()
+        batches = []
+        failures = NonlocalObject(0)
+
+        def do4delete_objects(req, timeout):
+            if req.method == 'GET':
+                with lock:
+                    return list_func(req, timeout)
+
+            self.assertTrue('delete' in req.params)
+            self.assertTrue(b'<Quiet>true</Quiet>' in req.data)
+            deleted = [oss2.to_string(k) for k in re.findall(b'<Key>(.*?)</Key>', req.data)]
+
+            with lock:
+                if len(batches) == 1 and failures.var == 0:
+                    failures.var += 1
+                    return do4body(req, timeout, status=503, body=b'''<?xml version="1.0" encoding="UTF-8"?>
+                        <Error><Code>ServiceUnavailable</Code><Message>Please slow down</Message>
+                        <RequestId>5C3D9175B6FC201293AD4890</RequestId></Error>''')
+
+                batches.append(deleted)
+                keys.difference_update(deleted)
+            return do4body(req, timeout, body=b'')
+
+        do_request.auto_spec = True
+        do_request.side_effect = do4delete_objects
+
+        progress = []
+        deleted = bucket().delete_prefix('dir/', workers=3,
+                                         progress_callback=lambda consumed, total: progress.append(consumed))
+
+        self.assertEqual(deleted, 2500)
+        self.assertEqual(failures.var, 1)
+        self.assertEqual(sorted(len(b) for b in batches), [500, 1000, 1000])
+        self.assertEqual(keys, set(['dir.txt', 'other/1']))
+        self.assertEqual(progress[-1], 2500)
+
+    @patch('oss2.Session.do_request')
+    def test_delete_prefix_key_errors(self, do_request):
+        keys = set('dir/' + str(i) for i in range(10))
+        list_func = make_do4list(keys)
+        requests = []
+
+        def do4delete_objects(req, timeout):
+            if req.method == 'GET':
+                return list_func(req, timeout)
+
+            batch = [oss2.to_string(k) for k in re.findall(b'<Key>(.*?)</Key>', req.data)]
+            requests.append(batch)
+
+            # dir/3第一次删除失败，dir/7总是删除失败
+            failed = ['dir/7'] + (['dir/3'] if len(requests) == 1 else [])
+            body = '<?xml version="1.0" encoding="UTF-8"?><DeleteResult>'
+            for key in failed:
+                body += '<Error><Key>{0}</Key><Code>InternalError</Code><Message>Please try again</Message></Error>'.format(key)
+            body += '</DeleteResult>'
+
+            keys.difference_update(set(batch) - set(failed))
+            return do4body(req, timeout, body=oss2.to_bytes(body))
+
+        do_request.auto_spec = True
+        do_request.side_effect = do4delete_objects
+
+        progress = []
+        deleted = bucket().delete_prefix('dir/', workers=1, max_retries=3,
+                                         progress_callback=lambda consumed, total: progress.append(consumed))
+
+        self.assertEqual(deleted, 9)
+        self.assertEqual(keys, set(['dir/7']))
+        self.assertEqual([sorted(batch) for batch in requests[1:]], [['dir/3', 'dir/7'], ['dir/7']])
+        self.assertEqual(progress, [8, 9, 9])
+
+    @patch('oss2.Session.do_request')
+    def test_batch_head(self, do_request):
+        sizes = dict(('key-' + str(i), i) for i in range(50))
+        methods = set()
+
+        def do4head(req, timeout):
+            key = oss2.urlunquote(req.url.split('/')[-1].split('?')[0])
+            methods.add((req.method, 'objectMeta' in req.params))
+
+            if key == 'forbidden':
+                return do4body(req, timeout, status=403, body=b'''<?xml version="1.0" encoding="UTF-8"?>
+                    <Error><Code>AccessDenied</Code><Message>Access Denied</Message>
+                    <RequestId>5C3D9175B6FC201293AD4890</RequestId></Error>''')
+
+            if key not in sizes:
+                return r4head(0, in_status=404)
+
+            time.sleep(0.001 * (sizes[key] % 3))
+            return r4head(sizes[key])
+
+        do_request.auto_spec = True
+        do_request.side_effect = do4head
+
+        keys = ['key-' + str(i) for i in range(50)] + ['missing', 'forbidden']
+
+        got = list(bucket().batch_head(iter(keys), workers=4, ordered=True, max_in_flight=5))
+        self.assertEqual([key for key, result in got], keys)
+        for key, result in got[:50]:
+            self.assertTrue(isinstance(result, oss2.models.HeadObjectResult))
+            self.assertEqual(result.content_length, sizes[key])
+        self.assertTrue(isinstance(got[50][1], oss2.exceptions.NotFound))
+        self.assertTrue(isinstance(got[51][1], oss2.exceptions.AccessDenied))
+        self.assertEqual(methods, set([('HEAD', False)]))
+
+        methods.clear()
+        got = dict(bucket().batch_head(keys, workers=8, light=True))
+        self.assertEqual(sorted(got.keys()), sorted(keys))
+        self.assertTrue(isinstance(got['key-7'], oss2.models.GetObjectMetaResult))
+        self.assertEqual(got['key-7'].content_length, 7)
+        self.assertTrue(isinstance(got['missing'], oss2.exceptions.NotFound))
+        self.assertEqual(methods, set([('GET', True)]))
+
+    def test_iter_concurrently_stop(self):
+        started = []
+        lock = threading.Lock()
+
+        def work(item):
+            with lock:
+                started.append(item)
+            time.sleep(0.01)
+            return item
+
+        # 调用者抛出异常后，已经排队但还没有开始的元素不再处理，返回时也没有仍在执行的元素
+        def consume():
+            for item, result in oss2.bulk._iter_concurrently(work, range(100), 2, max_in_flight=10):
+                raise ValueError(item)
+
+        self.assertRaises(ValueError, consume)
+        count = len(started)
+        self.assertTrue(count <= 4)
+
+        time.sleep(0.1)
+        self.assertEqual(len(started), count)
+
+    @patch('oss2.Session.do_request')
+    def test_metadata_cache(self, do_request):
+        requests = []
+
+        def do4meta(req, timeout):
+            requests.append((req.method, req.headers.get('If-None-Match')))
+
+            if req.method == 'HEAD':
+                if req.headers.get('If-None-Match') == ETAG:
+                    return r4head(0, in_status=304)
+                return r4head(10)
+            else:
+                return r4put()
+
+        do_request.auto_spec = True
+        do_request.side_effect = do4meta
+
+        cache = oss2.MetadataCache(max_entries=2, ttl=3600)
+        b = oss2.Bucket(oss2.Auth('fake-access-key-id', 'fake-access-key-secret'),
+                        'http://oss-cn-hangzhou.aliyuncs.com', BUCKET_NAME, metadata_cache=cache)
+
+        result = b.head_object('a')
+        self.assertTrue(b.head_object('a') is result)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(len(requests), 1)
+
+        # 带了头部的请求不使用缓存
+        b.head_object('a', headers={'Range': 'bytes=0-1'})
+        self.assertEqual(len(requests), 2)
+
+        # 自己的写操作清除缓存
+        b.put_object('a', 'hello')
+        self.assertTrue(b.head_object('a') is not result)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        # LRU淘汰
+        b.head_object('b')
+        b.head_object('c')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+
+        # 过期之后用If-None-Match确认
+        cache.ttl = 0
+        cache.clear()
+        result = b.head_object('c')
+        del requests[:]
+        self.assertTrue(b.head_object('c') is result)
+        self.assertEqual(requests, [('HEAD', ETAG)])
+        self.assertEqual(cache.revalidations, 1)
+
+    @patch('oss2.Session.do_request')
+    def test_metadata_cache_concurrent_write(self, do_request):
+        def do4meta(req, timeout):
+            if req.method == 'HEAD':
+                # 模拟HEAD请求在途时，另一个线程写入了同一个文件
+                if writes:
+                    b.put_object(writes.pop(), 'hello')
+                return r4head(10)
+            else:
+                return r4put()
+
+        do_request.auto_spec = True
+        do_request.side_effect = do4meta
+
+        cache = oss2.MetadataCache(max_entries=2, ttl=3600)
+        b = oss2.Bucket(oss2.Auth('fake-access-key-id', 'fake-access-key-secret'),
+                        'http://oss-cn-hangzhou.aliyuncs.com', BUCKET_NAME, metadata_cache=cache)
+
+        writes = ['a']
+        b.head_object('a')
+        self.assertEqual(len(cache), 0)
+
+        b.head_object('a')
+        self.assertEqual(len(cache), 1)
+
+        # 写的是其他文件时不受影响
+        writes = ['b']
+        b.head_object('c')
+        self.assertEqual(len(cache), 2)
+
+        # 代数的记录被淘汰后，保守地不缓存
+        gen = cache.generation(BUCKET_NAME, 'x')
+        for key in ['d', 'e', 'f']:
+            cache.invalidate(BUCKET_NAME, key)
+        cache.put(BUCKET_NAME, 'x', 'head', object(), generation=gen)
+        self.assertEqual(cache.get(BUCKET_NAME, 'x', 'head'), (None, False))
+
+    @patch('oss2.Session.do_request')
+    def test_copy_prefix(self, do_request):
+        oss = FakeOss()
+        for i in range(5):
+            oss.put('src/' + str(i), random_bytes(100 + i), headers={'x-oss-meta-index': str(i)})
+        oss.put('big', b'x')
+        oss.put('src/big', random_bytes(1000), headers={'Content-Type': 'text/plain', 'x-oss-meta-index': 'big'})
+
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+
+        store = oss2.ResumableStore(root=root)
+        b = bucket()
+
+        self.assertEqual(b.copy_prefix(BUCKET_NAME, 'src/', 'dst/', workers=3, store=store,
+                                       multipart_threshold=500, part_size=300), 6)
+        for key in ['0', '1', '2', '3', '4', 'big']:
+            src, dst = oss.get('src/' + key), oss.get('dst/' + key)
+            self.assertEqual(dst.data, src.data)
+            self.assertEqual(dst.headers['x-oss-meta-index'], src.headers['x-oss-meta-index'])
+        self.assertEqual(oss.get('dst/big').headers['Content-Type'], 'text/plain')
+        self.assertEqual(len([r for r in oss.requests if r[0] == 'PUT' and r[1] == 'dst/big']), 4)
+        self.assertEqual(store.get(_copy_record_key('src/', 'dst/')), None)
+
+        # 从断点继续，并删除源文件
+        store.put(_copy_record_key('src/', 'moved/'), {'marker': 'src/2'})
+        self.assertEqual(b.copy_prefix(BUCKET_NAME, 'src/', 'moved/', store=store, move=True), 3)
+        self.assertEqual(oss.keys(), ['big', 'dst/0', 'dst/1', 'dst/2', 'dst/3', 'dst/4', 'dst/big',
+                                      'moved/3', 'moved/4', 'moved/big', 'src/0', 'src/1', 'src/2'])
+
+        self.assertEqual(b.copy_prefix(BUCKET_NAME, 'none/', 'dst/', store=store), 0)
+        self.assertRaises(oss2.exceptions.ClientError, b.copy_prefix, BUCKET_NAME, 'src/', 'src/sub/')
+
+    @patch('oss2.Session.do_request')
+    def test_compose_objects(self, do_request):
+        oss = FakeOss()
+        sizes = [('a', 30), ('b', 120), ('c', 50), ('d', 250), ('e', 0), ('f', 10)]
+        for key, size in sizes:
+            oss.put(key, random_bytes(size * 1024))
+
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        keys = [key for key, size in sizes] + ['a']
+        result = bucket().compose_objects('all', keys, workers=3, headers={'Content-Type': 'text/plain'})
+
+        target = oss.get('all')
+        self.assertEqual(target.data, b''.join(oss.get(key).data for key in keys))
+        self.assertEqual(target.headers['Content-Type'], 'text/plain')
+        self.assertEqual(result.crc, target.crc)
+
+        # a+b[:70K], b[70K:]+c, d（服务器端拷贝）, f+a
+        parts = [(r[2]['partNumber'], oss2.headers.OSS_COPY_OBJECT_SOURCE in r[3])
+                 for r in oss.requests if r[0] == 'PUT']
+        self.assertEqual(sorted(parts), [('1', False), ('2', False), ('3', True), ('4', False)])
+
+        # 源文件不存在时取消分片上传
+        self.assertRaises(oss2.exceptions.NotFound, bucket().compose_objects, 'all', ['a', 'missing'])
+        self.assertEqual(oss.uploads, {})
+
+        # 源文件都是空文件时直接写入空文件，不发起分片上传
+        oss.put('empty', b'')
+        del oss.requests[:]
+        bucket().compose_objects('nothing', ['e', 'empty', 'e'], headers={'Content-Type': 'text/plain'})
+        self.assertEqual(oss.get('nothing').data, b'')
+        self.assertEqual(oss.get('nothing').headers['Content-Type'], 'text/plain')
+        self.assertEqual([r for r in oss.requests if r[0] == 'POST'], [])
+
+        del oss.requests[:]
+        self.assertRaises(oss2.exceptions.ClientError, bucket().compose_objects, 'nothing', [])
+        self.assertEqual(oss.requests, [])
+
+    @patch('oss2.Session.do_request')
+    def test_open_write(self, do_request):
+        def fail_part(req):
+            if req.params.get('partNumber') == '2' and fail:
+                return oss.error(403, 'AccessDenied')
+
+        oss = FakeOss(hook=fail_part)
+        fail = False
+
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        # 不足一个分片时直接上传
+        with bucket().open_write('small', headers={'Content-Type': 'text/plain'}) as f:
+            f.write(b'hello ')
+            f.write('world')
+        self.assertEqual(oss.get('small').data, b'hello world')
+        self.assertEqual(oss.get('small').headers['Content-Type'], 'text/plain')
+        self.assertEqual(f.upload_id, None)
+
+        content = random_bytes(350 * 1024)
+        with bucket().open_write('big', part_size=100 * 1024, max_in_flight=2) as f:
+            for i in range(0, len(content), 7000):
+                f.write(content[i:i + 7000])
+        self.assertEqual(oss.get('big').data, content)
+        self.assertEqual(f.result.crc, calc_crc(content))
+        self.assertEqual(f.tell(), len(content))
+        self.assertEqual(len([r for r in oss.requests if r[2].get('partNumber')]), 4)
+
+        # 出错时取消分片上传
+        fail = True
+
+        def write_failed():
+            with bucket().open_write('failed', part_size=100 * 1024, max_in_flight=2) as f:
+                f.write(content)
+
+        self.assertRaises(oss2.exceptions.AccessDenied, write_failed)
+        self.assertEqual(oss.uploads, {})
+        self.assertTrue('failed' not in oss.keys())
+
+        fail = False
+        try:
+            with bucket().open_write('aborted', part_size=100 * 1024) as f:
+                f.write(content)
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        self.assertEqual(oss.uploads, {})
+        self.assertTrue('aborted' not in oss.keys())
+
+    @patch('oss2.Session.do_request')
+    def test_open_read(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        content = random_bytes(10000)
+        oss.put('data', content)
+
+        f = bucket().open_read('data', block_size=1000, cache_blocks=4, read_ahead=0)
+        self.assertEqual(f.size, 10000)
+        self.assertEqual(f.read(10), content[:10])
+        f.seek(-5, os.SEEK_END)
+        self.assertEqual(f.read(), content[-5:])
+        f.seek(1990)
+        self.assertEqual(f.read(20), content[1990:2010])
+        f.seek(5)
+        buf = bytearray(10)
+        self.assertEqual(f.readinto(buf), 10)
+        self.assertEqual(bytes(buf), content[5:15])
+        self.assertEqual((f.hits, f.misses), (1, 4))
+        self.assertEqual([r[3]['If-Match'] for r in oss.requests if r[0] == 'GET'], [f.etag] * 4)
+
+        # 顺序读取时预读
+        f = bucket().open_read('data', block_size=1000, cache_blocks=4, read_ahead=2)
+        self.assertEqual(f.read(), content)
+        self.assertTrue(f.hits > 0)
+        self.assertEqual(f.hits + f.misses, 10)
+
+        # 文件被覆盖后读取失败
+        oss.put('data', random_bytes(10000))
+        f.seek(0)
+        self.assertRaises(oss2.exceptions.PreconditionFailed, f.read, 10)
+
+        # 从zip包中只读取一个文件
+        zip_content = io.BytesIO()
+        with zipfile.ZipFile(zip_content, 'w') as z:
+            z.writestr('big', random_bytes(100000))
+            z.writestr('small', b'hello')
+        oss.put('archive.zip', zip_content.getvalue())
+
+        with bucket().open_read('archive.zip', block_size=1024) as f:
+            self.assertEqual(zipfile.ZipFile(f).read('small'), b'hello')
+            self.assertTrue(f.misses < 10)
+
+    @patch('oss2.Session.do_request')
+    def test_read_ranges(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        content = random_bytes(10000)
+        oss.put('data', content)
+
+        ranges = [(9000, 9999), (0, 9), (20, 29), (15, 100), (5000, 5000), (5100, 5199), (0, 9)]
+        views = bucket().read_ranges('data', ranges, max_gap=100, max_request_size=1000, workers=2)
+        self.assertEqual([bytes(v) for v in views], [content[start:end + 1] for start, end in ranges])
+        self.assertTrue(all(isinstance(v, memoryview) for v in views))
+
+        requested = sorted(r[3]['Range'] for r in oss.requests if r[0] == 'GET')
+        self.assertEqual(requested, ['bytes=0-100', 'bytes=5000-5199', 'bytes=9000-9999'])
+
+        self.assertEqual(bucket().read_ranges('data', []), [])
+        self.assertRaises(oss2.exceptions.ClientError, bucket().read_ranges, 'data', [(10, 5)])
+
+        # 所有请求都限定为同一个版本
+        etag = oss.get('data').etag
+        self.assertTrue(all(r[3]['If-Match'] == etag for r in oss.requests if r[0] == 'GET'))
+
+        self.assertRaises(oss2.exceptions.ClientError, bucket().read_ranges, 'data', [(0, 9), (9990, 10000)])
+
+    @patch('oss2.Session.do_request')
+    def test_read_ranges_inconsistent(self, do_request):
+        overwrite = NonlocalObject(False)
+
+        def hook(req):
+            if req.method == 'GET' and overwrite.var:
+                overwrite.var = False
+                oss.put('data', random_bytes(10000))
+
+        oss = FakeOss(hook=hook)
+
+        # 起始位置超出文件长度时，OSS忽略Range，返回整个文件
+        def do4range(req, timeout):
+            byte_range = req.headers.get('Range')
+            if byte_range and int(byte_range[len('bytes='):].split('-')[0]) >= len(oss.get('data').data):
+                del req.headers['Range']
+            return oss(req, timeout)
+
+        do_request.auto_spec = True
+        do_request.side_effect = do4range
+
+        oss.put('data', random_bytes(10000))
+        headers = {'If-Match': oss.get('data').etag}
+        self.assertRaises(oss2.exceptions.InconsistentError, bucket().read_ranges, 'data', [(0, 9), (20000, 20009)],
+                          headers=headers)
+
+        # 读取过程中文件被覆盖
+        overwrite.var = True
+        self.assertRaises(oss2.exceptions.PreconditionFailed, bucket().read_ranges, 'data', [(0, 9)])
+
+    @patch('oss2.Session.do_request')
+    def test_get_object_parallel(self, do_request):
+        overwrite = NonlocalObject(False)
+
+        def overwrite_on_get(req):
+            if req.method == 'GET' and overwrite.var:
+                oss.put('data', random_bytes(10000))
+
+        oss = FakeOss(hook=overwrite_on_get)
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        content = random_bytes(10000)
+        oss.put('data', content)
+        oss.put('empty', b'')
+
+        data = bucket().get_object_parallel('data', part_size=3000, num_threads=3)
+        self.assertTrue(isinstance(data, bytearray))
+        self.assertEqual(bytes(data), content)
+
+        gets = [r[3] for r in oss.requests if r[0] == 'GET']
+        self.assertEqual(sorted(h['Range'] for h in gets), ['bytes=0-2999', 'bytes=3000-5999', 'bytes=6000-8999',
+                                                            'bytes=9000-9999'])
+        self.assertTrue(all(h['If-Match'] == oss.get('data').etag for h in gets))
+
+        self.assertEqual(bucket().get_object_parallel('empty'), bytearray())
+
+        overwrite.var = True
+        self.assertRaises(oss2.exceptions.PreconditionFailed, bucket().get_object_parallel, 'data', part_size=3000)
+
+        # 失败后不再有请求发出
+        count = len(oss.requests)
+        time.sleep(0.05)
+        self.assertEqual(len(oss.requests), count)
+
+    @patch('oss2.Session.do_request')
+    def test_crypto_get_object_range(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        b = bucket(oss2.LocalRsaProvider(key='oss-test'))
+
+        content = random_bytes(1000)
+        b.put_object('encrypted', content)
+        self.assertNotEqual(oss.get('encrypted').data, content)
+
+        for byte_range in [(5, 100), (16, 31), (17, None), (None, 10), (None, 2000), (990, 2000)]:
+            del oss.requests[:]
+            result = b.get_object('encrypted', byte_range=byte_range)
+
+            start, last = byte_range
+            if start is None:
+                expected = content[-last:]
+            elif last is None:
+                expected = content[start:]
+            else:
+                expected = content[start:last + 1]
+
+            self.assertEqual(result.read(), expected)
+            self.assertEqual(result.content_length, len(expected))
+
+            ranges = [r[3]['Range'] for r in oss.requests if r[0] == 'GET']
+            self.assertEqual(int(ranges[0][len('bytes='):].split('-')[0]) % 16, 0)
+
+        self.assertRaises(oss2.exceptions.ClientError, b.get_object, 'encrypted', headers={'Range': 'bytes=0-15'})
+        self.assertRaises(oss2.exceptions.ClientError, bucket().get_object, 'encrypted', byte_range=(0, 15))
+
+        data = b.get_object_parallel('encrypted', part_size=250, num_threads=3)
+        self.assertEqual(bytes(data), content)
+
+        gets = sorted(r[3]['Range'] for r in oss.requests if r[0] == 'GET' and 'Range' in r[3])
+        self.assertTrue('bytes=256-511' in gets)
+
+    @patch('oss2.Session.do_request')
+    def test_crypto_key_cache(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        cache = oss2.DataKeyCache(max_uses=2, ttl=300)
+        b = bucket(oss2.LocalRsaProvider(key='oss-test', key_cache=cache))
+
+        content = random_bytes(1000)
+        for key in ['a', 'b', 'c']:
+            b.put_object(key, content)
+
+        self.assertEqual(cache.generated, 2)
+        self.assertEqual(cache.reused, 1)
+
+        # 前两个文件共用数据密钥，但计数器区间不同，密文也不同
+        a, b_, c = oss.get('a'), oss.get('b'), oss.get('c')
+        self.assertEqual(a.headers['x-oss-meta-oss-crypto-key'], b_.headers['x-oss-meta-oss-crypto-key'])
+        self.assertNotEqual(a.headers['x-oss-meta-oss-crypto-key'], c.headers['x-oss-meta-oss-crypto-key'])
+        self.assertNotEqual(a.data, b_.data)
+
+        for key in ['a', 'b', 'c']:
+            self.assertEqual(b.get_object(key).read(), content)
+
+        # 数据密钥在上传时已经缓存，只有计数器需要解密
+        self.assertEqual(cache.misses, 3)
+        self.assertEqual(cache.hits, 3)
+
+        self.assertEqual(b.get_object('b').read(), content)
+        self.assertEqual(cache.hits, 5)
+
+        # 不使用缓存的客户端同样可以解密
+        self.assertEqual(bucket(oss2.LocalRsaProvider(key='oss-test')).get_object('b').read(), content)
+
+        cache.clear()
+        self.assertTrue(cache.evicted >= 2)
+        self.assertEqual(b.get_object('a').read(), content)
+        self.assertEqual(cache.misses, 5)
+
+    @patch('oss2.Session.do_request')
+    def test_crypto_key_cache_concurrent(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        cache = oss2.DataKeyCache(max_uses=100, ttl=300)
+        provider = oss2.LocalRsaProvider(key='oss-test', key_cache=cache)
+        b = bucket(provider)
+
+        keys = ['key-{0}'.format(i) for i in range(20)]
+        contents = dict((key, random_bytes(100)) for key in keys)
+        threads = [threading.Thread(target=b.put_object, args=(key, contents[key])) for key in keys]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # 同一个数据密钥下，每个文件的计数器区间都不同
+        slots = set()
+        for key in keys:
+            headers = oss.get(key).headers
+            start = int(provider.decrypt_oss_meta_data(headers, 'x-oss-meta-oss-crypto-start'))
+            slots.add((headers['x-oss-meta-oss-crypto-key'], start >> 64))
+
+            self.assertEqual(b.get_object(key).read(), contents[key])
+
+        self.assertEqual(len(slots), len(keys))
+        self.assertEqual(cache.generated, 1)
+
+    @patch('oss2.Session.do_request')
+    def test_crypto_parallel_cipher(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        self.addCleanup(setattr, oss2.defaults, 'crypto_num_threads', oss2.defaults.crypto_num_threads)
+        self.addCleanup(setattr, oss2.defaults, 'crypto_window_size', oss2.defaults.crypto_window_size)
+        oss2.defaults.crypto_window_size = 64
+
+        b = bucket(oss2.LocalRsaProvider(key='oss-test'))
+        content = random_bytes(1000)
+
+        oss2.defaults.crypto_num_threads = 3
+        b.put_object('bytes', content)
+        b.put_object('file', io.BytesIO(content))
+        b.put_object('iter', iter([content[:500], content[500:]]))
+        b.put_object('small', content[:64])
+
+        # 并发加密的结果可以依次解密，反之亦然
+        oss2.defaults.crypto_num_threads = 1
+        for key in ['bytes', 'file', 'iter']:
+            self.assertEqual(b.get_object(key).read(), content)
+        self.assertEqual(b.get_object('small').read(), content[:64])
+
+        b.put_object('serial', content)
+
+        oss2.defaults.crypto_num_threads = 3
+        for key in ['bytes', 'file', 'iter', 'serial']:
+            self.assertEqual(b.get_object(key).read(), content)
+            self.assertEqual(b''.join(b.get_object(key)), content)
+            self.assertEqual(b.get_object(key, byte_range=(100, 899)).read(), content[100:900])
+
+        # 所有适配器共用一个线程池，不会每次都创建线程
+        threads = threading.active_count()
+        for i in range(5):
+            self.assertEqual(b.get_object('bytes').read(), content)
+        self.assertEqual(threading.active_count(), threads)
+
+        result = b.get_object('bytes')
+        self.assertEqual(result.read(10), content[:10])
+        self.assertEqual(result.read(100), content[10:110])
+        self.assertEqual(result.read(), content[110:])
+        self.assertEqual(result.client_crc, oss.get('bytes').crc)
+
+        oss2.defaults.crypto_window_size = 100
+        self.assertRaises(oss2.exceptions.ClientError, b.put_object, 'bad', content)
+
     @patch('oss2.Session.do_request')
     def test_copy_object(self, do_request):
         request_text = '''PUT /zyfpyqqqxjthdwxkhypziizm.js HTTP/1.1
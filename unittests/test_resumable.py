@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 import oss2
 
+from mock import patch
 
-class TestResumable(unittest.TestCase):
+from unittests.common import *
+
+
+class TestResumable(OssTestCase):
     def test_determine_part_size(self):
         self.assertEqual(oss2.determine_part_size(oss2.defaults.part_size + 1), oss2.defaults.part_size)
 
@@ -18,6 +26,206 @@ class TestResumable(unittest.TestCase):
         self.assertTrue(n * part_size <= size)
         self.assertTrue(oss2.defaults.part_size < part_size)
 
+    @patch('oss2.Session.do_request')
+    def test_resumable_copy(self, do_request):
+        failed_parts = set(['2'])
+
+        def fail_once(req):
+            part_number = req.params.get('partNumber')
+            if part_number in failed_parts:
+                failed_parts.remove(part_number)
+                return oss.error(500, 'InternalError')
+
+        oss = FakeOss(hook=fail_once)
+        content = random_bytes(1000)
+        oss.put('src', content, headers={'Content-Type': 'text/plain', 'x-oss-meta-author': 'me'})
+
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = oss2.ResumableCopyStore(root=root)
+
+        # 第一次拷贝失败，已完成的分片记录在断点中
+        self.assertRaises(oss2.exceptions.ServerError, oss2.resumable_copy, bucket(), BUCKET_NAME, 'src', 'dst',
+                          multipart_threshold=500, part_size=300, num_threads=1, store=store)
+        self.assertEqual(len(os.listdir(store.dir)), 1)
+
+        del oss.requests[:]
+        progress = []
+        result = oss2.resumable_copy(bucket(), BUCKET_NAME, 'src', 'dst', multipart_threshold=500, part_size=300,
+                                     store=store, progress_callback=lambda consumed, total: progress.append(consumed))
+
+        copied = sorted(int(r[2]['partNumber']) for r in oss.requests if r[0] == 'PUT')
+        self.assertEqual(copied, [2, 3, 4])
+        self.assertEqual(oss.get('dst').data, content)
+        self.assertEqual(oss.get('dst').headers['x-oss-meta-author'], 'me')
+        self.assertEqual(result.crc, calc_crc(content))
+        self.assertEqual(progress[-1], 1000)
+        self.assertEqual(os.listdir(store.dir), [])
+
+        # 源文件被修改后，断点作废
+        failed_parts.add('1')
+        self.assertRaises(oss2.exceptions.ServerError, oss2.resumable_copy, bucket(), BUCKET_NAME, 'src', 'dst',
+                          multipart_threshold=500, part_size=300, num_threads=1, store=store)
+        oss.put('src', random_bytes(1000))
+
+        del oss.requests[:]
+        oss2.resumable_copy(bucket(), BUCKET_NAME, 'src', 'dst', multipart_threshold=500, part_size=300, store=store)
+        self.assertEqual(len([r for r in oss.requests if r[0] == 'PUT']), 4)
+        self.assertEqual(oss.get('dst').data, oss.get('src').data)
+
+        # 小文件直接拷贝
+        oss.put('small', b'hello')
+        oss2.resumable_copy(bucket(), BUCKET_NAME, 'small', 'small-copy', multipart_threshold=500, store=store)
+        self.assertEqual(oss.get('small-copy').data, b'hello')
+
+
+    @patch('oss2.Session.do_request')
+    def test_resumable_upload_crypto(self, do_request):
+        failed_parts = set(['3'])
+
+        def fail_once(req):
+            part_number = req.params.get('partNumber')
+            if part_number in failed_parts:
+                failed_parts.remove(part_number)
+                return oss.error(500, 'InternalError')
+
+        oss = FakeOss(hook=fail_once)
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = oss2.ResumableStore(root=root)
+
+        content = random_bytes(1000)
+        filename = os.path.join(root, 'plain.txt')
+        with open(filename, 'wb') as f:
+            f.write(content)
+
+        b = bucket(oss2.LocalRsaProvider(key='oss-test'))
+
+        self.assertRaises(oss2.exceptions.ServerError, oss2.resumable_upload, b, 'encrypted', filename,
+                          store=store, multipart_threshold=100, part_size=250, num_threads=1)
+
+        # 断点中只有加密后的数据密钥
+        record = store.get(os.listdir(store.dir)[0])
+        self.assertEqual(record['part_size'], 256)
+        self.assertEqual(sorted(record['crypto']), sorted(oss2.crypto._CRYPTO_META_KEYS))
+
+        del oss.requests[:]
+        oss2.resumable_upload(b, 'encrypted', filename, store=store, multipart_threshold=100, part_size=250)
+
+        uploaded = sorted(r[2]['partNumber'] for r in oss.requests if r[0] == 'PUT')
+        self.assertEqual(uploaded, ['3', '4'])
+        self.assertEqual(os.listdir(store.dir), [])
+
+        self.assertNotEqual(oss.get('encrypted').data, content)
+        self.assertEqual(b.get_object('encrypted').read(), content)
+
+        self.assertRaises(oss2.exceptions.ClientError, b.init_multipart_upload, 'encrypted', part_size=100)
+
+        # 与Bucket.init_multipart_upload一样，第二个参数是HTTP头部
+        result = b.init_multipart_upload('positional', {'x-oss-meta-author': 'me'})
+        self.assertEqual(result.crypto_context.part_size, oss2.defaults.part_size)
+        self.assertEqual(oss.uploads[result.upload_id][2]['x-oss-meta-author'], 'me')
+
+        # 与Bucket.upload_part一样，第五个参数是进度回调函数
+        result = b.init_multipart_upload('parts', part_size=256)
+        context = result.crypto_context
+        progress = []
+        b.upload_part('parts', result.upload_id, 1, content[:256], lambda consumed, total: progress.append(consumed),
+                      crypto_context=context)
+        self.assertEqual(progress[-1], 256)
+
+        self.assertRaises(oss2.exceptions.ClientError, b.upload_part, 'parts', result.upload_id, 2, content[:256])
+        self.assertRaises(oss2.exceptions.ClientError, b.upload_part, 'parts', result.upload_id, 2, content[:257],
+                          crypto_context=context)
+        self.assertRaises(oss2.exceptions.ClientError, b.upload_part, 'parts', result.upload_id, 2,
+                          iter([content[:200], content[200:300]]), crypto_context=context)
+
+        # 长度不足part_size的分片只能是最后一个分片
+        parts = []
+        for part_number, data in [(2, content[256:500]), (3, content[500:756])]:
+            part = b.upload_part('parts', result.upload_id, part_number, data, crypto_context=context)
+            parts.append(oss2.models.PartInfo(part_number, part.etag))
+        self.assertRaises(oss2.exceptions.ClientError, b.complete_multipart_upload, 'parts', result.upload_id, parts)
+
+    @patch('oss2.Session.do_request')
+    def test_resumable_download_crypto(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+
+        b = bucket(oss2.LocalRsaProvider(key='oss-test'))
+
+        content = random_bytes(1000)
+        b.put_object('encrypted', content)
+
+        filename = os.path.join(root, 'plain.txt')
+        oss2.resumable_download(b, 'encrypted', filename, store=oss2.ResumableDownloadStore(root=root),
+                                multiget_threshold=100, part_size=250, num_threads=2)
+
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), content)
+
+        ranges = sorted(r[3]['Range'] for r in oss.requests if r[0] == 'GET')
+        self.assertEqual(ranges, ['bytes=0-255', 'bytes=256-511', 'bytes=512-767', 'bytes=768-999'])
+
+    @patch('oss2.Session.do_request')
+    def test_resumable_upload_job(self, do_request):
+        entered = threading.Event()
+        cancelled = threading.Event()
+
+        # 第2个分片在取消之后才完成
+        def block_part(req):
+            if req.params.get('partNumber') == '2' and not cancelled.is_set():
+                entered.set()
+                cancelled.wait()
+
+        oss = FakeOss(hook=block_part)
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = oss2.ResumableStore(root=root)
+
+        filename = os.path.join(root, 'file.txt')
+        with open(filename, 'wb') as f:
+            f.write(random_bytes(1000))
+
+        scheduler = oss2.TransferScheduler(num_threads=2)
+        job = scheduler.new_job(priority=1, max_workers=1)
+
+        def cancel():
+            entered.wait()
+            job.cancel()
+            cancelled.set()
+
+        t = threading.Thread(target=cancel)
+        t.start()
+
+        # 取消后其余分片不再上传，断点信息保留
+        self.assertRaises(oss2.exceptions.ClientError, oss2.resumable_upload, bucket(), 'file', filename,
+                          store=store, multipart_threshold=100, part_size=250, job=job)
+        t.join()
+
+        parts = sorted(r[2]['partNumber'] for r in oss.requests if r[0] == 'PUT')
+        self.assertEqual(parts, ['1', '2'])
+        self.assertEqual(len(os.listdir(store.dir)), 1)
+
+        del oss.requests[:]
+        oss2.resumable_upload(bucket(), 'file', filename, store=store, multipart_threshold=100, part_size=250,
+                              job=scheduler.new_job())
+        with open(filename, 'rb') as f:
+            self.assertEqual(oss.get('file').data, f.read())
+
 
 if __name__ == '__main__':
     unittest.main()
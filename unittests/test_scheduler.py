@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+import oss2
+from oss2.scheduler import TransferScheduler
+
+
+class TestTransferScheduler(unittest.TestCase):
+    def run_blocked(self, scheduler, jobs):
+        """先用一个任务占住唯一的线程，等所有job都提交后再放开，返回各元素执行的顺序。"""
+        order = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def block(item):
+            started.set()
+            release.wait()
+
+        blocker = threading.Thread(target=scheduler.new_job().run, args=(block, [0]))
+        blocker.start()
+        started.wait()
+
+        threads = []
+        for job, items in jobs:
+            t = threading.Thread(target=job.run, args=(order.append, items))
+            t.start()
+            threads.append(t)
+
+            while len(job._tasks) < len(items):
+                time.sleep(0.01)
+
+        release.set()
+        for t in threads + [blocker]:
+            t.join()
+
+        return order
+
+    def test_priority_and_weight(self):
+        scheduler = TransferScheduler(num_threads=1)
+
+        low = scheduler.new_job(priority=0)
+        high = scheduler.new_job(priority=1)
+        order = self.run_blocked(scheduler, [(low, ['l1', 'l2']), (high, ['h1', 'h2'])])
+        self.assertEqual(order, ['h1', 'h2', 'l1', 'l2'])
+
+        # 同一优先级按权重分享线程
+        a = scheduler.new_job(weight=1)
+        b = scheduler.new_job(weight=2)
+        order = self.run_blocked(scheduler, [(a, ['a'] * 6), (b, ['b'] * 6)])
+        self.assertEqual(order[:6].count('b'), 4)
+        self.assertEqual(sorted(order), ['a'] * 6 + ['b'] * 6)
+
+        self.assertRaises(oss2.exceptions.ClientError, scheduler.new_job, weight=0)
+
+    def test_max_workers(self):
+        scheduler = TransferScheduler(num_threads=4)
+        job = scheduler.new_job(max_workers=2)
+
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def work(item):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        job.run(work, range(10))
+        self.assertEqual(running[1], 2)
+
+    def test_error_and_cancel(self):
+        scheduler = TransferScheduler(num_threads=2)
+
+        done = []
+
+        def fail_at_3(item):
+            if item == 3:
+                raise ValueError(item)
+            done.append(item)
+
+        job = scheduler.new_job(max_workers=1)
+        self.assertRaises(ValueError, job.run, fail_at_3, range(10))
+        self.assertEqual(done, [0, 1, 2])
+
+        # 出错后同一个job仍然可以继续使用
+        job.run(done.append, [10])
+        self.assertEqual(done[-1], 10)
+
+        del done[:]
+
+        def cancel_at_2(item):
+            done.append(item)
+            if item == 2:
+                job.cancel()
+
+        self.assertRaises(oss2.exceptions.ClientError, job.run, cancel_at_2, range(10))
+        self.assertEqual(done, [0, 1, 2])
+
+        # 最后一个元素已经开始之后才取消，run()同样抛出异常
+        late = scheduler.new_job()
+        self.assertRaises(oss2.exceptions.ClientError, late.run, lambda item: late.cancel(), [0])
+        self.assertTrue(job.cancelled)
+        self.assertRaises(oss2.exceptions.ClientError, job.run, done.append, [0])
+
+    def test_nested_run(self):
+        scheduler = TransferScheduler(num_threads=1)
+        inner = scheduler.new_job()
+        result = []
+
+        # 在工作线程中再提交任务，直接在当前线程中执行，不会死锁
+        scheduler.new_job().run(lambda item: inner.run(result.append, [item, item + 1]), [0, 10])
+        self.assertEqual(result, [0, 1, 10, 11])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+import oss2
+
+from mock import patch
+
+from unittests.common import *
+
+
+class TestSync(OssTestCase):
+    def setUp(self):
+        OssTestCase.setUp(self)
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.local_dir = os.path.join(self.root, 'local')
+        self.manifest = os.path.join(self.root, 'manifest')
+
+    def write(self, path, content, mtime=None):
+        filename = os.path.join(self.local_dir, *path.split('/'))
+        oss2.utils.makedir_p(os.path.dirname(filename))
+        with open(filename, 'wb') as f:
+            f.write(content)
+
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime))
+
+    def read(self, path):
+        with open(os.path.join(self.local_dir, *path.split('/')), 'rb') as f:
+            return f.read()
+
+    def sync(self, oss, **kwargs):
+        del oss.requests[:]
+        return oss2.sync.sync_directory(bucket(), self.local_dir, 'data/', manifest=self.manifest, workers=3, **kwargs)
+
+    def assertResult(self, result, uploaded=0, downloaded=0, deleted_local=0, deleted_remote=0, unchanged=0):
+        self.assertEqual(result.failed, {})
+        self.assertEqual((result.uploaded, result.downloaded, result.deleted_local, result.deleted_remote,
+                          result.unchanged), (uploaded, downloaded, deleted_local, deleted_remote, unchanged))
+
+    @patch('oss2.sync._MAX_UNCHANGED_RUN', 2)
+    @patch('oss2.Session.do_request')
+    def test_sync_both(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        # 'x.txt' < 'x/y'，本地遍历的顺序要与OSS列举的顺序一致
+        self.write('a', b'a')
+        self.write('x.txt', b'x.txt')
+        self.write('x/y', b'x/y')
+        self.write('same', b'same')
+        oss.put('data/x/z', b'x/z')
+        oss.put('data/x-', b'x-')
+        oss.put('data/same', b'same')
+        oss.put('data/dir/', b'')
+        oss.put('other', b'other')
+
+        result = self.sync(oss)
+        self.assertResult(result, uploaded=3, downloaded=2, unchanged=1)
+        self.assertEqual(sorted(oss.keys()), ['data/a', 'data/dir/', 'data/same', 'data/x-', 'data/x.txt', 'data/x/y',
+                                              'data/x/z', 'other'])
+        self.assertEqual(self.read('x/z'), b'x/z')
+        self.assertEqual(self.read('x-'), b'x-')
+
+        # 没有变化时只需要列举
+        result = self.sync(oss)
+        self.assertResult(result, unchanged=6)
+        self.assertEqual([(r[0], r[1]) for r in oss.requests], [('GET', '')])
+
+        # 本地修改、OSS修改、只修改了本地修改时间
+        self.write('a', b'a2', mtime=2000000000)
+        oss.put('data/x/z', b'x/z2')
+        os.utime(os.path.join(self.local_dir, 'same'), (1000000000, 1000000000))
+
+        result = self.sync(oss)
+        self.assertResult(result, uploaded=1, downloaded=1, unchanged=4)
+        self.assertEqual(oss.get('data/a').data, b'a2')
+        self.assertEqual(self.read('x/z'), b'x/z2')
+        self.assertEqual(sorted(r[1] for r in oss.requests if r[0] == 'PUT'), ['data/a'])
+
+        # 一边删除的文件，delete为True时另一边也删除；否则重新同步回去
+        os.remove(os.path.join(self.local_dir, 'x.txt'))
+        bucket().delete_object('data/x-')
+
+        result = self.sync(oss, delete=True)
+        self.assertResult(result, deleted_local=1, deleted_remote=1, unchanged=4)
+        self.assertFalse(os.path.exists(os.path.join(self.local_dir, 'x-')))
+        self.assertTrue('data/x.txt' not in oss.keys())
+
+        os.remove(os.path.join(self.local_dir, 'a'))
+        result = self.sync(oss)
+        self.assertResult(result, downloaded=1, unchanged=3)
+        self.assertEqual(self.read('a'), b'a2')
+
+        # 两边都修改时，以修改时间较晚的为准
+        self.write('same', b'local', mtime=0)
+        oss.put('data/same', b'remote')
+        result = self.sync(oss)
+        self.assertResult(result, downloaded=1, unchanged=3)
+        self.assertEqual(self.read('same'), b'remote')
+
+        with open(self.manifest) as f:
+            paths = [oss2.compat.json.loads(line)[0] for line in f.readlines()[1:]]
+        self.assertEqual(paths, ['a', 'same', 'x/y', 'x/z'])
+
+    @patch('oss2.Session.do_request')
+    def test_sync_one_way(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        self.write('a', b'a')
+        oss.put('data/b', b'b')
+
+        result = self.sync(oss, mode=oss2.sync.SYNC_UPLOAD, delete=True)
+        self.assertResult(result, uploaded=1, deleted_remote=1)
+        self.assertEqual(oss.keys(), ['data/a'])
+
+        oss.put('data/a', b'remote')
+        result = self.sync(oss, mode=oss2.sync.SYNC_UPLOAD)
+        self.assertResult(result, uploaded=1)
+        self.assertEqual(oss.get('data/a').data, b'a')
+
+        self.write('c', b'c')
+        result = self.sync(oss, mode=oss2.sync.SYNC_DOWNLOAD, delete=True)
+        self.assertResult(result, deleted_local=1, unchanged=1)
+        self.assertEqual(os.listdir(self.local_dir), ['a'])
+
+        # 断点续传下载的文件，清单中记录下载时的ETag
+        oss.put('data/big', random_bytes(1000))
+        result = self.sync(oss, mode=oss2.sync.SYNC_DOWNLOAD, multiget_threshold=100)
+        self.assertResult(result, downloaded=1, unchanged=1)
+        self.assertEqual(self.read('big'), oss.get('data/big').data)
+        with open(self.manifest) as f:
+            entries = [oss2.compat.json.loads(line) for line in f.readlines()[1:]]
+        self.assertEqual([(e[0], e[4]) for e in entries], [('a', oss.get('data/a').etag), ('big', oss.get('data/big').etag)])
+        os.remove(os.path.join(self.local_dir, 'big'))
+        bucket().delete_object('data/big')
+
+        self.assertRaises(oss2.exceptions.ClientError, oss2.sync.sync_directory, bucket(), self.local_dir,
+                          mode='invalid')
+
+        # 清单放在本地目录中，清单本身不会被上传
+        manifest = os.path.join(self.local_dir, '.manifest')
+        for i in range(2):
+            oss2.sync.sync_directory(bucket(), self.local_dir, 'data/', mode=oss2.sync.SYNC_UPLOAD, delete=True,
+                                     manifest=manifest)
+            self.assertEqual(oss.keys(), ['data/a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
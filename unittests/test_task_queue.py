@@ -105,5 +105,47 @@ class TestTaskQueue(unittest.TestCase):
         self.assertRaises(RuntimeError, q.run)
 
 
+    def test_maxsize(self):
+        n = 100
+        max_pending = NonlocalObject(0)
+        produced = NonlocalObject(0)
+        consumed = NonlocalObject(0)
+
+        def producer(q):
+            for i in range(n):
+                q.put(1)
+                produced.var += 1
+                max_pending.var = max(max_pending.var, produced.var - consumed.var)
+
+        def consumer(q):
+            while q.ok():
+                value = q.get()
+                if value is None:
+                    break
+
+                time.sleep(0.001)
+                consumed.var += value
+
+        q = TaskQueue(producer, [consumer], maxsize=4)
+        q.run()
+
+        self.assertEqual(consumed.var, n)
+        self.assertTrue(max_pending.var <= 5)
+
+    def test_maxsize_early_terminated_consumers(self):
+        """Producer blocked by maxsize gives up after consumers are terminated."""
+
+        def producer(q):
+            for i in range(4096):
+                q.put(1)
+
+        def consumer(q):
+            q.get()
+            raise RuntimeError("some error")
+
+        q = TaskQueue(producer, [consumer], maxsize=2)
+
+        self.assertRaises(RuntimeError, q.run)
+
 if __name__ == '__main__':
     unittest.main()
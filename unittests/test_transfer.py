@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+import oss2
+
+from mock import patch
+
+from unittests.common import *
+
+
+def _make_tree(root, files):
+    for rel_path, content in files.items():
+        path = os.path.join(root, *rel_path.split('/'))
+        oss2.utils.makedir_p(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(content)
+
+
+class TestTransfer(OssTestCase):
+    @patch('oss2.Session.do_request')
+    def test_upload_directory(self, do_request):
+        def fail_key(req):
+            if req.method == 'PUT' and oss2.urlunquote(req.url).endswith('/bad.txt'):
+                return oss.error(403, 'AccessDenied')
+
+        oss = FakeOss(hook=fail_key)
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+
+        files = {
+            'a.txt': random_bytes(10),
+            'empty.dat': b'',
+            'sub/b.html': random_bytes(200),
+            'sub/deep/c.txt': random_bytes(99),
+            'sub/deep/bad.txt': random_bytes(5),
+            'big/large.bin': random_bytes(1000),
+            'big/larger.bin': random_bytes(1500),
+        }
+        _make_tree(root, files)
+
+        progress = []
+        result = oss2.transfer.upload_directory(bucket(), root, 'backup/', workers=3,
+                                                multipart_threshold=500, part_size=400,
+                                                progress_callback=lambda consumed, total: progress.append((consumed, total)))
+
+        self.assertEqual(result.files, len(files) - 1)
+        self.assertEqual(result.bytes, sum(len(c) for c in files.values()) - 5)
+        self.assertEqual(list(result.failed), [os.path.join(root, 'sub', 'deep', 'bad.txt')])
+        self.assertTrue(isinstance(result.failed[os.path.join(root, 'sub', 'deep', 'bad.txt')],
+                                   oss2.exceptions.AccessDenied))
+
+        for rel_path, content in files.items():
+            if rel_path != 'sub/deep/bad.txt':
+                self.assertEqual(oss.get('backup/' + rel_path).data, content)
+
+        self.assertEqual(oss.get('backup/sub/b.html').headers['Content-Type'], 'text/html')
+
+        # 大文件按从大到小的顺序分片上传
+        inits = [r[1] for r in oss.requests if r[0] == 'POST' and 'uploads' in r[2]]
+        self.assertEqual(inits, ['backup/big/larger.bin', 'backup/big/large.bin'])
+        parts = [r for r in oss.requests if r[0] == 'PUT' and 'partNumber' in r[2]]
+        self.assertEqual(len(parts), 4 + 3)
+
+        total = sum(len(c) for c in files.values())
+        self.assertEqual(progress[-1], (total - 5, total))
+
+    @patch('oss2.Session.do_request')
+    def test_upload_directory_abort(self, do_request):
+        def fail_part(req):
+            if req.params.get('partNumber') == '2':
+                return oss.error(403, 'AccessDenied')
+
+        oss = FakeOss(hook=fail_part)
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        _make_tree(root, {'large.bin': random_bytes(1000), 'small.txt': random_bytes(10)})
+
+        result = oss2.transfer.upload_directory(bucket(), root, workers=2, multipart_threshold=500, part_size=300)
+
+        self.assertEqual(result.files, 1)
+        self.assertEqual(list(result.failed), [os.path.join(root, 'large.bin')])
+        self.assertEqual(sorted(oss.keys()), ['small.txt'])
+        self.assertEqual(oss.uploads, {})
+
+    @patch('oss2.Session.do_request')
+    def test_download_prefix(self, do_request):
+        oss = FakeOss()
+        do_request.auto_spec = True
+        do_request.side_effect = oss
+
+        objects = {
+            'photos/a.jpg': random_bytes(10),
+            'photos/empty': b'',
+            'photos/2018/b.jpg': random_bytes(300),
+            'photos/2018/06/c.jpg': random_bytes(99),
+            'photos/large.bin': random_bytes(1000),
+        }
+        for key, content in objects.items():
+            oss.put(key, content)
+        oss.put('photos/2019/', b'')
+        oss.put('photos/../evil', b'evil')
+        oss.put('other/d.jpg', b'd')
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+
+        def download():
+            del oss.requests[:]
+            return oss2.transfer.download_prefix(bucket(), 'photos/', root, workers=3,
+                                                 multiget_threshold=500, part_size=300)
+
+        result = download()
+        self.assertEqual(result.files, len(objects))
+        self.assertEqual(result.bytes, sum(len(c) for c in objects.values()))
+        self.assertEqual(list(result.failed), ['photos/../evil'])
+
+        for key, content in objects.items():
+            with open(os.path.join(root, *key[len('photos/'):].split('/')), 'rb') as f:
+                self.assertEqual(f.read(), content)
+
+        self.assertFalse(os.path.exists(os.path.join(root, 'evil')))
+        self.assertEqual(sorted(os.listdir(root)), ['2018', 'a.jpg', 'empty', 'large.bin'])
+
+        ranges = sorted(r[3]['Range'] for r in oss.requests if r[0] == 'GET' and 'Range' in r[3])
+        self.assertEqual(ranges, ['bytes=0-299', 'bytes=300-599', 'bytes=600-899', 'bytes=900-999'])
+
+        # 长度和修改时间都一致，全部跳过
+        result = download()
+        self.assertEqual((result.files, result.skipped), (0, len(objects)))
+        self.assertEqual([r[0] for r in oss.requests], ['GET'])
+
+        # 修改时间不一致但内容相同的，比较CRC64后跳过；内容不同的重新下载
+        os.utime(os.path.join(root, 'a.jpg'), (0, 0))
+        with open(os.path.join(root, '2018', 'b.jpg'), 'wb') as f:
+            f.write(random_bytes(300))
+
+        result = download()
+        self.assertEqual((result.files, result.skipped), (1, len(objects) - 1))
+        with open(os.path.join(root, '2018', 'b.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), objects['photos/2018/b.jpg'])
+
+        # 大文件CRC64不一致时，和普通下载一样分范围重新下载
+        with open(os.path.join(root, 'large.bin'), 'wb') as f:
+            f.write(random_bytes(1000))
+
+        result = download()
+        self.assertEqual((result.files, result.bytes, result.skipped), (1, 1000, len(objects) - 1))
+        with open(os.path.join(root, 'large.bin'), 'rb') as f:
+            self.assertEqual(f.read(), objects['photos/large.bin'])
+
+        gets = [r for r in oss.requests if r[0] == 'GET' and r[1] == 'photos/large.bin']
+        self.assertEqual(sorted(r[3].get('Range') for r in gets),
+                         ['bytes=0-299', 'bytes=300-599', 'bytes=600-899', 'bytes=900-999'])
+        self.assertEqual(sorted(os.listdir(root)), ['2018', 'a.jpg', 'empty', 'large.bin'])
+
+
+if __name__ == '__main__':
+    unittest.main()